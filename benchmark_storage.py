@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+import argparse
+import logging
+import os
+import tempfile
+import time
+from os import getcwd, path
+from typing import Dict, List, Tuple, Any
+
+import h5py
+import numpy as np
+
+from src.io.frame_layout import Layout, create_frame_writer
+from src.io.storage import Storage
+from src.visualization.visualization_helpers import get_data_range, \
+    load_field, load_state_data
+
+
+class BenchmarkStorage:
+
+    # Settings compared if none are given
+    DEFAULT_SETTINGS = [
+        'none',
+        'lzf',
+        'lzf,shuffle',
+        'gzip:1',
+        'gzip:4',
+        'gzip:4,shuffle',
+        'gzip:4,shuffle,downcast',
+    ]
+
+    FIELDS = ('psi', 'mu', 'a', 'supercurrent', 'normal_current')
+
+    def __init__(self):
+
+        # Parse command line args
+        parser = argparse.ArgumentParser(
+            description='compare the write throughput and the file size of '
+                        'storage options on the fields of a simulation'
+        )
+        parser.add_argument('-v',
+                            '--verbose',
+                            action='store_true',
+                            default=False,
+                            help='run in verbose mode'
+                            )
+
+        parser.add_argument('input',
+                            metavar='INPUT',
+                            type=str,
+                            help='path to a simulation output file with the '
+                                 'fields to write'
+                            )
+
+        parser.add_argument('-n',
+                            '--frames',
+                            type=int,
+                            default=100,
+                            help='number of time steps to write for each '
+                                 'setting'
+                            )
+
+        parser.add_argument('--layout',
+                            type=str,
+                            choices=Layout.get_keys(),
+                            default=Layout.GROUPS.value,
+                            help='layout of the written time steps'
+                            )
+
+        parser.add_argument('--setting',
+                            type=str,
+                            action='append',
+                            default=None,
+                            help='storage options to compare in the format of '
+                                 'the storage options of simulate; may be '
+                                 'given several times (default: a few common '
+                                 'settings)'
+                            )
+
+        parser.set_defaults(func=self.benchmark)
+
+        # Get arguments
+        self.args = parser.parse_args()
+
+        # Create a logger
+        self.logger = logging.getLogger('benchmark')
+        console_stream = logging.StreamHandler()
+        console_stream.setFormatter(
+            logging.Formatter('%(levelname)s: %(message)s')
+        )
+        self.logger.addHandler(console_stream)
+
+        # Set log level to DEBUG in verbose mode and INFO in non-verbose mode
+        self.logger.setLevel(
+            logging.DEBUG if self.args.verbose else logging.INFO
+        )
+
+        self.args.func()
+
+    def __load_frames(self, h5file: h5py.File) \
+            -> List[Tuple[Dict[str, Any], Dict[str, np.ndarray]]]:
+        """
+        Load the state and the fields of the saved time steps.
+        :param h5file: The simulation output.
+        :return: The state and the fields of each time step.
+        """
+
+        min_frame, max_frame = get_data_range(h5file)
+        frames = []
+
+        for frame in range(min_frame, max_frame + 1):
+            data = dict((name, load_field(h5file, name, frame))
+                        for name in self.FIELDS)
+            frames.append((
+                load_state_data(h5file, frame),
+                dict((name, value) for name, value in data.items()
+                     if value is not None)
+            ))
+
+        if sum(len(data) for _, data in frames) == 0:
+            raise ValueError('The input file has no saved fields.')
+
+        return frames
+
+    def __write(self, file_path: str,
+                frames: List[Tuple[Dict[str, Any], Dict[str, np.ndarray]]],
+                storage: Storage) -> float:
+        """
+        Write the time steps to a new file.
+
+        :param file_path: The path of the file.
+        :param frames: The state and the fields of the time steps to cycle
+        through.
+        :param storage: The storage options.
+        :return: The time it took to write the file.
+        """
+
+        start = time.perf_counter()
+
+        with h5py.File(file_path, 'w') as h5file:
+            writer = create_frame_writer(h5file, Layout(self.args.layout),
+                                         storage)
+
+            for number in range(self.args.frames):
+                params, data = frames[number % len(frames)]
+                writer.save(number, params, data, {})
+
+            writer.close()
+
+        return time.perf_counter() - start
+
+    def benchmark(self):
+        with h5py.File(path.join(getcwd(), self.args.input), 'r') as h5file:
+            frames = self.__load_frames(h5file)
+
+        # The size of the fields before down-casting and compression
+        raw_bytes = sum(
+            sum(value.nbytes for value in frames[number % len(frames)][1]
+                .values())
+            for number in range(self.args.frames)
+        )
+
+        settings = self.args.setting \
+            if self.args.setting is not None else self.DEFAULT_SETTINGS
+
+        self.logger.info('Writing {} time steps with {:.1f} MB of fields.'
+                         .format(self.args.frames, raw_bytes / 1e6))
+        self.logger.info('{:<32} {:>10} {:>10} {:>10} {:>8}'.format(
+            'setting', 'time [s]', 'MB/s', 'size [MB]', 'ratio'
+        ))
+
+        with tempfile.TemporaryDirectory() as directory:
+            for number, setting in enumerate(settings):
+                storage = Storage.parse([setting])
+                file_path = path.join(directory, '{}.h5'.format(number))
+
+                duration = self.__write(file_path, frames, storage)
+                size = os.path.getsize(file_path)
+
+                self.logger.info('{:<32} {:>10.3f} {:>10.1f} {:>10.2f} '
+                                 '{:>8.2f}'.format(setting, duration,
+                                                   raw_bytes / duration / 1e6,
+                                                   size / 1e6,
+                                                   raw_bytes / size))
+
+
+if __name__ == '__main__':
+    BenchmarkStorage()
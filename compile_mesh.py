@@ -4,9 +4,11 @@ import logging
 from os import getcwd, path
 
 import h5py
+import numpy as np
 from tqdm import tqdm
 
 from src.mesh.mesh import Mesh
+from src.mesh.util.renumber import Renumbering, get_bandwidth
 
 
 class CompileMesh:
@@ -29,6 +31,16 @@ class CompileMesh:
                             help='run in silent mode'
                             )
 
+        parser.add_argument('-r',
+                            '--renumber',
+                            type=str,
+                            choices=Renumbering.get_keys(),
+                            default=Renumbering.NONE.value,
+                            help='renumber the vertices with reverse '
+                                 'Cuthill-McKee or along a Hilbert curve to '
+                                 'get cache-friendly sparse matrices'
+                            )
+
         parser.add_argument('input',
                             metavar='INPUT',
                             nargs='+',
@@ -61,14 +73,45 @@ class CompileMesh:
 
     def compile(self):
 
+        renumbering = Renumbering(self.args.renumber)
+
         for input_file in tqdm(self.args.input):
             with h5py.File(path.join(getcwd(), input_file), 'r+') as h5file:
 
                 # Mesh is already compiled.
-                if Mesh.is_restorable(h5file):
+                if Mesh.is_restorable(h5file) and (
+                        renumbering is Renumbering.NONE
+                        or 'vertex_order' in h5file):
                     continue
 
-                mesh = Mesh.load_from_hdf5(h5file)
+                # Compile from the triangulation. A mesh that was compiled
+                # without renumbering is recompiled.
+                elements = np.asarray(h5file['elements'])
+                mesh = Mesh.from_triangulation(
+                    x=np.asarray(h5file['x']).flatten(),
+                    y=np.asarray(h5file['y']).flatten(),
+                    elements=elements,
+                    voltage_points=np.asarray(h5file['voltage_points'])
+                    if 'voltage_points' in h5file else None,
+                    input_edge=np.asarray(h5file['input_edge'])
+                    if 'input_edge' in h5file else None,
+                    output_edge=np.asarray(h5file['output_edge'])
+                    if 'output_edge' in h5file else None,
+                    renumbering=renumbering
+                )
+
+                if renumbering is not Renumbering.NONE:
+                    self.logger.info(
+                        'Renumbered {} with {}, bandwidth {} -> {}.'.format(
+                            input_file,
+                            renumbering.value,
+                            get_bandwidth(elements.transpose()
+                                          if elements.shape[0] == 3
+                                          else elements),
+                            get_bandwidth(mesh.elements)
+                        )
+                    )
+
                 h5file.clear()
                 mesh.save_to_hdf5(h5file)
 
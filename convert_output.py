@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+import argparse
+import logging
+from os import getcwd, path
+
+import h5py
+
+from src.io.frame_layout import convert_to_series
+from src.io.storage import Storage
+
+
+class ConvertOutput:
+
+    def __init__(self):
+
+        # Parse command line args
+        parser = argparse.ArgumentParser(
+            description='convert simulation output with one group per time '
+                        'step to the series layout'
+        )
+        parser.add_argument('-v',
+                            '--verbose',
+                            action='store_true',
+                            default=False,
+                            help='run in verbose mode'
+                            )
+
+        parser.add_argument('-s',
+                            '--silent',
+                            action='store_true',
+                            default=False,
+                            help='run in silent mode'
+                            )
+
+        parser.add_argument('input',
+                            metavar='INPUT',
+                            type=str,
+                            help='path to the output file to convert'
+                            )
+
+        parser.add_argument('output',
+                            metavar='OUTPUT',
+                            type=str,
+                            help='path to the converted file'
+                            )
+
+        parser.add_argument('--storage',
+                            type=str,
+                            action='append',
+                            default=None,
+                            help='storage options of the converted fields in '
+                                 'the format of simulate, e.g. gzip:4,shuffle '
+                                 'or psi=lzf,downcast'
+                            )
+
+        parser.set_defaults(func=self.convert)
+
+        # Get arguments
+        self.args = parser.parse_args()
+
+        # Create a logger
+        self.logger = logging.getLogger('convert')
+        console_stream = logging.StreamHandler()
+        console_stream.setFormatter(
+            logging.Formatter('%(levelname)s: %(message)s')
+        )
+        self.logger.addHandler(console_stream)
+
+        # Set log level to DEBUG in verbose mode and INFO in non-verbose mode
+        self.logger.setLevel(
+            logging.DEBUG if self.args.verbose else logging.INFO
+        )
+
+        # Disable logging if silent mode is enabled
+        self.logger.disabled = self.args.silent
+
+        self.args.func()
+
+    def __convert_group(self, source: h5py.Group, target: h5py.Group,
+                        storage: Storage):
+        """
+        Copy a group and convert the time steps in it.
+        :param source: The group to convert.
+        :param target: The group to write to.
+        :param storage: The storage options of the converted fields.
+        """
+
+        target.attrs.update(source.attrs)
+
+        for key, item in source.items():
+
+            # Convert the time steps of a simulation
+            if key == 'data' and isinstance(item, h5py.Group):
+                self.logger.info('Converting {} time steps in {}.'
+                                 .format(len(item), source.name))
+                convert_to_series(source, target, storage)
+
+            # The running state is converted with the time steps and the
+            # series layout has no frame index or fixed frames
+            elif key in ('running', 'running ends', 'frame index',
+                         'fixed frames') \
+                    and 'data' in source:
+                continue
+
+            elif isinstance(item, h5py.Group):
+                self.__convert_group(item, target.create_group(key),
+                                     storage)
+
+            else:
+                source.copy(item, target, key)
+
+    def convert(self):
+        storage = Storage.parse(self.args.storage)
+
+        with h5py.File(path.join(getcwd(), self.args.input), 'r') as source, \
+                h5py.File(path.join(getcwd(), self.args.output), 'x') \
+                as target:
+            self.__convert_group(source, target, storage)
+            storage.save(target.attrs)
+
+
+if __name__ == '__main__':
+    ConvertOutput()
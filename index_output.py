@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+import argparse
+import logging
+from os import getcwd, path
+
+import h5py
+
+from src.io.frame_layout import create_frame_index
+
+
+class IndexOutput:
+
+    def __init__(self):
+
+        # Parse command line args
+        parser = argparse.ArgumentParser(
+            description='add the frame index to simulation output files that '
+                        'were written without it'
+        )
+        parser.add_argument('-v',
+                            '--verbose',
+                            action='store_true',
+                            default=False,
+                            help='run in verbose mode'
+                            )
+
+        parser.add_argument('-s',
+                            '--silent',
+                            action='store_true',
+                            default=False,
+                            help='run in silent mode'
+                            )
+
+        parser.add_argument('-f',
+                            '--force',
+                            action='store_true',
+                            default=False,
+                            help='rebuild existing frame indices'
+                            )
+
+        parser.add_argument('input',
+                            metavar='INPUT',
+                            type=str,
+                            nargs='+',
+                            help='paths to the output files to index'
+                            )
+
+        parser.set_defaults(func=self.index)
+
+        # Get arguments
+        self.args = parser.parse_args()
+
+        # Create a logger
+        self.logger = logging.getLogger('index')
+        console_stream = logging.StreamHandler()
+        console_stream.setFormatter(
+            logging.Formatter('%(levelname)s: %(message)s')
+        )
+        self.logger.addHandler(console_stream)
+
+        # Set log level to DEBUG in verbose mode and INFO in non-verbose mode
+        self.logger.setLevel(
+            logging.DEBUG if self.args.verbose else logging.INFO
+        )
+
+        # Disable logging if silent mode is enabled
+        self.logger.disabled = self.args.silent
+
+        self.args.func()
+
+    def __index_group(self, group: h5py.Group):
+        """
+        Add the frame index to a group with time steps in the groups layout.
+        :param group: The group with the data group.
+        """
+
+        if 'frame index' in group and not self.args.force:
+            self.logger.debug('{} already has a frame index.'
+                              .format(group.name))
+            return
+
+        frame_index = create_frame_index(group)
+        self.logger.info('Indexed {} time steps in {}.'
+                         .format(len(frame_index), group.name))
+
+    def index(self):
+        for input_path in self.args.input:
+            with h5py.File(path.join(getcwd(), input_path), 'r+') as h5file:
+                self.logger.info('Indexing {}.'.format(input_path))
+
+                # Sweeps have time steps for each magnetic field
+                groups = [h5file] + list(h5file['sweep'].values()) \
+                    if 'sweep' in h5file else [h5file]
+
+                for group in groups:
+                    if 'data' in group:
+                        self.__index_group(group)
+
+
+if __name__ == '__main__':
+    IndexOutput()
@@ -2,17 +2,36 @@
 import argparse
 import logging
 from datetime import datetime
-from typing import Sequence
+from typing import Sequence, Iterator, Tuple, Any, Optional, Dict, Callable
 
 import numpy as np
-from scipy.sparse.linalg import splu
 
+from src.io.checkpoint import Checkpoint
 from src.io.data_handler import DataHandler
+from src.io.ensemble_data_handler import EnsembleDataHandler
+from src.io.frame_layout import Layout
+from src.io.reducers import Reducer, StatisticsReducer, HistogramReducer, \
+    ProbeReducer
+from src.io.storage import Storage
+from src.io.sweep_data_handler import SweepDataHandler
+from src.matrices.batched_csr_matrix import BatchedCsrMatrix
 from src.matrices.matrix_builder import MatrixBuilder, MatrixType
+from src.matrices.link_updater import LinkUpdater
+from src.matrices.matrix_cache import MatrixCache
+from src.matrices.partitioned_matrix import PartitionedMatrix
 from src.mesh.mesh import Mesh, Operator
 from src.runner import Runner
+from src.solver.adaptive_time_step import AdaptiveTimeStep
+from src.solver.mu_solver import MuSolverType, create_mu_solver, \
+    IterativeMuSolver, DirectMuSolver
+from src.solver.critical_current_search import CriticalCurrentSearch
+from src.solver.psi_kernel import PsiKernel
+from src.solver.steady_state_ramp import SteadyStateRamp
+from src.solver.supercurrent_kernel import SupercurrentKernel
 from src.sparse_format import SparseFormat
-from src.tdgl import get_supercurrent
+from src.util.metrics_server import MetricsServer
+from src.util.parallel import ParallelExecutor
+from src.util.phase_timer import PhaseTimer
 
 
 class Simulate:
@@ -74,6 +93,73 @@ class Simulate:
             help='number of steps per current value'
         )
 
+        parser.add_argument(
+            '--steady-state',
+            action='store_true',
+            default=False,
+            help='move to the next current once the voltage and the mean '
+                 'modulus squared of the complex field are stationary instead '
+                 'of after a fixed number of steps; the simulation ends after '
+                 'the last current'
+        )
+
+        parser.add_argument(
+            '--steady-tolerance',
+            type=float,
+            default=1e-3,
+            help='tolerance for stationary signals in steady state mode; the '
+                 'signals are averaged over windows of half the minimal dwell'
+        )
+
+        parser.add_argument(
+            '--min-dwell',
+            type=float,
+            default=None,
+            help='minimal number of steps per current in steady state mode '
+                 '(default: steps per current / 10)'
+        )
+
+        parser.add_argument(
+            '--max-dwell',
+            type=float,
+            default=None,
+            help='maximal number of steps per current in steady state mode '
+                 '(default: steps per current)'
+        )
+
+        parser.add_argument(
+            '--find-ic',
+            action='store_true',
+            default=False,
+            help='search for the critical current between the initial and '
+                 'the end current by bracketing and bisection instead of '
+                 'running a linear ramp; the simulation ends when the '
+                 'critical current is found'
+        )
+
+        parser.add_argument(
+            '--ic-threshold',
+            type=float,
+            default=0.01,
+            help='mean voltage above which a current is resistive when '
+                 'searching for the critical current'
+        )
+
+        parser.add_argument(
+            '--ic-tolerance',
+            type=float,
+            default=1e-3,
+            help='width of the final critical current bracket'
+        )
+
+        parser.add_argument(
+            '--probe-steps',
+            type=float,
+            default=None,
+            help='number of steps per probed current when searching for the '
+                 'critical current (default: steps per current)'
+        )
+
         parser.add_argument(
             '-b',
             '--magnetic-field',
@@ -82,6 +168,59 @@ class Simulate:
             help='set the external magnetic field'
         )
 
+        parser.add_argument(
+            '-B',
+            '--magnetic-field-max',
+            type=float,
+            default=None,
+            help='set the end magnetic field (linear interpolation between '
+                 'initial and end); only the link variables are updated when '
+                 'the field changes'
+        )
+
+        parser.add_argument(
+            '--steps-per-field',
+            type=float,
+            default=1,
+            help='number of steps per magnetic field value'
+        )
+
+        parser.add_argument(
+            '--ensemble-currents',
+            type=str,
+            default=None,
+            help='comma separated list of initial current densities for an '
+                 'ensemble of simulations advanced together; each member is '
+                 'written to its own output file'
+        )
+
+        parser.add_argument(
+            '--ensemble-fields',
+            type=str,
+            default=None,
+            help='comma separated list of magnetic fields for an ensemble of '
+                 'simulations advanced together; each member is written to '
+                 'its own output file'
+        )
+
+        parser.add_argument(
+            '--field-sweep',
+            type=str,
+            default=None,
+            help='run a magnetic field sweep given as start:stop:count in '
+                 'one process; the mesh and the scalar potential solver are '
+                 'shared by all fields and all fields are written to the '
+                 'output file'
+        )
+
+        parser.add_argument(
+            '--sweep-batch',
+            type=int,
+            default=1,
+            help='number of fields in a sweep that are advanced together as '
+                 'an ensemble'
+        )
+
         parser.add_argument(
             '-t',
             '--time-step',
@@ -90,6 +229,79 @@ class Simulate:
             help='initial time step'
         )
 
+        parser.add_argument(
+            '--adaptive',
+            action='store_true',
+            default=False,
+            help='adapt the time step to the estimated local error'
+        )
+
+        parser.add_argument(
+            '--time-step-min',
+            type=float,
+            default=None,
+            help='smallest time step in adaptive mode (default: initial time '
+                 'step / 100)'
+        )
+
+        parser.add_argument(
+            '--time-step-max',
+            type=float,
+            default=None,
+            help='largest time step in adaptive mode (default: initial time '
+                 'step * 50)'
+        )
+
+        parser.add_argument(
+            '--adaptive-tolerance',
+            type=float,
+            default=1e-3,
+            help='largest accepted local error of the complex field per '
+                 'step in adaptive mode, estimated by step doubling'
+        )
+
+        parser.add_argument(
+            '--mu-solver',
+            type=str,
+            choices=MuSolverType.get_keys(),
+            default=MuSolverType.DIRECT.value,
+            help='solver for the scalar potential: sparse LU factorization or '
+                 'warm started conjugate gradient with an AMG (requires '
+                 'pyamg), symmetric incomplete LU or Jacobi preconditioner'
+        )
+
+        parser.add_argument(
+            '--mu-tolerance',
+            type=float,
+            default=1e-8,
+            help='relative residual tolerance for iterative scalar potential '
+                 'solvers'
+        )
+
+        parser.add_argument(
+            '--mu-max-iterations',
+            type=int,
+            default=None,
+            help='maximal number of iterations per solve for iterative scalar '
+                 'potential solvers'
+        )
+
+        parser.add_argument(
+            '--cache-dir',
+            type=str,
+            default=None,
+            help='directory for caching the built sparse matrices and the '
+                 'scalar potential factorization ordering between runs'
+        )
+
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=1,
+            help='number of threads used for the sparse matrix products and '
+                 'the complex field update'
+        )
+
         parser.add_argument(
             '-s',
             '--steps',
@@ -114,6 +326,103 @@ class Simulate:
                  'to thermalize'
         )
 
+        parser.add_argument(
+            '--metrics-port',
+            type=int,
+            default=None,
+            help='serve live metrics in the Prometheus text format on this '
+                 'local port (0 picks a free port)'
+        )
+
+        parser.add_argument(
+            '--timing',
+            action='store_true',
+            default=False,
+            help='time the phases of the simulation and write a report to '
+                 'the output file and to a JSON file next to it'
+        )
+
+        parser.add_argument(
+            '--reduce',
+            type=str,
+            action='append',
+            default=None,
+            help='reduce a quantity on the fly and save the result at the '
+                 'end: stats:QUANTITY[:EVERY] for the time averaged mean, '
+                 'variance, min and max, histogram:QUANTITY:BINS:LOW:HIGH'
+                 '[:EVERY] or probe:QUANTITY[:EVERY[:INDEX,...]] for a series '
+                 'at a few sites or edges; the quantities are psi_modulus, '
+                 'psi_modulus_squared, mu, supercurrent, normal_current and '
+                 'voltage; may be given several times'
+        )
+
+        parser.add_argument(
+            '--no-fields',
+            action='store_true',
+            default=False,
+            help='do not save the fields with each time step, only the state '
+                 'and the running state'
+        )
+
+        parser.add_argument(
+            '--save',
+            type=str,
+            default=None,
+            help='fields to save and how often as a comma separated list of '
+                 'FIELD:STEPS with a multiple of the save interval or none '
+                 'to never save the field, e.g. psi:1000,mu:100,'
+                 'supercurrent:none; the fields are psi, mu, supercurrent, '
+                 'normal_current and a, and fields that are left out are '
+                 'saved at every save; the constant a is only saved again if '
+                 'it changes'
+        )
+
+        parser.add_argument(
+            '--layout',
+            type=str,
+            choices=Layout.get_keys(),
+            default=Layout.GROUPS.value,
+            help='layout of the saved time steps: one group per time step or '
+                 'one resizable dataset per field and state variable'
+        )
+
+        parser.add_argument(
+            '--storage',
+            type=str,
+            action='append',
+            default=None,
+            help='storage options of the saved fields as a comma separated '
+                 'list of none, gzip[:LEVEL], lzf, shuffle, chunk:SIZE and '
+                 'downcast (single precision), either for all fields or for '
+                 'one field with FIELD=OPTIONS, e.g. gzip:4,shuffle or '
+                 'psi=lzf,downcast; may be given several times'
+        )
+
+        parser.add_argument(
+            '--async-writes',
+            action='store_true',
+            default=False,
+            help='write the saved time steps in a background thread while '
+                 'the simulation continues'
+        )
+
+        parser.add_argument(
+            '--checkpoint-every',
+            type=float,
+            default=0,
+            help='number of steps between checkpoints of the full simulation '
+                 'state, which are written next to the output file '
+                 '(default: no checkpoints)'
+        )
+
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            default=False,
+            help='resume the simulation from the checkpoint of the output '
+                 'file and continue appending to it'
+        )
+
         parser.add_argument(
             '-u',
             '--complex-time-scale',
@@ -135,6 +444,16 @@ class Simulate:
         # Get arguments
         self.args = parser.parse_args()
 
+        # Check the field sweep before anything is created
+        if self.args.field_sweep is not None:
+            try:
+                self.__parse_sweep(self.args.field_sweep)
+            except ValueError as error:
+                parser.error('argument --field-sweep: {}'.format(error))
+
+        if self.args.sweep_batch < 1:
+            parser.error('argument --sweep-batch: must be at least 1')
+
         # Create a logger
         self.logger = logging.getLogger('simulate')
         console_stream = logging.StreamHandler()
@@ -150,6 +469,144 @@ class Simulate:
 
         self.args.func()
 
+    @classmethod
+    def __parse_list(cls, value: str) -> np.ndarray:
+        return np.asarray([float(item) for item in value.split(',')])
+
+    @classmethod
+    def __parse_reducer(cls, value: str, quantities: Dict[str, Callable],
+                        member_shape: Tuple[int, ...]) -> Reducer:
+        """
+        Create a reducer from its command line description.
+        :param value: The description.
+        :param quantities: Functions computing the quantities from psi and
+        mu.
+        :param member_shape: The shape of the member axis of an ensemble.
+        :return: The reducer.
+        """
+
+        kind, name, *options = value.split(':')
+
+        if name not in quantities:
+            raise ValueError('Unknown quantity {} to reduce.'.format(name))
+
+        function = quantities[name]
+
+        if kind == 'stats' and len(options) <= 1:
+            return StatisticsReducer(name, function, *map(int, options),
+                                     member_shape=member_shape)
+
+        if kind == 'histogram' and len(options) in (3, 4):
+            return HistogramReducer(name, function, int(options[0]),
+                                    float(options[1]), float(options[2]),
+                                    *map(int, options[3:]),
+                                    member_shape=member_shape)
+
+        if kind == 'probe' and len(options) <= 2:
+            return ProbeReducer(
+                name, function,
+                indices=[int(index) for index in options[1].split(',')]
+                if len(options) == 2 else None,
+                every=int(options[0]) if len(options) > 0 else 1,
+                member_shape=member_shape
+            )
+
+        raise ValueError('Invalid reducer {}.'.format(value))
+
+    @classmethod
+    def __parse_field_save_every(cls, value: Optional[str]) -> Dict[str, int]:
+        """
+        Get how often to save the fields from the command line description.
+        :param value: The description or None.
+        :return: The number of steps between the saves of each field.
+        """
+
+        field_save_every = {}
+
+        for item in value.split(',') if value is not None else []:
+            name, _, every = item.partition(':')
+
+            if name not in ('psi', 'mu', 'supercurrent', 'normal_current',
+                            'a'):
+                raise ValueError('Unknown field {} to save.'.format(name))
+
+            field_save_every[name] = 0 if every == 'none' \
+                else int(float(every))
+
+        return field_save_every
+
+    @classmethod
+    def __parse_sweep(cls, value: str) -> np.ndarray:
+        """
+        Get the magnetic fields in a sweep from the command line description.
+        :param value: The description start:stop:count.
+        :return: The magnetic fields.
+        """
+
+        parts = value.split(':')
+
+        try:
+            start, stop, count = float(parts[0]), float(parts[1]), \
+                int(parts[2])
+        except (ValueError, IndexError):
+            raise ValueError('expected start:stop:count, got {}'
+                             .format(value)) from None
+
+        if len(parts) != 3 or count < 1:
+            raise ValueError('expected start:stop:count with at least one '
+                             'field, got {}'.format(value))
+
+        return np.linspace(start, stop, count)
+
+    @classmethod
+    def __get_sweep_simulations(cls,
+                                data_handler: SweepDataHandler,
+                                sweep_fields: np.ndarray,
+                                current: float,
+                                batch: int
+                                ) -> Iterator[Tuple[Any, Any, Optional[int],
+                                                    Any]]:
+        """
+        Get the simulations in a field sweep.
+        :param data_handler: The data handler for the sweep.
+        :param sweep_fields: The magnetic fields.
+        :param current: The current.
+        :param batch: The number of fields to advance together.
+        :return: The current, magnetic field, ensemble size and data handler
+        for each simulation.
+        """
+
+        for start in range(0, len(sweep_fields), batch):
+            stop = min(start + batch, len(sweep_fields))
+
+            if stop - start == 1:
+                yield current, sweep_fields[start], None, \
+                    data_handler.get_field_handler(start)
+                continue
+
+            yield np.full(stop - start, current, dtype=np.float64), \
+                sweep_fields[start:stop].copy(), stop - start, \
+                EnsembleDataHandler([
+                    data_handler.get_field_handler(k)
+                    for k in range(start, stop)
+                ])
+
+    @classmethod
+    def __get_member_output(cls, output: str, member: int) -> str:
+
+        # Add the member index to the file name
+        name_parts = output.split('.')
+        return '{}_{}.{}'.format('.'.join(name_parts[:-1]), member,
+                                 name_parts[-1])
+
+    @classmethod
+    def __get_vector_potential(cls, mesh: Mesh, magnetic_field: float
+                               ) -> np.ndarray:
+        return np.array([
+            - magnetic_field * mesh.edge_mesh.y / 2,
+            magnetic_field * mesh.edge_mesh.x / 2
+        ]).transpose()
+
     @classmethod
     def __get_edge_boundary(cls,
                             mesh: Mesh,
@@ -176,10 +633,23 @@ class Simulate:
             'Simulation started on {}'.format(start_time)
         )
 
+        # Create the timers for the phases of the simulation.
+        timer = PhaseTimer(self.args.timing)
+
+        # Start the live metrics server.
+        metrics = None
+        if self.args.metrics_port is not None:
+            metrics = MetricsServer(self.args.metrics_port)
+            self.logger.info(
+                'Serving live metrics on http://127.0.0.1:{}/metrics'
+                .format(metrics.port)
+            )
+
         # Extract parameters.
         current = self.args.current
         current_max = self.args.current_max
         magnetic_field = self.args.magnetic_field
+        magnetic_field_max = self.args.magnetic_field_max
         u = self.args.complex_time_scale
         gamma = self.args.gamma
         dt = self.args.time_step
@@ -188,6 +658,75 @@ class Simulate:
         skip = int(self.args.skip)
         miniters = int(self.args.miniters) \
             if self.args.miniters is not None else None
+        adaptive = self.args.adaptive
+        dt_min = self.args.time_step_min \
+            if self.args.time_step_min is not None else dt / 100
+        dt_max = self.args.time_step_max \
+            if self.args.time_step_max is not None else dt * 50
+        steady_state = self.args.steady_state
+        steps_per_current = int(self.args.steps_per_current)
+        min_dwell = int(self.args.min_dwell) \
+            if self.args.min_dwell is not None \
+            else max(steps_per_current // 10, 1)
+        max_dwell = int(self.args.max_dwell) \
+            if self.args.max_dwell is not None else steps_per_current
+
+        find_ic = self.args.find_ic
+        probe_steps = int(self.args.probe_steps) \
+            if self.args.probe_steps is not None else steps_per_current
+        checkpoint_every = int(self.args.checkpoint_every)
+        resume = self.args.resume
+        field_save_every = self.__parse_field_save_every(self.args.save)
+        layout = Layout(self.args.layout)
+        storage = Storage.parse(self.args.storage)
+
+        if steady_state and current_max is None:
+            raise ValueError('Steady state mode requires an end current.')
+
+        if find_ic and current_max is None:
+            raise ValueError('The critical current search requires an end '
+                             'current.')
+
+        if find_ic and steady_state:
+            raise ValueError('The critical current search can not be combined '
+                             'with steady state mode.')
+
+        # Get the currents and fields for the members of an ensemble. The
+        # member index is the last axis of all ensemble values.
+        ensemble_size = None
+        if self.args.ensemble_currents is not None \
+                or self.args.ensemble_fields is not None:
+
+            if self.args.ensemble_currents is not None:
+                current = self.__parse_list(self.args.ensemble_currents)
+
+            if self.args.ensemble_fields is not None:
+                magnetic_field = self.__parse_list(self.args.ensemble_fields)
+
+            try:
+                current, magnetic_field = np.broadcast_arrays(
+                    np.atleast_1d(current), np.atleast_1d(magnetic_field)
+                )
+            except ValueError:
+                raise ValueError('The ensemble currents and fields must have '
+                                 'the same number of values.')
+
+            current = np.array(current, dtype=np.float64)
+            magnetic_field = np.array(magnetic_field, dtype=np.float64)
+            ensemble_size = len(current)
+
+        # Get the fields in a magnetic field sweep.
+        sweep_fields = None
+        if self.args.field_sweep is not None:
+
+            if ensemble_size is not None:
+                raise ValueError('A field sweep can not be combined with an '
+                                 'ensemble.')
+
+            sweep_fields = self.__parse_sweep(self.args.field_sweep)
+
+            if checkpoint_every > 0 or resume:
+                raise ValueError('A field sweep can not be checkpointed.')
 
         # Plot info about the mesh.
         self.logger.info(
@@ -195,18 +734,60 @@ class Simulate:
                 .format(self.args.input, self.args.output)
         )
 
-        # Start the data handler.
-        data_handler = DataHandler(
-            input_file=self.args.input,
-            output_file=self.args.output,
-            logger=self.logger
-        )
+        # Start the data handler. Each member of an ensemble is written to
+        # its own file and all fields in a sweep are written to one file.
+        if sweep_fields is not None:
+            self.logger.info(
+                'Running a sweep of {} magnetic fields.'
+                .format(len(sweep_fields))
+            )
+            data_handler = SweepDataHandler(
+                DataHandler(
+                    input_file=self.args.input,
+                    output_file=self.args.output,
+                    logger=self.logger,
+                    asynchronous=self.args.async_writes,
+                    storage=storage,
+                    frames=False
+                ),
+                sweep_fields,
+                layout=layout
+            )
+        elif ensemble_size is None:
+            data_handler = DataHandler(
+                input_file=self.args.input,
+                output_file=self.args.output,
+                logger=self.logger,
+                resume=resume,
+                asynchronous=self.args.async_writes,
+                layout=layout,
+                storage=storage
+            )
+        else:
+            self.logger.info(
+                'Running an ensemble of {} simulations.'.format(ensemble_size)
+            )
+            data_handler = EnsembleDataHandler([
+                DataHandler(
+                    input_file=self.args.input,
+                    output_file=self.__get_member_output(self.args.output,
+                                                         member),
+                    logger=self.logger,
+                    resume=resume,
+                    asynchronous=self.args.async_writes,
+                    layout=layout,
+                    storage=storage
+                )
+                for member in range(ensemble_size)
+            ])
 
         # Plot info about simulation.
         self.logger.info(
             'Running TDGL simulation with parameters:\n'
             'j          = {}\n'.format(current) +
-            'b          = {}\n'.format(magnetic_field) +
+            'b          = {}\n'.format(magnetic_field
+                                    if sweep_fields is None
+                                    else sweep_fields) +
             'u          = {}\n'.format(u) +
             'γ          = {}\n'.format(gamma) +
             'Δt         = {}\n'.format(dt) +
@@ -221,6 +802,44 @@ class Simulate:
                     .format(current, current_max)
             )
 
+        # Inform that the current is advanced at steady state.
+        if steady_state:
+            self.logger.info(
+                'Current will be advanced when the voltage is stationary '
+                'within {} after between {} and {} steps.'
+                .format(self.args.steady_tolerance, min_dwell, max_dwell)
+            )
+
+        # Inform that the critical current is searched for.
+        if find_ic:
+            self.logger.info(
+                'Critical current will be searched for from {} with voltage '
+                'threshold {} and tolerance {} using {} steps per probe.'
+                .format(current, self.args.ic_threshold,
+                        self.args.ic_tolerance, probe_steps)
+            )
+
+        # Inform that the magnetic field is interpolated.
+        if magnetic_field_max is not None:
+            self.logger.info(
+                'Magnetic field will be interpolated between {} and {}.'
+                .format(magnetic_field, magnetic_field_max)
+            )
+
+        # Inform that the time step is adaptive.
+        if adaptive:
+            self.logger.info(
+                'Time step will be adapted between {} and {} with tolerance '
+                '{}.'.format(dt_min, dt_max, self.args.adaptive_tolerance)
+            )
+
+        # Inform that checkpoints will be saved.
+        if checkpoint_every > 0:
+            self.logger.info(
+                'Saving a checkpoint every {} time steps.'
+                .format(checkpoint_every)
+            )
+
         # Inform that thermalization will by used.
         if skip > 0:
             self.logger.info(
@@ -258,49 +877,51 @@ class Simulate:
         # Get the output boundary.
         output_edges_index = self.__get_edge_boundary(mesh, output_edge)
 
-        # Compute the vector potential.
-        vector_potential = np.array([
-            - magnetic_field * mesh.edge_mesh.y / 2,
-            magnetic_field * mesh.edge_mesh.x / 2
-        ]).transpose()
+        # Create the matrix cache.
+        cache = MatrixCache(self.args.cache_dir, self.logger) \
+            if self.args.cache_dir is not None else None
 
         # Create the matrix builder for fields with Neumann boundary conditions
         # and no link variables.
-        builder = MatrixBuilder(mesh)
+        builder = MatrixBuilder(mesh).with_cache(cache)
 
         # Build matrices for scalar potential.
         mu_laplacian = builder.build(MatrixType.LAPLACIAN,
                                      sparse_format=SparseFormat.CSC)
-        mu_laplacian_lu = splu(mu_laplacian)
+        mu_solver_type = MuSolverType(self.args.mu_solver)
+
+        # Reuse the fill-reducing ordering of the factorization if it is
+        # cached.
+        ordering_key = cache.get_key(mesh, 'MU_COLUMN_ORDER') \
+            if cache is not None else None
+        column_order = cache.load_arrays(ordering_key) \
+            if cache is not None and mu_solver_type is MuSolverType.DIRECT \
+            else None
+
+        mu_solver = create_mu_solver(
+            solver_type=mu_solver_type,
+            laplacian=mu_laplacian,
+            areas=mesh.areas,
+            tolerance=self.args.mu_tolerance,
+            max_iterations=self.args.mu_max_iterations,
+            column_order=column_order['order']
+            if column_order is not None else None,
+            logger=self.logger
+        )
+
+        if cache is not None and isinstance(mu_solver, DirectMuSolver):
+            cache.save_arrays(ordering_key,
+                              {'order': mu_solver.get_column_order()})
         mu_boundary_laplacian = builder.build(
             MatrixType.NEUMANN_BOUNDARY_LAPLACIAN
         )
         mu_gradient = builder.build(MatrixType.GRADIENT)
 
-        # Build divergence for the supercurrent.
-        divergence = builder.build(MatrixType.DIVERGENCE)
-
-        # Update the builder and set fixed sites and link variables for
-        # the complex field.
+        # Update the builder and set fixed sites for the complex field.
         builder.with_dirichlet_boundary(
             fixed_sites=metal_boundary_index
-        ).with_link_exponents(
-            link_exponents=vector_potential
         )
 
-        # Build complex field matrices.
-        psi_laplacian = builder.build(MatrixType.LAPLACIAN)
-        psi_gradient = builder.build(MatrixType.GRADIENT)
-
-        # Initialize the complex field and the scalar potential.
-        psi = np.ones_like(mesh.x, dtype=np.complex128)
-        psi[metal_boundary_index] = 0
-        mu = np.zeros(len(mesh.x))
-        mu_boundary = np.zeros_like(mesh.edge_mesh.boundary_edge_indices,
-                                    dtype=np.float64)
-        mu_boundary[input_edges_index] = current
-        mu_boundary[output_edges_index] = -current
-
         # Create the alpha parameter which weakens the complex field if it
         # is less than unity.
         alpha = np.ones_like(mesh.x, dtype=np.float64)
@@ -308,101 +929,451 @@ class Simulate:
         # Load the voltage points.
         voltage_points = data_handler.get_voltage_points()
 
-        # Precompute values.
-        sq_gamma = gamma ** 2
-
-        # Define the update function.
-        def update(state, running_state, psi_val, mu_val,
-                   supercurrent_val, normal_current_val):
-
-            # Extract data from the state
-            dt_val = state['dt']
-            i = state['step']
-
-            # Update the current to allow running IV curves
-            if current_max is not None:
-                current_val = (current_max - current) \
-                              * (i // self.args.steps_per_current) \
-                              / (steps // self.args.steps_per_current) + current
-                mu_boundary[input_edges_index] = current_val
-                mu_boundary[output_edges_index] = -current_val
-                state['current'] = current_val
-                running_state.append('current', current_val)
+        # Split the matrix products and the complex field update into blocks
+        # of rows that are run concurrently.
+        executor = ParallelExecutor(self.args.threads) \
+            if self.args.threads > 1 else None
+
+        if executor is not None:
+            mu_gradient = PartitionedMatrix(mu_gradient, executor)
+            mu_boundary_laplacian = PartitionedMatrix(mu_boundary_laplacian,
+                                                      executor)
+
+        # Save checkpoints next to the output file.
+        checkpoint = Checkpoint(
+            data_handler.get_output_path() + '.checkpoint', self.logger
+        ) if checkpoint_every > 0 or resume else None
+
+        # Get the simulations to run. A sweep runs batches of fields and
+        # reuses everything that does not depend on the field.
+        if sweep_fields is None:
+            simulations = [(current, magnetic_field, ensemble_size,
+                            data_handler)]
+        else:
+            simulations = self.__get_sweep_simulations(
+                data_handler, sweep_fields, current, self.args.sweep_batch
+            )
+
+        # The complex field Laplacian of the previous batch in a sweep
+        previous_laplacian = None
+        previous_size = None
+        previous_shared = None
+        previous_updater = None
+
+        for current, magnetic_field, ensemble_size, run_data_handler \
+                in simulations:
+            # Compute the vector potential.
+            if ensemble_size is None:
+                vector_potential = self.__get_vector_potential(mesh,
+                                                               magnetic_field)
             else:
-                running_state.append('current', current)
+                vector_potential = np.stack([
+                    self.__get_vector_potential(mesh, field)
+                    for field in magnetic_field
+                ], axis=-1)
+
+            # Build the complex field Laplacian. Members of an ensemble share
+            # the matrix if they have the same magnetic field and otherwise
+            # use a batch with one matrix per member.
+            shared_laplacian = ensemble_size is None \
+                or np.all(magnetic_field == magnetic_field[0])
+            laplacian_link_exponents = vector_potential[..., 0] \
+                if ensemble_size is not None and shared_laplacian \
+                else vector_potential
+
+            if previous_laplacian is not None \
+                    and previous_size == ensemble_size \
+                    and previous_shared == shared_laplacian:
+
+                # Reuse the Laplacian of the previous batch in a sweep and
+                # only update the link variables.
+                psi_laplacian = previous_laplacian
+                link_updater = previous_updater
+                link_updater.update(laplacian_link_exponents)
+            else:
+                if shared_laplacian:
+                    builder.with_link_exponents(
+                        link_exponents=laplacian_link_exponents
+                    )
+                    psi_laplacian = builder.build(MatrixType.LAPLACIAN)
+                else:
+                    psi_laplacians = []
+                    for member in range(ensemble_size):
+                        builder.with_link_exponents(
+                            link_exponents=vector_potential[..., member]
+                        )
+                        psi_laplacians.append(
+                            builder.build(MatrixType.LAPLACIAN)
+                        )
+                    psi_laplacian = BatchedCsrMatrix.from_matrices(
+                        psi_laplacians
+                    )
+
+                # Prepare in-place updates of the link variables if the
+                # magnetic field changes.
+                link_updater = LinkUpdater(mesh, psi_laplacian) \
+                    if magnetic_field_max is not None \
+                    or sweep_fields is not None else None
+
+            previous_laplacian = psi_laplacian
+            previous_size = ensemble_size
+            previous_shared = shared_laplacian
+            previous_updater = link_updater
+
+            # Shape of site and edge values with an extra axis for the
+            # members of an ensemble.
+            member_shape = (ensemble_size,) if ensemble_size is not None \
+                else ()
+            site_shape = (len(mesh.x),) + member_shape
+
+            # Initialize the complex field and the scalar potential.
+            psi = np.ones(site_shape, dtype=np.complex128)
+            psi[metal_boundary_index] = 0
+            mu = np.zeros(site_shape)
+            mu_boundary = np.zeros(
+                (len(mesh.edge_mesh.boundary_edge_indices),) + member_shape,
+                dtype=np.float64
+            )
+            mu_boundary[input_edges_index] = current
+            mu_boundary[output_edges_index] = -current
+
+            # Create the kernel for the complex field update.
+            psi_kernel = PsiKernel(
+                laplacian=psi_laplacian,
+                alpha=alpha,
+                u=u,
+                gamma=gamma,
+                shape=psi.shape,
+                executor=executor,
+                step_doubling=adaptive
+            )
 
-            # Compute the next time step for psi with the discrete gauge
-            # invariant discretization presented in chapter 5 in
-            # http://urn.kb.se/resolve?urn=urn:nbn:se:kth:diva-312132
+            # Create the kernel for the supercurrent and its divergence.
+            supercurrent_kernel = SupercurrentKernel(
+                mesh=mesh,
+                shape=psi.shape,
+                link_exponents=vector_potential,
+                executor=executor
+            )
 
-            # Compute the absolute square psi
-            abs_sq_psi = np.abs(psi_val) ** 2
+            # The vector potential is linear in the field, which is used to
+            # update it in place if the magnetic field is interpolated.
+            unit_vector_potential = self.__get_vector_potential(mesh, 1)
+            if ensemble_size is not None:
+                unit_vector_potential = unit_vector_potential[..., None]
+
+            # Create the convergence driven current ramp with as many
+            # currents as the fixed schedule from the first to the last
+            # current.
+            current_levels = steps // steps_per_current
+            ramp = SteadyStateRamp(
+                levels=[(current_max - current) * level
+                        / max(current_levels - 1, 1) + current
+                        for level in range(current_levels)],
+                tolerance=self.args.steady_tolerance,
+                min_dwell=min_dwell,
+                max_dwell=max_dwell,
+                window=min_dwell // 2
+            ) if steady_state else None
+
+            # Create the critical current search.
+            search = CriticalCurrentSearch(
+                low=current,
+                high=current_max,
+                threshold=self.args.ic_threshold,
+                tolerance=self.args.ic_tolerance,
+                probe_steps=probe_steps
+            ) if find_ic else None
+
+            # Create the time step controller.
+            time_step = AdaptiveTimeStep(
+                dt=dt,
+                dt_min=dt_min,
+                dt_max=dt_max,
+                tolerance=self.args.adaptive_tolerance
+            ) if adaptive else None
+
+            # Get the quantities that are derived from psi and mu.
+            quantities = {
+                'psi_modulus': lambda psi_val, _: np.abs(psi_val),
+                'psi_modulus_squared': lambda psi_val, _:
+                np.abs(psi_val) ** 2,
+                'mu': lambda _, mu_val: mu_val,
+                'supercurrent': lambda psi_val, _:
+                supercurrent_kernel.get_supercurrent(psi_val),
+                'normal_current': lambda _, mu_val: - (mu_gradient @ mu_val),
+                'voltage': lambda _, mu_val:
+                mu_val[voltage_points[0]] - mu_val[voltage_points[1]]
+            }
+
+            # Create the reducers.
+            reducers = [
+                self.__parse_reducer(value, quantities, member_shape)
+                for value in self.args.reduce
+            ] if self.args.reduce is not None else []
+
+            # Get the number of steps spent at each visited current. Ensembles
+            # have the same dwell times for all members.
+            def get_dwell_times():
+                dwell_times = np.asarray(ramp.dwell_times, dtype=np.int64)
+                return np.broadcast_to(
+                    dwell_times.reshape((-1,) + (1,) * len(member_shape)),
+                    dwell_times.shape + member_shape
+                )
+
+            # The magnetic field of the vector potential. It is tracked
+            # separately from the state since a resumed state may have a
+            # different field than the vector potential.
+            applied_field = magnetic_field
+
+            # Set the vector potential and the link exponents for a field.
+            def apply_field(field_val):
+                nonlocal applied_field
+
+                if np.all(field_val == applied_field):
+                    return
+
+                with timer.time('field update'):
+                    np.multiply(unit_vector_potential, field_val,
+                                out=vector_potential)
+                    link_updater.update(laplacian_link_exponents)
+                    supercurrent_kernel.set_link_exponents(vector_potential)
+                applied_field = field_val
+
+            # Define the update function.
+            def update(state, running_state, psi_val, mu_val):
+
+                # Extract data from the state
+                dt_val = state['dt']
+                i = state['step']
+
+                # Restart the ramp and the search in each stage
+                if ramp is not None and i == 0:
+                    ramp.reset()
+                    state['dwell times'] = get_dwell_times()
+
+                if search is not None and i == 0:
+                    search.reset()
+
+                if time_step is not None and i == 0:
+                    time_step.restart()
+
+                # The position in the current and field schedules is the
+                # step, or the elapsed time in initial time steps when the
+                # time step is adaptive
+                position = i if time_step is None \
+                    else time_step.elapsed / dt
+
+                # Update the current to allow running IV curves
+                if ramp is not None or search is not None:
+                    current_val = ramp.get_value() if ramp is not None \
+                        else search.get_value()
+                    mu_boundary[input_edges_index] = current_val
+                    mu_boundary[output_edges_index] = -current_val
+                    state['current'] = current_val
+                    running_state.append('current', current_val)
+                elif current_max is not None:
+                    levels = steps // self.args.steps_per_current
+                    current_val = (current_max - current) * min(
+                        position // self.args.steps_per_current, levels
+                    ) / levels + current
+                    mu_boundary[input_edges_index] = current_val
+                    mu_boundary[output_edges_index] = -current_val
+                    state['current'] = current_val
+                    running_state.append('current', current_val)
+                else:
+                    running_state.append('current', current)
+
+                # Update the magnetic field to allow field sweeps
+                if magnetic_field_max is not None:
+                    levels = steps // self.args.steps_per_field
+                    field_val = (magnetic_field_max - magnetic_field) * min(
+                        position // self.args.steps_per_field, levels
+                    ) / levels + magnetic_field
+
+                    if np.any(field_val != applied_field):
+                        apply_field(field_val)
+                        state['magnetic field'] = field_val
+
+                # Compute the next time step for psi with the discrete gauge
+                # invariant discretization presented in chapter 5 in
+                # http://urn.kb.se/resolve?urn=urn:nbn:se:kth:diva-312132
+                with timer.time('psi update'):
+                    if time_step is None:
+                        psi_val = psi_kernel.step(psi_val, mu_val, dt_val)
+
+                    else:
+
+                        # Retry the step with a smaller time step until the
+                        # error estimated by step doubling is accepted
+                        with np.errstate(invalid='ignore'):
+                            while True:
+                                dt_val = time_step.dt
+                                new_psi_val, error, min_discriminant = \
+                                    psi_kernel.step_doubled(psi_val, mu_val,
+                                                            dt_val)
+
+                                if time_step.check(error, min_discriminant):
+                                    break
+
+                        psi_val = new_psi_val
+
+                        # Report the time step that was used
+                        state['dt'] = dt_val
+                        running_state.append('dt', dt_val)
+
+                # Get the supercurrent divergence.
+                with timer.time('supercurrent divergence'):
+                    supercurrent_divergence = \
+                        supercurrent_kernel.get_divergence(psi_val)
+
+                # Solve for mu
+                with timer.time('mu solve'):
+                    lhs = supercurrent_divergence - (
+                            mu_boundary_laplacian @ mu_boundary)
+                    mu_val = mu_solver.solve(lhs, mu_val)
+
+                # Report the convergence of iterative solvers
+                if isinstance(mu_solver, IterativeMuSolver):
+                    state['mu iterations'] = mu_solver.last_iterations
+                    state['mu residual'] = mu_solver.last_residual
+
+                # Update the voltage
+                state['flow'] += (mu_val[voltage_points[0]] - mu_val[
+                    voltage_points[1]]) * state['dt']
+                running_state.append('voltage', mu_val[voltage_points[0]]
+                                     - mu_val[voltage_points[1]])
+
+                # Advance the ramp when the signals are stationary and end
+                # after the last current.
+                if ramp is not None:
+                    ramp.update(mu_val[voltage_points[0]]
+                                - mu_val[voltage_points[1]],
+                                psi_kernel.get_mean_modulus_squared())
+                    state['dwell'] = ramp.dwell
+                    if ramp.dwell == 0:
+                        state['dwell times'] = get_dwell_times()
+
+                # Probe the next current when a probe is complete and restart
+                # resistive probes from the last superconducting state.
+                if search is not None:
+                    psi_val, mu_val = search.update(
+                        mu_val[voltage_points[0]] - mu_val[voltage_points[1]],
+                        state['dt'], psi_val, mu_val
+                    )
+                    critical_current, uncertainty = \
+                        search.get_critical_current()
+                    state['critical current'] = critical_current
+                    state['critical current uncertainty'] = uncertainty
+
+                return psi_val, mu_val
+
+            # Restore the link exponents of the resumed field before the
+            # first resumed step and the observables saved with it.
+            if resume and magnetic_field_max is not None:
+                apply_field(checkpoint.load()['state']['magnetic field'])
+
+            Runner(
+                function=update,
+                data_handler=run_data_handler,
+                initial_values=[psi, mu],
+                names=('psi', 'mu'),
+                observables=dict(
+                    (name, quantities[name])
+                    for name in ('supercurrent', 'normal_current')
+                ),
+                fixed_values=[vector_potential],
+                fixed_names=('a',),
+                state={
+                    'current': current,
+                    'flow': np.zeros(member_shape) if ensemble_size is not None
+                    else 0,
+                    'magnetic field': magnetic_field,
+                    'u': u,
+                    'gamma': gamma
+                },
+                running_names=('voltage', 'current', 'dt') if adaptive
+                else ('voltage', 'current'),
+                steps=steps,
+                dt=dt,
+                save_every=save_every,
+                logger=self.logger,
+                skip=skip,
+                miniters=miniters,
+                ensemble_size=ensemble_size,
+                checkpoint=checkpoint,
+                checkpoint_every=checkpoint_every,
+                checkpoint_objects=dict(
+                    (name, obj) for name, obj in (('ramp', ramp),
+                                                  ('search', search),
+                                                  ('time step', time_step))
+                    if obj is not None
+                ),
+                resume=resume,
+                timer=timer,
+                metrics=metrics,
+                reducers=reducers,
+                save_values=not self.args.no_fields,
+                field_save_every=field_save_every,
+                is_finished=lambda: (ramp is not None and ramp.finished)
+                or (search is not None and search.finished)
+            ).run()
+
+            # Inform about the dwell times.
+            if ramp is not None:
+                self.logger.info(
+                    'Visited {} of {} currents with dwell times between {} '
+                    'and {} steps.'.format(len(ramp.dwell_times),
+                                           len(ramp.levels),
+                                           min(ramp.dwell_times, default=0),
+                                           max(ramp.dwell_times, default=0))
+                )
+
+            # Inform about the critical current.
+            if search is not None:
+                critical_current, uncertainty = search.get_critical_current()
+                if not search.finished:
+                    self.logger.warning(
+                        'The critical current search did not converge in {} '
+                        'steps.'.format(steps)
+                    )
+                self.logger.info(
+                    'Critical current {} ± {} after {} probes.'
+                    .format(critical_current, uncertainty, search.probes)
+                )
+
+            # Inform about the time step statistics.
+            if adaptive:
+                self.logger.info(
+                    'Accepted {} and rejected {} steps with time steps '
+                    'between {} and {}.'.format(time_step.accepted,
+                                                time_step.rejected,
+                                                time_step.smallest_dt,
+                                                time_step.largest_dt)
+                )
+
+        # Save the timing report in the output and next to it.
+        if self.args.timing:
+            report = timer.save_report(
+                data_handler.get_output_path() + '.timing.json'
+            )
+            data_handler.save_attributes({'timing': report})
+            self.logger.info('Timing of the simulation phases:\n{}'
+                             .format(report))
 
-            # Compute z
-            z = np.exp(-1j * mu_val * dt_val) * sq_gamma / 2 * psi_val
+        data_handler.close()
 
-            # Compute w
-            w = z * abs_sq_psi + np.exp(-1j * mu_val * dt_val) * (
-                    psi_val + dt_val / u * np.sqrt(1 + sq_gamma * abs_sq_psi)
-                    * ((alpha - abs_sq_psi) * psi_val
-                       + psi_laplacian @ psi_val)
-            )
+        if executor is not None:
+            executor.close()
 
-            # Compute a
-            a = w.real * z.real + w.imag * z.imag
-
-            # Find the modulus squared for the next time step
-            new_sq_psi = 2 * np.abs(w) ** 2 / (2 * a + 1 + np.sqrt(
-                (2 * a + 1) ** 2 - 4 * np.abs(z) ** 2 * np.abs(w) ** 2))
-
-            # Compute the new psi.
-            psi_val = w - z * new_sq_psi
-
-            # Get the supercurrent
-            supercurrent_val = get_supercurrent(psi_val, psi_gradient,
-                                                mesh.edge_mesh.edges)
-            supercurrent_divergence = divergence @ supercurrent_val
-
-            # Solve for mu
-            lhs = supercurrent_divergence - (
-                    mu_boundary_laplacian @ mu_boundary)
-            mu_val = mu_laplacian_lu.solve(lhs)
-
-            normal_current_val = - mu_gradient @ mu_val
-
-            # Update the voltage
-            state['flow'] += (mu_val[voltage_points[0]] - mu_val[
-                voltage_points[1]]) * state['dt']
-            running_state.append('voltage', mu_val[voltage_points[0]] - mu_val[
-                voltage_points[1]])
-
-            return psi_val, mu_val, supercurrent_val, normal_current_val
-
-        Runner(
-            function=update,
-            data_handler=data_handler,
-            initial_values=[psi, mu, np.zeros(len(mesh.edge_mesh.edges)),
-                            np.zeros(len(mesh.edge_mesh.edges))],
-            names=('psi', 'mu', 'supercurrent', 'normal_current'),
-            fixed_values=[vector_potential],
-            fixed_names=('a',),
-            state={
-                'current': current,
-                'flow': 0,
-                'magnetic field': magnetic_field,
-                'u': u,
-                'gamma': gamma
-            },
-            running_names=('voltage', 'current'),
-            steps=steps,
-            dt=dt,
-            save_every=save_every,
-            logger=self.logger,
-            skip=skip,
-            miniters=miniters
-        ).run()
+        if metrics is not None:
+            metrics.close()
 
-        data_handler.close()
+        # Inform about the scalar potential solver statistics.
+        for key, value in mu_solver.get_statistics().items():
+            self.logger.info(
+                'Scalar potential solver {}: {}'.format(key, value)
+            )
 
         end_time = datetime.now()
         self.logger.info(
@@ -0,0 +1,86 @@
+import queue
+import threading
+from typing import Callable, Optional
+
+
+class AsyncWriter:
+    """
+    Background thread that runs write operations in the order they are
+    submitted. The queue of pending writes is bounded, so submitting blocks
+    when the writer falls behind. An error in a write is raised in the
+    submitting thread on the next submit, flush or close, and writes
+    submitted after the error are discarded.
+    """
+
+    def __init__(self, max_pending: int = 2):
+        """
+        Create the writer and start its thread.
+
+        :param max_pending: The largest number of writes waiting in the
+        queue.
+        """
+
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.error: Optional[BaseException] = None
+        self.thread = threading.Thread(target=self.__work, daemon=True)
+        self.thread.start()
+
+    def __work(self):
+        """
+        Run the submitted writes until the writer is closed.
+        """
+
+        while True:
+            task = self.queue.get()
+
+            try:
+                if task is None:
+                    return
+
+                if self.error is None:
+                    function, args = task
+                    function(*args)
+            except BaseException as error:
+                self.error = error
+            finally:
+                self.queue.task_done()
+
+    def __raise_error(self):
+        """
+        Raise the error of a failed write.
+        """
+
+        if self.error is not None:
+            raise RuntimeError('Writing data failed.') from self.error
+
+    def submit(self, function: Callable, *args):
+        """
+        Submit a write. Blocks while the queue is full.
+
+        :param function: The function that writes the data.
+        :param args: The arguments of the function. They must not be changed
+        until the write is done.
+        """
+
+        self.__raise_error()
+        self.queue.put((function, args))
+
+    def flush(self):
+        """
+        Wait until all submitted writes are done.
+        """
+
+        self.queue.join()
+        self.__raise_error()
+
+    def close(self):
+        """
+        Finish the submitted writes and stop the thread.
+        """
+
+        if self.thread.is_alive():
+            self.queue.join()
+            self.queue.put(None)
+            self.thread.join()
+
+        self.__raise_error()
@@ -0,0 +1,64 @@
+import logging
+import os
+import pickle
+import tempfile
+from typing import Optional, Dict, Any
+
+
+class Checkpoint:
+    """
+    Checkpoint file with the full state of a simulation. The checkpoint is
+    written to a temporary file that replaces the previous checkpoint when it
+    is complete, such that a preempted simulation always leaves a complete
+    checkpoint behind.
+    """
+
+    def __init__(self, path: str, logger: Optional[logging.Logger] = None):
+        """
+        Create the checkpoint.
+
+        :param path: The checkpoint file.
+        :param logger: Logger used to inform about saved checkpoints.
+        """
+
+        self.path = os.path.abspath(path)
+        self.logger = logger if logger is not None else logging.getLogger()
+
+    def save(self, payload: Dict[str, Any]):
+        """
+        Save a checkpoint.
+        :param payload: The simulation state.
+        """
+
+        directory = os.path.dirname(self.path)
+        os.makedirs(directory, exist_ok=True)
+
+        file, temp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+
+        try:
+            with os.fdopen(file, 'wb') as temp_file:
+                pickle.dump(payload, temp_file,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+                temp_file.flush()
+                os.fsync(temp_file.fileno())
+
+            os.replace(temp_path, self.path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+        self.logger.debug('Saved checkpoint at step {} to {}.'
+                          .format(payload.get('step'), self.path))
+
+    def load(self) -> Dict[str, Any]:
+        """
+        Load the checkpoint.
+        :return: The simulation state.
+        """
+
+        if not os.path.isfile(self.path):
+            raise FileNotFoundError('No checkpoint found at {}.'
+                                    .format(self.path))
+
+        with open(self.path, 'rb') as file:
+            return pickle.load(file)
@@ -1,11 +1,15 @@
 import logging
 from pathlib import Path
-from typing import Optional, Tuple, Dict
+from typing import Optional, Tuple, Dict, Any
 from os import path, getcwd
 
 import h5py
 import numpy as np
 
+from src.io.async_writer import AsyncWriter
+from src.io.frame_layout import Layout, create_frame_writer, \
+    open_frame_writer, GroupFrameWriter
+from src.io.storage import Storage
 from src.mesh.mesh import Mesh
 
 
@@ -17,7 +21,12 @@ class DataHandler:
     def __init__(self,
                  input_file: str,
                  output_file: str,
-                 logger: Optional[logging.Logger] = None
+                 logger: Optional[logging.Logger] = None,
+                 resume: bool = False,
+                 asynchronous: bool = False,
+                 layout: Layout = Layout.GROUPS,
+                 storage: Optional[Storage] = None,
+                 frames: bool = True
                  ):
         """
         Create a data handler.
@@ -25,6 +34,16 @@ class DataHandler:
         :param input_file: File to use as input for the simulation.
         :param output_file: File to use as output for simulation data.
         :param logger: Logger used to inform about errors.
+        :param resume: Open an existing output file to continue a
+        simulation instead of creating a new file.
+        :param asynchronous: Write the time steps in a background thread
+        while the simulation continues.
+        :param layout: The layout of the saved time steps. A resumed file
+        keeps its layout.
+        :param storage: The storage options of the fields, which are recorded
+        in the output file. A resumed file keeps its storage options.
+        :param frames: Write time steps at the top level of the output file.
+        Sweeps write the time steps of each field to its own group instead.
         """
 
         self.input_file = h5py.File(path.join(getcwd(), input_file), 'r')
@@ -32,17 +51,33 @@ class DataHandler:
         self.output_file = None
         self.mesh_group = None
         self.mesh = None
-        self.time_step_group = None
+        self.frame_writer = None
         self.save_number = 0
+        self.storage = storage if storage is not None else Storage()
+        self.output_path = path.join(getcwd(), output_file)
+        self.writer = AsyncWriter() if asynchronous else None
         self.logger = logger if logger is not None else logging.getLogger()
 
-        self.output_file, output_path = self.__create_output_file(
+        self.mesh = self.__create_mesh(self.input_file)
+
+        if resume:
+            self.output_file = h5py.File(self.output_path, 'r+')
+            self.mesh_group = self.output_file['mesh']
+            self.storage = Storage.load(self.output_file.attrs)
+            self.frame_writer = open_frame_writer(self.output_file,
+                                                  self.storage)
+            self.save_number = self.frame_writer.get_frame_count()
+            return
+
+        self.output_file, self.output_path = self.__create_output_file(
             output_file,
             self.logger
         )
         self.mesh_group = self.output_file.create_group('mesh')
-        self.time_step_group = self.output_file.create_group('data')
-        self.mesh = self.__create_mesh(self.input_file)
+        self.storage.save(self.output_file.attrs)
+        self.frame_writer = create_frame_writer(self.output_file, layout,
+                                                self.storage) \
+            if frames else None
         self.mesh.save_to_hdf5(self.mesh_group)
 
     @classmethod
@@ -111,12 +146,68 @@ class DataHandler:
         return Mesh.load_from_hdf5(input_file)
 
     def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+        if self.frame_writer is not None:
+            self.frame_writer.close()
         self.input_file.close()
         self.output_file.close()
 
+    def flush(self):
+        if self.writer is not None:
+            self.writer.flush()
+
+        if self.frame_writer is not None:
+            self.frame_writer.flush()
+        self.output_file.flush()
+
+    def get_output_path(self) -> str:
+        return self.output_path
+
+    def get_storage(self) -> Storage:
+        return self.storage
+
+    def save_attributes(self, attributes: Dict[str, Any]):
+        """
+        Save attributes of the output file.
+        :param attributes: The attributes to save.
+        """
+
+        if self.writer is not None:
+            self.writer.flush()
+
+        for key, value in attributes.items():
+            self.output_file.attrs[key] = value
+
+    def get_save_number(self) -> int:
+        return self.save_number
+
+    def set_save_number(self, save_number: int):
+        """
+        Continue saving from a save number. Time steps saved after it are
+        removed.
+
+        :param save_number: The number of the next saved time step.
+        """
+
+        if self.writer is not None:
+            self.writer.flush()
+
+        self.frame_writer.truncate(save_number)
+        self.save_number = save_number
+
     def get_last_step(self) -> h5py.Group:
-        last_save_number = self.__get_save_number_stored(self.time_step_group)
-        return self.time_step_group['{}'.format(last_save_number)]
+        if not isinstance(self.frame_writer, GroupFrameWriter):
+            raise RuntimeError('The last step can only be read as a group '
+                               'in the groups layout.')
+
+        if self.writer is not None:
+            self.writer.flush()
+
+        time_step_group = self.frame_writer.group
+        last_save_number = self.__get_save_number_stored(time_step_group)
+        return time_step_group['{}'.format(last_save_number)]
 
     def get_mesh(self) -> Mesh:
         return self.mesh
@@ -125,14 +216,139 @@ class DataHandler:
         return self.mesh.voltage_points
 
     def save_time_step(self, params: Dict[str, float],
-                       data: Dict[str, np.ndarray]):
-        group = self.time_step_group.create_group('{}'.format(self.save_number))
+                       data: Dict[str, np.ndarray],
+                       running: Optional[Dict[str, np.ndarray]] = None):
+        self.save_frame(self.frame_writer, self.save_number, params, data,
+                        running)
         self.save_number += 1
 
+    def save_frame(self, frame_writer: Any, number: int,
+                   params: Dict[str, Any], data: Dict[str, np.ndarray],
+                   running: Optional[Dict[str, np.ndarray]] = None):
+        """
+        Save a time step with a frame writer. The values are copied and
+        written in the background if writing is asynchronous.
+
+        :param frame_writer: The writer for the layout of the time steps.
+        :param number: The number of the time step.
+        :param params: The state.
+        :param data: The fields.
+        :param running: The running state.
+        """
+
+        running = running if running is not None else {}
+
+        if self.writer is None:
+            frame_writer.save(number, params, data, running)
+            return
+
+        # Copy the arrays since the simulation continues to change them
+        self.writer.submit(
+            frame_writer.save, number,
+            dict((key, self.__copy(value)) for key, value in params.items()),
+            dict((key, self.__copy(value)) for key, value in data.items()),
+            dict((key, self.__copy(value)) for key, value in running.items())
+        )
+
+    def save_fixed(self, data: Dict[str, np.ndarray]):
+        """
+        Save values that do not change over time once to the fixed group
+        instead of with each time step.
+        :param data: The values.
+        """
+
+        self.save_fixed_group(self.output_file, data)
+
+    def save_fixed_group(self, parent: h5py.Group,
+                         data: Dict[str, np.ndarray]):
+        """
+        Save values that do not change over time to the fixed group of a
+        group. The values are copied and written in the background if writing
+        is asynchronous.
+
+        :param parent: The group to save the fixed group in.
+        :param data: The values.
+        """
+
+        if self.writer is None:
+            self.__write_fixed(parent, data)
+            return
+
+        # Copy the arrays since the simulation may change them
+        self.writer.submit(
+            self.__write_fixed, parent,
+            dict((key, self.__copy(value)) for key, value in data.items())
+        )
+
+    def __write_fixed(self, parent: h5py.Group, data: Dict[str, np.ndarray]):
+        group = parent.require_group('fixed')
+
+        for key, value in data.items():
+            if key in group:
+                del group[key]
+
+            self.storage.create_dataset(group, key, value)
+
+    def save_reduced(self, data: Dict[str, np.ndarray]):
+        """
+        Save the results of reducers to the reduced group, replacing earlier
+        results.
+        :param data: The results.
+        """
+
+        self.save_reduced_group(self.output_file, data)
+
+    def save_reduced_group(self, parent: h5py.Group,
+                           data: Dict[str, np.ndarray]):
+        """
+        Save the results of reducers to the reduced group of a group.
+        :param parent: The group to save the reduced group in.
+        :param data: The results.
+        """
+
+        if self.writer is not None:
+            self.writer.flush()
+
+        if 'reduced' in parent:
+            del parent['reduced']
+
+        self.save_group(parent, 'reduced', {}, data)
+
+    def save_group(self, parent: h5py.Group, name: str,
+                   params: Dict[str, Any], data: Dict[str, np.ndarray]):
+        """
+        Save values to a new group. The values are copied and written in the
+        background if writing is asynchronous.
+
+        :param parent: The group to create the group in.
+        :param name: The name of the group.
+        :param params: Values saved as attributes.
+        :param data: Values saved as datasets.
+        """
+
+        if self.writer is None:
+            self.__write_group(parent, name, params, data)
+            return
+
+        # Copy the arrays since the simulation continues to change them
+        self.writer.submit(
+            self.__write_group, parent, name,
+            dict((key, self.__copy(value)) for key, value in params.items()),
+            dict((key, self.__copy(value)) for key, value in data.items())
+        )
+
+    @classmethod
+    def __copy(cls, value: Any) -> Any:
+        return value.copy() if isinstance(value, np.ndarray) else value
+
+    def __write_group(self, parent: h5py.Group, name: str,
+                      params: Dict[str, Any], data: Dict[str, np.ndarray]):
+        group = parent.create_group(name)
+
         # Set an attribute to specify for which values this data was recorded
         for key, value in params.items():
             group.attrs[key] = value
 
         # Save the data
         for key, value in data.items():
-            group[key] = value
+            self.storage.create_dataset(group, key, value)
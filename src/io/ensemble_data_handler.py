@@ -0,0 +1,92 @@
+from typing import Sequence, Dict, Any, Optional
+
+import numpy as np
+
+from src.io.data_handler import DataHandler
+from src.mesh.mesh import Mesh
+
+
+class EnsembleDataHandler:
+    """
+    Data handler for an ensemble of simulations that are advanced together.
+    The member index is the last axis of all ensemble values and the data for
+    each member is written by its own data handler.
+    """
+
+    def __init__(self, data_handlers: Sequence[DataHandler]):
+        """
+        Create the ensemble data handler.
+
+        :param data_handlers: One data handler for each member.
+        """
+
+        self.data_handlers = list(data_handlers)
+
+    @classmethod
+    def __select_member(cls, value: Any, member: int) -> Any:
+        """
+        Select the value for a member.
+        :param value: A scalar value shared by all members or an array with
+        the member index as the last axis.
+        :param member: The member.
+        :return: The value for the member.
+        """
+
+        return value[..., member] if np.ndim(value) > 0 else value
+
+    def close(self):
+        for data_handler in self.data_handlers:
+            data_handler.close()
+
+    def flush(self):
+        for data_handler in self.data_handlers:
+            data_handler.flush()
+
+    def get_output_path(self) -> str:
+        return self.data_handlers[0].get_output_path()
+
+    def save_attributes(self, attributes: Dict[str, Any]):
+        for data_handler in self.data_handlers:
+            data_handler.save_attributes(attributes)
+
+    def get_save_number(self) -> int:
+        return self.data_handlers[0].get_save_number()
+
+    def set_save_number(self, save_number: int):
+        for data_handler in self.data_handlers:
+            data_handler.set_save_number(save_number)
+
+    def get_mesh(self) -> Mesh:
+        return self.data_handlers[0].get_mesh()
+
+    def get_voltage_points(self) -> np.ndarray:
+        return self.data_handlers[0].get_voltage_points()
+
+    def save_time_step(self, params: Dict[str, Any],
+                       data: Dict[str, np.ndarray],
+                       running: Optional[Dict[str, np.ndarray]] = None):
+        running = running if running is not None else {}
+
+        for member, data_handler in enumerate(self.data_handlers):
+            data_handler.save_time_step(
+                dict((key, self.__select_member(value, member))
+                     for key, value in params.items()),
+                dict((key, self.__select_member(value, member))
+                     for key, value in data.items()),
+                dict((key, self.__select_member(value, member))
+                     for key, value in running.items())
+            )
+
+    def save_fixed(self, data: Dict[str, np.ndarray]):
+        for member, data_handler in enumerate(self.data_handlers):
+            data_handler.save_fixed(
+                dict((key, self.__select_member(value, member))
+                     for key, value in data.items())
+            )
+
+    def save_reduced(self, data: Dict[str, np.ndarray]):
+        for member, data_handler in enumerate(self.data_handlers):
+            data_handler.save_reduced(
+                dict((key, self.__select_member(value, member))
+                     for key, value in data.items())
+            )
@@ -0,0 +1,620 @@
+from enum import Enum
+from typing import Dict, Any, Optional
+
+import h5py
+import numpy as np
+
+from src.io.storage import Storage
+
+
+class Layout(Enum):
+    """
+    Layouts of the saved time steps in the output file.
+
+    In the groups layout each time step is a group data/<n> with the state as
+    attributes and the fields as datasets. The running state is stored as in
+    the series layout, in running and running ends next to the data group.
+    Older files store it with each time step. The frame index next to them
+    has one row with the main state of each time step. Fields that are saved
+    once in the fixed group and again with the time steps where they have
+    changed have the numbers of these time steps in fixed frames/<name>.
+
+    In the series layout the fields, the state and the running state are
+    stored in resizable datasets in the series group, such that a sequence of
+    time steps is read with one slice:
+
+    - fields/<name>/values with one row per time step the field was saved in
+      and fields/<name>/frames with the numbers of those time steps.
+    - state/<key> with one row per time step. Keys that are added after the
+      first time step have the attribute first frame.
+    - running/<name> with the running state of all time steps after each
+      other and running ends with the end of each time step in them.
+    """
+
+    GROUPS = 'groups'
+    SERIES = 'series'
+
+    @classmethod
+    def get_keys(cls):
+        return list(item.value for item in Layout)
+
+
+# Names of the running state in older files with the groups layout, which
+# stored it with each time step
+RUNNING_NAMES = ('voltage', 'current', 'dt')
+
+# Number of rows in each chunk of the state and the running state
+CHUNK_ROWS = 1024
+
+
+def append_rows(dataset: h5py.Dataset, value: np.ndarray):
+    """
+    Append rows to a resizable dataset.
+    :param dataset: The dataset.
+    :param value: The rows.
+    """
+
+    size = len(dataset)
+    dataset.resize(size + len(value), axis=0)
+    dataset[size:] = value
+
+
+class RunningWriter:
+    """
+    Writes the running state of the time steps after each other to one
+    resizable dataset per variable in the running group, such that the whole
+    series is read with one slice. The end of each time step in them is
+    stored in running ends.
+    """
+
+    def __init__(self, parent: h5py.Group):
+        """
+        Create the writer or continue writing an existing series.
+        :param parent: The group to write the running state in.
+        """
+
+        self.running = parent.require_group('running')
+
+        if 'running ends' not in parent:
+            parent.create_dataset('running ends', shape=(0,),
+                                  maxshape=(None,), dtype=np.int64,
+                                  chunks=(CHUNK_ROWS,))
+
+        self.running_ends = parent['running ends']
+        self.frames = len(self.running_ends)
+
+    def get_frame_count(self) -> int:
+        return self.frames
+
+    def save(self, running: Dict[str, np.ndarray]):
+        """
+        Append the running state of a time step.
+        :param running: The running state.
+        """
+
+        start = self.running_ends[self.frames - 1] if self.frames > 0 else 0
+        end = start
+        for key, value in running.items():
+
+            # Variables that are added later start after the earlier steps
+            if key not in self.running:
+                self.running.create_dataset(
+                    key, shape=(start,), maxshape=(None,),
+                    dtype=np.asarray(value).dtype, chunks=(CHUNK_ROWS,)
+                )
+
+            append_rows(self.running[key], value)
+            end = start + len(value)
+
+        append_rows(self.running_ends, [end])
+        self.frames += 1
+
+    def truncate(self, frames: int):
+        """
+        Remove the time steps from a number.
+        :param frames: The number of time steps to keep.
+        """
+
+        end = self.running_ends[frames - 1] if frames > 0 else 0
+        for dataset in self.running.values():
+            dataset.resize(end, axis=0)
+
+        self.running_ends.resize(frames, axis=0)
+        self.frames = frames
+
+
+# Columns of the frame index and the state keys they are taken from
+FRAME_INDEX_DTYPE = np.dtype([
+    ('frame', np.int64),
+    ('step', np.int64),
+    ('time', np.float64),
+    ('dt', np.float64),
+    ('current', np.float64),
+    ('flow', np.float64),
+    ('magnetic field', np.float64),
+])
+
+
+def get_frame_index_row(frame: int, params: Dict[str, Any]) -> np.ndarray:
+    """
+    Get the row of the frame index for a time step.
+
+    :param frame: The number of the time step.
+    :param params: The state of the time step.
+    :return: The row. Columns that are missing from the state or are not
+    scalar are NaN, or zero for integer columns.
+    """
+
+    row = np.zeros(1, dtype=FRAME_INDEX_DTYPE)
+    row['frame'] = frame
+
+    for name in FRAME_INDEX_DTYPE.names[1:]:
+        value = params.get(name)
+        row[name] = value if value is not None and np.ndim(value) == 0 \
+            else (0 if FRAME_INDEX_DTYPE[name].kind == 'i' else np.nan)
+
+    return row
+
+
+def create_frame_index(parent: h5py.Group) -> h5py.Dataset:
+    """
+    Create the frame index of the time steps in the data group of a group
+    with the groups layout from the state of each time step, e.g. for files
+    that were written without it.
+
+    :param parent: The group with the data group.
+    :return: The frame index.
+    """
+
+    frames = sorted(int(key) for key in parent['data'].keys())
+    rows = np.concatenate(
+        [np.zeros(0, dtype=FRAME_INDEX_DTYPE)]
+        + [get_frame_index_row(frame,
+                               dict(parent['data'][str(frame)].attrs))
+           for frame in frames]
+    )
+
+    if 'frame index' in parent:
+        del parent['frame index']
+
+    return parent.create_dataset('frame index', data=rows,
+                                 maxshape=(None,), chunks=(CHUNK_ROWS,))
+
+
+class GroupFrameWriter:
+    """
+    Writes time steps with the groups layout.
+    """
+
+    def __init__(self, parent: h5py.Group, storage: Optional[Storage] = None):
+        """
+        Create the writer.
+        :param parent: The group to write the data group in.
+        :param storage: The storage options of the fields.
+        """
+
+        self.parent = parent
+        self.group = parent.require_group('data')
+        self.storage = storage if storage is not None else Storage()
+
+        # Older files store the running state with each time step, which is
+        # continued when they are resumed
+        self.running = RunningWriter(parent) \
+            if len(self.group) == 0 or 'running ends' in parent else None
+
+        # The frame index has one row with the main state of each time step
+        self.frame_index = parent['frame index'] \
+            if 'frame index' in parent else create_frame_index(parent)
+
+    def get_frame_count(self) -> int:
+        return len(self.group)
+
+    def __record_fixed_frame(self, key: str, number: int):
+        """
+        Record a time step in which a fixed field was saved again.
+        :param key: The name of the field.
+        :param number: The number of the time step.
+        """
+
+        frames = self.parent.require_group('fixed frames')
+
+        if key not in frames:
+            frames.create_dataset(key, shape=(0,), maxshape=(None,),
+                                  dtype=np.int64, chunks=(CHUNK_ROWS,))
+
+        append_rows(frames[key], [number])
+
+    def save(self, number: int, params: Dict[str, Any],
+             data: Dict[str, np.ndarray], running: Dict[str, np.ndarray]):
+        """
+        Save a time step.
+
+        :param number: The number of the time step.
+        :param params: The state.
+        :param data: The fields.
+        :param running: The running state.
+        """
+
+        group = self.group.create_group('{}'.format(number))
+
+        # Set an attribute to specify for which values this data was recorded
+        for key, value in params.items():
+            group.attrs[key] = value
+
+        append_rows(self.frame_index, get_frame_index_row(number, params))
+
+        # Save the data
+        for key, value in data.items():
+            self.storage.create_dataset(group, key, value)
+
+        # Record the time steps in which fixed fields have changed, such that
+        # they are found without reading the earlier time steps
+        fixed = self.parent.get('fixed')
+        for key in data.keys():
+            if fixed is not None and key in fixed:
+                self.__record_fixed_frame(key, number)
+
+        if self.running is not None:
+            self.running.save(running)
+            return
+
+        for key, value in running.items():
+            group[key] = value
+
+    def truncate(self, frames: int):
+        """
+        Remove the time steps from a number.
+        :param frames: The number of time steps to keep.
+        """
+
+        for key in list(self.group.keys()):
+            if int(key) >= frames:
+                del self.group[key]
+
+        self.frame_index.resize(
+            np.count_nonzero(self.frame_index['frame'] < frames), axis=0
+        )
+
+        if 'fixed frames' in self.parent:
+            for dataset in self.parent['fixed frames'].values():
+                dataset.resize(int(np.searchsorted(dataset[()], frames)),
+                               axis=0)
+
+        if self.running is not None:
+            self.running.truncate(frames)
+
+    def flush(self):
+
+        # The time steps are written with their final size
+        pass
+
+    def close(self):
+        pass
+
+
+class RowWriter:
+    """
+    Writes the rows of a resizable dataset. The dataset is grown by a number
+    of rows at a time instead of by each row and trimmed to the written rows
+    when the writer is trimmed, until then the rows after them hold the fill
+    value of the dataset.
+    """
+
+    def __init__(self, dataset: h5py.Dataset, rows: Optional[int] = None):
+        """
+        Create the writer.
+        :param dataset: The dataset.
+        :param rows: The number of written rows. All rows of the dataset are
+        written if it is None.
+        """
+
+        self.dataset = dataset
+        self.size = len(dataset)
+        self.rows = rows if rows is not None else self.size
+
+    def write(self, row: int, value: Any):
+        """
+        Write a row.
+        :param row: The number of the row.
+        :param value: The value of the row.
+        """
+
+        if row >= self.size:
+            self.size = (row // CHUNK_ROWS + 1) * CHUNK_ROWS
+            self.dataset.resize(self.size, axis=0)
+
+        self.dataset[row] = value
+        self.rows = max(self.rows, row + 1)
+
+    def append(self, value: Any):
+        self.write(self.rows, value)
+
+    def trim(self, rows: Optional[int] = None):
+        """
+        Resize the dataset to the written rows.
+        :param rows: The number of rows to keep. The written rows are kept if
+        it is None.
+        """
+
+        self.rows = min(self.rows, rows) if rows is not None else self.rows
+
+        if self.size != self.rows:
+            self.dataset.resize(self.rows, axis=0)
+            self.size = self.rows
+
+
+# Frame number of the rows of the field series that are not written yet,
+# which keeps the frame numbers ordered
+UNWRITTEN_FRAME = np.iinfo(np.int64).max
+
+
+class SeriesFrameWriter:
+    """
+    Writes time steps with the series layout. The datasets are grown by
+    chunks of rows and are trimmed to the saved time steps when the writer is
+    flushed or closed.
+    """
+
+    def __init__(self, parent: h5py.Group, storage: Optional[Storage] = None):
+        """
+        Create the writer or continue writing an existing series.
+        :param parent: The group to write the series group in.
+        :param storage: The storage options of the fields. Fields that
+        already have a dataset keep its options.
+        """
+
+        self.storage = storage if storage is not None else Storage()
+        self.group = parent.require_group('series')
+        self.fields = self.group.require_group('fields')
+        self.state = self.group.require_group('state')
+        self.running = RunningWriter(self.group)
+        self.frames = self.running.get_frame_count()
+
+        # Writers of the values and the frame numbers of each field and of
+        # each state column, with the type of the column
+        self.field_values = {}
+        self.field_frames = {}
+        self.columns = {}
+        self.column_types = {}
+
+        for key, field in self.fields.items():
+            self.field_values[key] = RowWriter(field['values'])
+            self.field_frames[key] = RowWriter(field['frames'])
+
+        for key, column in self.state.items():
+            self.columns[key] = RowWriter(column)
+            self.column_types[key] = h5py.check_vlen_dtype(column.dtype) \
+                or column.dtype
+
+        # Remove the rows of time steps that were not completed, e.g. when
+        # the writer was not closed
+        self.truncate(self.frames)
+
+    def get_frame_count(self) -> int:
+        return self.frames
+
+    @classmethod
+    def __get_fill_value(cls, dtype: np.dtype) -> Any:
+        return np.nan if dtype.kind in 'fc' else 0
+
+    def __create_field(self, key: str, value: np.ndarray):
+        """
+        Create the datasets of a field.
+        :param key: The name of the field.
+        :param value: A value of the field.
+        """
+
+        field = self.fields.create_group(key)
+
+        # Each chunk holds one time step unless a chunk size is set
+        kwargs = {'chunks': (1,) + value.shape}
+        kwargs.update(self.storage.get(key).get_dataset_options(value.shape,
+                                                                1))
+        values = field.create_dataset(
+            'values', shape=(0,) + value.shape,
+            maxshape=(None,) + value.shape, dtype=value.dtype, **kwargs
+        )
+        frames = field.create_dataset(
+            'frames', shape=(0,), maxshape=(None,), dtype=np.int64,
+            chunks=(CHUNK_ROWS,), fillvalue=UNWRITTEN_FRAME
+        )
+
+        self.field_values[key] = RowWriter(values)
+        self.field_frames[key] = RowWriter(frames)
+
+    def __create_column(self, key: str, value: np.ndarray, first_frame: int,
+                        dtype: Optional[np.dtype] = None) -> RowWriter:
+        """
+        Create a state column.
+
+        :param key: The state key.
+        :param value: A value of the key.
+        :param first_frame: The first time step with the key.
+        :param dtype: The type of the column. The type of the value is used
+        if it is None.
+        :return: The writer of the column.
+        """
+
+        dtype = np.dtype(dtype if dtype is not None else value.dtype)
+
+        if value.ndim == 0:
+            column = self.state.create_dataset(
+                key, shape=(0,), maxshape=(None,), dtype=dtype,
+                chunks=(CHUNK_ROWS,),
+                fillvalue=self.__get_fill_value(dtype)
+            )
+        elif value.ndim == 1:
+            column = self.state.create_dataset(
+                key, shape=(0,), maxshape=(None,),
+                dtype=h5py.vlen_dtype(dtype), chunks=(CHUNK_ROWS,)
+            )
+        else:
+            raise ValueError('The state value {} has more than one dimension.'
+                             .format(key))
+
+        column.attrs['first frame'] = first_frame
+
+        self.columns[key] = RowWriter(column)
+        self.column_types[key] = dtype
+
+        return self.columns[key]
+
+    def __get_column(self, key: str, value: np.ndarray,
+                     number: int) -> RowWriter:
+        """
+        Get the state column for a value. The column is created if it does
+        not exist and its type is promoted if it can not hold the value.
+
+        :param key: The state key.
+        :param value: The value.
+        :param number: The number of the time step.
+        :return: The writer of the column.
+        """
+
+        if key not in self.columns:
+            return self.__create_column(key, value, number)
+
+        dtype = self.column_types[key]
+
+        if np.can_cast(value.dtype, dtype, 'safe'):
+            return self.columns[key]
+
+        # Rewrite the column with a type that can hold both
+        column = self.columns[key].dataset
+        rows = column[:self.columns[key].rows]
+        first_frame = column.attrs['first frame']
+        del self.state[key]
+
+        writer = self.__create_column(key, value, first_frame,
+                                      np.result_type(dtype, value.dtype))
+        for row, row_value in enumerate(rows):
+            writer.write(row, row_value)
+
+        return writer
+
+    def save(self, number: int, params: Dict[str, Any],
+             data: Dict[str, np.ndarray], running: Dict[str, np.ndarray]):
+        """
+        Save a time step.
+
+        :param number: The number of the time step.
+        :param params: The state.
+        :param data: The fields.
+        :param running: The running state.
+        """
+
+        if number != self.frames:
+            raise ValueError('Time step {} can not follow {} time steps in '
+                             'the series layout.'.format(number, self.frames))
+
+        # Append the fields and the number of the time step
+        for key, value in data.items():
+            value = self.storage.get(key).convert(value)
+
+            if key not in self.field_values:
+                self.__create_field(key, value)
+
+            self.field_values[key].append(value)
+            self.field_frames[key].append(number)
+
+        # Set the state of the time step
+        for key, value in params.items():
+            value = np.asarray(value)
+            self.__get_column(key, value, number).write(number, value)
+
+        self.running.save(running)
+        self.frames += 1
+
+    def truncate(self, frames: int):
+        """
+        Remove the time steps from a number.
+        :param frames: The number of time steps to keep.
+        """
+
+        for key, field_frames in self.field_frames.items():
+            rows = int(np.searchsorted(
+                field_frames.dataset[:field_frames.rows], frames
+            ))
+            self.field_values[key].trim(rows)
+            field_frames.trim(rows)
+
+        for key in list(self.columns.keys()):
+            if self.columns[key].dataset.attrs['first frame'] >= frames:
+                del self.state[key]
+                del self.columns[key]
+                del self.column_types[key]
+            else:
+                self.columns[key].trim(frames)
+
+        self.running.truncate(frames)
+        self.frames = frames
+
+    def flush(self):
+
+        # Trim the datasets such that the file holds the saved time steps
+        self.truncate(self.frames)
+
+    def close(self):
+        self.flush()
+
+
+def create_frame_writer(parent: h5py.Group, layout: Layout,
+                        storage: Optional[Storage] = None):
+    """
+    Create a writer for time steps.
+    :param parent: The group to write the time steps in.
+    :param layout: The layout.
+    :param storage: The storage options of the fields.
+    :return: The writer.
+    """
+
+    if layout is Layout.SERIES:
+        return SeriesFrameWriter(parent, storage)
+
+    return GroupFrameWriter(parent, storage)
+
+
+def open_frame_writer(parent: h5py.Group, storage: Optional[Storage] = None):
+    """
+    Open a writer that continues writing the existing time steps of a group.
+    :param parent: The group with the time steps.
+    :param storage: The storage options of the fields.
+    :return: The writer.
+    """
+
+    return create_frame_writer(
+        parent, Layout.SERIES if 'series' in parent else Layout.GROUPS,
+        storage
+    )
+
+
+def convert_to_series(parent: h5py.Group, output: h5py.Group,
+                      storage: Optional[Storage] = None):
+    """
+    Convert time steps from the groups layout to the series layout.
+    :param parent: The group with the data group.
+    :param output: The group to write the series group in.
+    :param storage: The storage options of the fields.
+    """
+
+    frames = sorted(int(key) for key in parent['data'].keys())
+    writer = SeriesFrameWriter(output, storage)
+    running_ends = parent['running ends'][()] \
+        if 'running ends' in parent else None
+
+    for number, frame in enumerate(frames):
+        group = parent['data'][str(frame)]
+        data = dict((key, group[key][()]) for key in group.keys()
+                    if key not in RUNNING_NAMES)
+
+        if running_ends is None:
+            running = dict((key, group[key][()]) for key in group.keys()
+                           if key in RUNNING_NAMES)
+        else:
+            start = running_ends[frame - 1] if frame > 0 else 0
+            running = dict((key, dataset[start:running_ends[frame]])
+                           for key, dataset in parent['running'].items())
+
+        writer.save(number, dict(group.attrs), data, running)
+
+    writer.close()
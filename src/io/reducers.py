@@ -0,0 +1,258 @@
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Sequence, Optional, Tuple, Any
+
+import numpy as np
+
+
+class Reducer(ABC):
+    """
+    Reduces a quantity on the fly while the simulation runs, such that only
+    the reduced result has to be saved. The quantity is computed from the
+    parameters of the update function every given number of steps. Ensemble
+    results have the member index as the last axis.
+    """
+
+    def __init__(self,
+                 name: str,
+                 function: Callable[..., np.ndarray],
+                 every: int = 1,
+                 member_shape: Tuple[int, ...] = ()
+                 ):
+        """
+        Create the reducer.
+
+        :param name: Name of the quantity, used as prefix of the results.
+        :param function: Computes the quantity from the parameters of the
+        update function.
+        :param every: The number of steps between samples.
+        :param member_shape: The shape of the member axis of an ensemble.
+        """
+
+        if every < 1:
+            raise ValueError('A reducer must sample at least every step.')
+
+        self.name = name
+        self.function = function
+        self.every = every
+        self.member_shape = member_shape
+
+        # The time since the last sample
+        self.elapsed = 0.0
+
+    def get_state(self) -> Dict[str, Any]:
+        """
+        Get the state of the reduction, e.g. for a checkpoint.
+        :return: The attributes except the function.
+        """
+
+        state = dict(vars(self))
+        del state['function']
+        return state
+
+    def set_state(self, state: Dict[str, Any]):
+        """
+        Restore the state of the reduction.
+        :param state: The state from get_state.
+        """
+
+        vars(self).update(state)
+
+    def update(self, step: int, time: float, dt: float, values: Sequence):
+        """
+        Add a step.
+
+        :param step: The step that was taken.
+        :param time: The time after the step.
+        :param dt: The time step.
+        :param values: The parameters of the update function after the step.
+        """
+
+        # Each sample represents the time since the last sample, which
+        # differs from every times the time step if the time step changes
+        self.elapsed += dt
+
+        if step % self.every == 0:
+            self.add(step, time, self.elapsed, self.function(*values))
+            self.elapsed = 0.0
+
+    @abstractmethod
+    def add(self, step: int, time: float, weight: float, value: np.ndarray):
+        """
+        Add a sample of the quantity.
+
+        :param step: The step of the sample.
+        :param time: The time of the sample.
+        :param weight: The time the sample represents.
+        :param value: The quantity.
+        """
+
+    @abstractmethod
+    def get_results(self) -> Dict[str, np.ndarray]:
+        """
+        Get the reduced results.
+        :return: A dict with the results.
+        """
+
+    def _broadcast_members_(self, value: np.ndarray) -> np.ndarray:
+        """
+        Add the member axis to a value shared by all members.
+        :param value: The shared value.
+        :return: The value with one copy for each member.
+        """
+
+        value = np.asarray(value)
+        return np.broadcast_to(
+            value.reshape(value.shape + (1,) * len(self.member_shape)),
+            value.shape + self.member_shape
+        )
+
+
+class StatisticsReducer(Reducer):
+    """
+    Time weighted running mean and variance and the smallest and largest
+    value of a quantity at each site or edge.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self.total_weight = 0.0
+        self.mean = None
+        self.sum_squares = None
+        self.smallest = None
+        self.largest = None
+        self.delta = None
+
+    def add(self, step: int, time: float, weight: float, value: np.ndarray):
+        value = np.asarray(value, dtype=np.float64)
+
+        if self.mean is None:
+            self.mean = np.zeros(value.shape)
+            self.sum_squares = np.zeros(value.shape)
+            self.smallest = value.copy()
+            self.largest = value.copy()
+            self.delta = np.zeros(value.shape)
+
+        # Weighted update of the mean and the sum of squared deviations
+        self.total_weight += weight
+        np.subtract(value, self.mean, out=self.delta)
+        self.mean += self.delta * (weight / self.total_weight)
+        self.sum_squares += weight * self.delta * (value - self.mean)
+
+        np.minimum(self.smallest, value, out=self.smallest)
+        np.maximum(self.largest, value, out=self.largest)
+
+    def get_results(self) -> Dict[str, np.ndarray]:
+        if self.mean is None:
+            return {}
+
+        return {
+            '{} mean'.format(self.name): self.mean,
+            '{} variance'.format(self.name):
+                self.sum_squares / self.total_weight,
+            '{} min'.format(self.name): self.smallest,
+            '{} max'.format(self.name): self.largest
+        }
+
+
+class HistogramReducer(Reducer):
+    """
+    Histogram of all values of a quantity over the sites or edges and time.
+    Each value is counted with the time its sample represents.
+    """
+
+    def __init__(self, name: str, function: Callable[..., np.ndarray],
+                 bins: int, low: float, high: float, every: int = 1,
+                 member_shape: Tuple[int, ...] = ()):
+        """
+        Create the reducer.
+
+        :param name: Name of the quantity, used as prefix of the results.
+        :param function: Computes the quantity from the parameters of the
+        update function.
+        :param bins: The number of bins.
+        :param low: The lower edge of the first bin.
+        :param high: The upper edge of the last bin.
+        :param every: The number of steps between samples.
+        :param member_shape: The shape of the member axis of an ensemble.
+        """
+
+        super().__init__(name, function, every, member_shape)
+
+        if bins < 1 or not high > low:
+            raise ValueError('A histogram needs at least one bin and a '
+                             'positive range.')
+
+        self.edges = np.linspace(low, high, bins + 1)
+        self.counts = np.zeros((bins,) + member_shape, dtype=np.float64)
+
+    def add(self, step: int, time: float, weight: float, value: np.ndarray):
+        value = np.reshape(value, (-1,) + self.member_shape)
+
+        if len(self.member_shape) == 0:
+            self.counts += weight * np.histogram(value, self.edges)[0]
+            return
+
+        # Ensembles may have a time step for each member
+        weight = np.broadcast_to(weight, self.member_shape)
+
+        for member in range(self.member_shape[0]):
+            self.counts[:, member] += weight[member] * np.histogram(
+                value[:, member], self.edges
+            )[0]
+
+    def get_results(self) -> Dict[str, np.ndarray]:
+        return {
+            '{} histogram'.format(self.name): self.counts,
+            '{} histogram edges'.format(self.name):
+                self._broadcast_members_(self.edges)
+        }
+
+
+class ProbeReducer(Reducer):
+    """
+    Series of a quantity at a few sites or edges sampled every given number
+    of steps.
+    """
+
+    def __init__(self, name: str, function: Callable[..., np.ndarray],
+                 indices: Optional[Sequence[int]] = None, every: int = 1,
+                 member_shape: Tuple[int, ...] = ()):
+        """
+        Create the reducer.
+
+        :param name: Name of the quantity, used as prefix of the results.
+        :param function: Computes the quantity from the parameters of the
+        update function.
+        :param indices: The sites or edges to probe. The whole quantity is
+        probed if it is None, e.g. for a voltage.
+        :param every: The number of steps between samples.
+        :param member_shape: The shape of the member axis of an ensemble.
+        """
+
+        super().__init__(name, function, every, member_shape)
+
+        self.indices = np.asarray(indices, dtype=np.int64) \
+            if indices is not None else None
+        self.samples = []
+        self.steps = []
+        self.times = []
+
+    def add(self, step: int, time: float, weight: float, value: np.ndarray):
+        value = np.asarray(value)
+        self.samples.append(value[self.indices].copy()
+                            if self.indices is not None else value.copy())
+        self.steps.append(step)
+        self.times.append(time)
+
+    def get_results(self) -> Dict[str, np.ndarray]:
+        if len(self.samples) == 0:
+            return {}
+
+        return {
+            '{} probe'.format(self.name): np.stack(self.samples),
+            '{} probe steps'.format(self.name):
+                self._broadcast_members_(np.asarray(self.steps)),
+            '{} probe times'.format(self.name):
+                self._broadcast_members_(np.asarray(self.times))
+        }
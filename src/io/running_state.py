@@ -1,4 +1,4 @@
-from typing import Union, Sequence, Dict
+from typing import Union, Sequence, Dict, Optional
 
 import numpy as np
 
@@ -9,17 +9,21 @@ class RunningState:
     for IV curves or simular.
     """
 
-    def __init__(self, names: Sequence[str], buffer: int):
+    def __init__(self, names: Sequence[str], buffer: int,
+                 width: Optional[int] = None):
         """
         Create the running state.
 
         :param names: Names of the parameters to be saved.
         :param buffer: Size of the buffer.
+        :param width: Number of values per step, e.g. the number of members
+        in an ensemble. Scalar values are stored if it is None.
         """
 
         self.step = 0
         self.buffer = buffer
-        self.values = dict((name, np.zeros(buffer)) for name in names)
+        self.shape = (buffer,) if width is None else (buffer, width)
+        self.values = dict((name, np.zeros(self.shape)) for name in names)
 
     def next(self):
         """
@@ -44,9 +48,9 @@ class RunningState:
 
         self.step = 0
         for key in self.values.keys():
-            self.values[key] = np.zeros(self.buffer)
+            self.values[key] = np.zeros(self.shape)
 
-    def append(self, name: str, value: Union[float, int]):
+    def append(self, name: str, value: Union[float, int, np.ndarray]):
         """
         Append data to the buffer.
 
@@ -60,7 +64,9 @@ class RunningState:
         """
         Export data to save to disk.
 
-        :return: A dict with the data.
+        :return: A dict with the data for the steps taken since the buffer
+        was cleared.
         """
 
-        return self.values
+        return dict((name, value[:self.step])
+                    for name, value in self.values.items())
@@ -0,0 +1,261 @@
+import json
+from enum import Enum
+from typing import Dict, Any, Optional, Tuple, Sequence
+
+import h5py
+import numpy as np
+
+
+class Compression(Enum):
+    NONE = 'none'
+    GZIP = 'gzip'
+    LZF = 'lzf'
+
+    @classmethod
+    def get_keys(cls):
+        return list(item.value for item in Compression)
+
+
+# Types that the fields are down-cast to
+DOWNCAST_TYPES = {
+    np.dtype(np.float64): np.dtype(np.float32),
+    np.dtype(np.complex128): np.dtype(np.complex64),
+}
+
+
+class StorageOptions:
+    """
+    Options of the datasets a field is saved in: the compression filter, the
+    shuffle filter, the chunk size and if the values are down-cast to single
+    precision.
+    """
+
+    def __init__(self,
+                 compression: Compression = Compression.NONE,
+                 level: Optional[int] = None,
+                 shuffle: bool = False,
+                 chunk_size: Optional[int] = None,
+                 downcast: bool = False
+                 ):
+        """
+        Create the options.
+
+        :param compression: The compression filter.
+        :param level: The gzip level from 0 to 9. The default level of h5py is
+        used if it is None.
+        :param shuffle: Use the shuffle filter, which groups the bytes of the
+        values and often improves the compression.
+        :param chunk_size: The number of sites or edges in each chunk. The
+        chunks are chosen by h5py if it is None.
+        :param downcast: Save double precision values in single precision.
+        """
+
+        if level is not None and compression is not Compression.GZIP:
+            raise ValueError('A compression level requires gzip.')
+
+        if level is not None and not 0 <= level <= 9:
+            raise ValueError('The gzip level must be from 0 to 9.')
+
+        if chunk_size is not None and chunk_size < 1:
+            raise ValueError('The chunk size must be positive.')
+
+        self.compression = compression
+        self.level = level
+        self.shuffle = shuffle
+        self.chunk_size = chunk_size
+        self.downcast = downcast
+
+    @classmethod
+    def parse(cls, value: str) -> 'StorageOptions':
+        """
+        Create the options from a comma separated description, e.g.
+        gzip:4,shuffle,chunk:4096,downcast.
+
+        :param value: The description.
+        :return: The options.
+        """
+
+        kwargs = {}
+
+        for option in value.split(','):
+            name, *arguments = option.split(':')
+
+            if name in Compression.get_keys() and len(arguments) == 0:
+                kwargs['compression'] = Compression(name)
+            elif name == Compression.GZIP.value and len(arguments) == 1:
+                kwargs['compression'] = Compression.GZIP
+                kwargs['level'] = int(arguments[0])
+            elif name == 'shuffle' and len(arguments) == 0:
+                kwargs['shuffle'] = True
+            elif name == 'chunk' and len(arguments) == 1:
+                kwargs['chunk_size'] = int(arguments[0])
+            elif name == 'downcast' and len(arguments) == 0:
+                kwargs['downcast'] = True
+            else:
+                raise ValueError('Invalid storage option {}.'.format(option))
+
+        return cls(**kwargs)
+
+    def describe(self) -> str:
+        """
+        Describe the options in the format read by parse.
+        :return: The description.
+        """
+
+        options = [self.compression.value if self.level is None
+                   else '{}:{}'.format(self.compression.value, self.level)]
+
+        if self.shuffle:
+            options.append('shuffle')
+
+        if self.chunk_size is not None:
+            options.append('chunk:{}'.format(self.chunk_size))
+
+        if self.downcast:
+            options.append('downcast')
+
+        return ','.join(options)
+
+    def convert(self, value: np.ndarray) -> np.ndarray:
+        """
+        Convert a value to the type it is saved with.
+        :param value: The value.
+        :return: The value or a down-cast copy of it.
+        """
+
+        value = np.asarray(value)
+
+        if self.downcast and value.dtype in DOWNCAST_TYPES:
+            return value.astype(DOWNCAST_TYPES[value.dtype])
+
+        return value
+
+    def get_dataset_options(self, shape: Tuple[int, ...],
+                            rows: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Get the keyword arguments of create_dataset for a field.
+
+        :param shape: The shape of the field.
+        :param rows: The number of time steps in each chunk of a dataset with
+        one row per time step, or None if the dataset holds one field.
+        :return: The keyword arguments.
+        """
+
+        # Filters can not be used on scalar or empty datasets
+        if len(shape) == 0 or np.prod(shape) == 0:
+            return {}
+
+        options = {}
+
+        if self.compression is not Compression.NONE:
+            options['compression'] = self.compression.value
+
+        if self.level is not None:
+            options['compression_opts'] = self.level
+
+        if self.shuffle:
+            options['shuffle'] = True
+
+        if self.chunk_size is not None:
+            options['chunks'] = (min(self.chunk_size, shape[0]),) + shape[1:]
+
+        if rows is not None:
+            options['chunks'] = (rows,) + options.get('chunks', shape)
+
+        return options
+
+
+class Storage:
+    """
+    Storage options of the fields, with options for single fields and
+    default options for the others.
+    """
+
+    def __init__(self,
+                 default: Optional[StorageOptions] = None,
+                 fields: Optional[Dict[str, StorageOptions]] = None
+                 ):
+        """
+        Create the storage options.
+
+        :param default: The options of fields without options of their own.
+        :param fields: The options of single fields.
+        """
+
+        self.default = default if default is not None else StorageOptions()
+        self.fields = dict(fields) if fields is not None else {}
+
+    @classmethod
+    def parse(cls, values: Optional[Sequence[str]]) -> 'Storage':
+        """
+        Create the storage options from command line descriptions, each
+        either OPTIONS for the default or FIELD=OPTIONS for a field.
+
+        :param values: The descriptions or None.
+        :return: The storage options.
+        """
+
+        storage = cls()
+
+        for value in values if values is not None else []:
+            name, separator, options = value.rpartition('=')
+
+            if separator == '':
+                storage.default = StorageOptions.parse(options)
+            else:
+                storage.fields[name] = StorageOptions.parse(options)
+
+        return storage
+
+    @classmethod
+    def load(cls, attributes: h5py.AttributeManager) -> 'Storage':
+        """
+        Load the storage options recorded in a file.
+        :param attributes: The attributes of the file.
+        :return: The storage options, which are the default ones if none are
+        recorded.
+        """
+
+        if 'storage' not in attributes:
+            return cls()
+
+        descriptions = json.loads(attributes['storage'])
+        default = descriptions.pop('default')
+
+        return cls(
+            StorageOptions.parse(default),
+            dict((name, StorageOptions.parse(options))
+                 for name, options in descriptions.items())
+        )
+
+    def save(self, attributes: h5py.AttributeManager):
+        """
+        Record the storage options in a file.
+        :param attributes: The attributes of the file.
+        """
+
+        descriptions = {'default': self.default.describe()}
+        descriptions.update((name, options.describe())
+                            for name, options in self.fields.items())
+
+        attributes['storage'] = json.dumps(descriptions)
+
+    def get(self, name: str) -> StorageOptions:
+        return self.fields.get(name, self.default)
+
+    def create_dataset(self, group: h5py.Group, name: str,
+                       value: np.ndarray) -> h5py.Dataset:
+        """
+        Save a field to a dataset.
+
+        :param group: The group to create the dataset in.
+        :param name: The name of the field.
+        :param value: The field.
+        :return: The dataset.
+        """
+
+        options = self.get(name)
+        value = options.convert(value)
+
+        return group.create_dataset(name, data=value,
+                                    **options.get_dataset_options(value.shape))
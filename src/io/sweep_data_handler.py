@@ -0,0 +1,129 @@
+from typing import Sequence, Dict, Any, Optional
+
+import numpy as np
+
+from src.io.data_handler import DataHandler
+from src.io.frame_layout import Layout, create_frame_writer
+from src.mesh.mesh import Mesh
+
+
+class SweepDataHandler:
+    """
+    Data handler for a magnetic field sweep where all simulations are written
+    to one file. The mesh is stored once and the time steps for field k are
+    stored in sweep/k with the same layout as the time steps of a single
+    simulation.
+    """
+
+    def __init__(self, data_handler: DataHandler,
+                 magnetic_fields: Sequence[float],
+                 layout: Layout = Layout.GROUPS):
+        """
+        Create the sweep data handler.
+
+        :param data_handler: The data handler for the output file.
+        :param magnetic_fields: The magnetic fields in the sweep.
+        :param layout: The layout of the saved time steps of each field.
+        """
+
+        self.data_handler = data_handler
+        self.sweep_group = data_handler.output_file.create_group('sweep')
+        self.sweep_group.attrs['magnetic fields'] = np.asarray(
+            magnetic_fields
+        )
+        self.field_groups = []
+        self.frame_writers = []
+        self.save_numbers = []
+
+        for k, magnetic_field in enumerate(magnetic_fields):
+            field_group = self.sweep_group.create_group(str(k))
+            field_group.attrs['magnetic field'] = magnetic_field
+            self.field_groups.append(field_group)
+            self.frame_writers.append(create_frame_writer(
+                field_group, layout, data_handler.get_storage()
+            ))
+            self.save_numbers.append(0)
+
+    def close(self):
+
+        # Finish writing the time steps before the frame writers are closed
+        self.data_handler.flush()
+
+        for frame_writer in self.frame_writers:
+            frame_writer.close()
+
+        self.data_handler.close()
+
+    def get_output_path(self) -> str:
+        return self.data_handler.get_output_path()
+
+    def save_attributes(self, attributes: Dict[str, Any]):
+        self.data_handler.save_attributes(attributes)
+
+    def get_mesh(self) -> Mesh:
+        return self.data_handler.get_mesh()
+
+    def get_voltage_points(self) -> np.ndarray:
+        return self.data_handler.get_voltage_points()
+
+    def get_field_handler(self, k: int) -> 'SweepFieldDataHandler':
+        """
+        Get a data handler that writes the time steps for a field.
+        :param k: The index of the field in the sweep.
+        :return: The data handler.
+        """
+
+        return SweepFieldDataHandler(self, k)
+
+    def save_time_step(self, k: int, params: Dict[str, Any],
+                       data: Dict[str, np.ndarray],
+                       running: Optional[Dict[str, np.ndarray]] = None):
+        self.data_handler.save_frame(self.frame_writers[k],
+                                     self.save_numbers[k], params, data,
+                                     running)
+        self.save_numbers[k] += 1
+
+    def save_fixed(self, k: int, data: Dict[str, np.ndarray]):
+        self.data_handler.save_fixed_group(self.field_groups[k], data)
+
+    def save_reduced(self, k: int, data: Dict[str, np.ndarray]):
+        self.data_handler.save_reduced_group(self.field_groups[k], data)
+
+
+class SweepFieldDataHandler:
+    """
+    Data handler for one field in a magnetic field sweep.
+    """
+
+    def __init__(self, sweep_data_handler: SweepDataHandler, k: int):
+        """
+        Create the data handler.
+
+        :param sweep_data_handler: The data handler for the sweep.
+        :param k: The index of the field in the sweep.
+        """
+
+        self.sweep_data_handler = sweep_data_handler
+        self.k = k
+
+    def close(self):
+
+        # The output file is closed by the sweep data handler
+        pass
+
+    def get_mesh(self) -> Mesh:
+        return self.sweep_data_handler.get_mesh()
+
+    def get_voltage_points(self) -> np.ndarray:
+        return self.sweep_data_handler.get_voltage_points()
+
+    def save_time_step(self, params: Dict[str, Any],
+                       data: Dict[str, np.ndarray],
+                       running: Optional[Dict[str, np.ndarray]] = None):
+        self.sweep_data_handler.save_time_step(self.k, params, data, running)
+
+    def save_fixed(self, data: Dict[str, np.ndarray]):
+        self.sweep_data_handler.save_fixed(self.k, data)
+
+    def save_reduced(self, data: Dict[str, np.ndarray]):
+        self.sweep_data_handler.save_reduced(self.k, data)
@@ -0,0 +1,159 @@
+from typing import Sequence, Tuple
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+
+class BatchedCsrMatrix:
+    """
+    A batch of sparse matrices that share the same sparsity structure, e.g.
+    covariant derivatives for different magnetic fields. The batch is applied
+    to a matrix with one column per member, such that member k is multiplied
+    with matrix k. The index arrays are shared and traversed once for all
+    members.
+    """
+
+    def __init__(self,
+                 indptr: np.ndarray,
+                 indices: np.ndarray,
+                 data: np.ndarray,
+                 shape: Tuple[int, int]
+                 ):
+        """
+        Create the batched matrix.
+
+        NOTE: Use from_matrices to create the batch from a list of matrices.
+
+        :param indptr: The CSR row pointers.
+        :param indices: The CSR column indices.
+        :param data: The values as a (nnz, members)-array.
+        :param shape: The shape of each matrix.
+        """
+
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.shape = shape
+        self.dtype = data.dtype
+
+        # Rows without any values need to be handled separately when summing
+        # the contributions to each row
+        self.non_empty_rows = np.diff(indptr) > 0
+        self.row_starts = indptr[:-1][self.non_empty_rows]
+        self.all_rows = bool(np.all(self.non_empty_rows))
+
+        # Work buffers for the gathered values, the products and the sums of
+        # the non-empty rows
+        self.gathered = None
+        self.products = None
+        self.row_sums = None
+
+    @classmethod
+    def from_matrices(cls, matrices: Sequence[csr_matrix]
+                      ) -> 'BatchedCsrMatrix':
+        """
+        Create a batch from a list of matrices with the same structure.
+        :param matrices: The matrices, one for each member of the batch.
+        :return: The batched matrix.
+        """
+
+        matrices = [csr_matrix(matrix) for matrix in matrices]
+
+        for matrix in matrices:
+            matrix.sort_indices()
+
+        first = matrices[0]
+
+        for matrix in matrices[1:]:
+            if matrix.shape != first.shape \
+                    or not np.array_equal(matrix.indptr, first.indptr) \
+                    or not np.array_equal(matrix.indices, first.indices):
+                raise ValueError('The matrices in a batch must have the same '
+                                 'sparsity structure.')
+
+        return BatchedCsrMatrix(
+            indptr=first.indptr,
+            indices=first.indices,
+            data=np.stack([matrix.data for matrix in matrices], axis=-1),
+            shape=first.shape
+        )
+
+    def get_rows(self, start: int, stop: int) -> 'BatchedCsrMatrix':
+        """
+        Get a block of rows. The block shares the values with this batch.
+        :param start: The first row.
+        :param stop: The row after the last row.
+        :return: The block.
+        """
+
+        first = self.indptr[start]
+        last = self.indptr[stop]
+
+        return BatchedCsrMatrix(
+            indptr=self.indptr[start:stop + 1] - first,
+            indices=self.indices[first:last],
+            data=self.data[first:last],
+            shape=(stop - start, self.shape[1])
+        )
+
+    def __matmul__(self, other: np.ndarray) -> np.ndarray:
+        """
+        Apply each matrix in the batch to the corresponding column.
+        :param other: A (n, members)-array.
+        :return: The result as a (m, members)-array.
+        """
+
+        out = np.empty((self.shape[0], other.shape[1]),
+                       dtype=np.result_type(self.dtype, other.dtype))
+        return self.multiply(other, out)
+
+    def multiply(self, other: np.ndarray, out: np.ndarray) -> np.ndarray:
+        """
+        Apply each matrix in the batch to the corresponding column and store
+        the result in a preallocated array.
+        :param other: A (n, members)-array.
+        :param out: The (m, members)-array to store the result in.
+        :return: The output array.
+        """
+
+        self.__allocate(other)
+
+        # Gather the values multiplied with each matrix value
+        np.take(other, self.indices, axis=0, out=self.gathered)
+        np.multiply(self.data, self.gathered, out=self.products)
+
+        if len(self.row_starts) == 0:
+            out.fill(0)
+            return out
+
+        # Sum the products of each row directly into the output unless some
+        # rows are empty
+        if self.all_rows:
+            np.add.reduceat(self.products, self.row_starts, axis=0, out=out)
+            return out
+
+        np.add.reduceat(self.products, self.row_starts, axis=0,
+                        out=self.row_sums)
+        out.fill(0)
+        out[self.non_empty_rows] = self.row_sums
+
+        return out
+
+    def __allocate(self, other: np.ndarray):
+        """
+        Allocate the work buffers unless they fit the other matrix.
+        :param other: A (n, members)-array.
+        """
+
+        shape = (len(self.indices), other.shape[1])
+        dtype = np.result_type(self.dtype, other.dtype)
+
+        if self.gathered is not None and self.gathered.shape == shape \
+                and self.gathered.dtype == other.dtype \
+                and self.products.dtype == dtype:
+            return
+
+        self.gathered = np.empty(shape, dtype=other.dtype)
+        self.products = np.empty(shape, dtype=dtype)
+        self.row_sums = np.empty((len(self.row_starts), other.shape[1]),
+                                 dtype=dtype)
@@ -0,0 +1,110 @@
+from typing import Union
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from src.matrices.batched_csr_matrix import BatchedCsrMatrix
+from src.mesh.mesh import Mesh
+
+
+class LinkUpdater:
+    """
+    Updates the link variables of a covariant Laplacian in place. The
+    positions of the edge values in the CSR data are found once, such that a
+    new vector potential only requires computing the link variables and
+    writing them to the data array. The sparsity structure is left untouched,
+    so views of the matrix, e.g. row blocks, see the new values.
+    """
+
+    def __init__(self,
+                 mesh: Mesh,
+                 laplacian: Union[csr_matrix, BatchedCsrMatrix]
+                 ):
+        """
+        Find the positions of the link variables in the Laplacian.
+
+        :param mesh: The mesh the Laplacian is built on.
+        :param laplacian: The covariant Laplacian built with build_laplacian.
+        A batch is updated with one vector potential per member.
+        """
+
+        edge_mesh = mesh.edge_mesh
+        edges = np.asarray(edge_mesh.edges, dtype=np.int64)
+        sites = len(mesh.x)
+
+        self.laplacian = laplacian
+        self.directions = edge_mesh.directions
+
+        # Find the values for the edges in both directions. Rows of fixed
+        # sites have no values.
+        forward = self.__find_positions(laplacian, sites, edges[:, 0],
+                                        edges[:, 1])
+        backward = self.__find_positions(laplacian, sites, edges[:, 1],
+                                         edges[:, 0])
+        self.forward_edges = np.flatnonzero(forward >= 0)
+        self.backward_edges = np.flatnonzero(backward >= 0)
+        self.forward_positions = forward[self.forward_edges]
+        self.backward_positions = backward[self.backward_edges]
+
+        # Compute the weights the same way as when building the Laplacian
+        weights = edge_mesh.dual_edge_lengths / edge_mesh.edge_lengths
+        self.forward_weights = weights[self.forward_edges]
+        self.backward_weights = weights[self.backward_edges]
+        self.forward_areas = mesh.areas[edges[self.forward_edges, 0]]
+        self.backward_areas = mesh.areas[edges[self.backward_edges, 1]]
+
+    @classmethod
+    def __find_positions(cls,
+                         matrix: Union[csr_matrix, BatchedCsrMatrix],
+                         columns: int,
+                         rows: np.ndarray,
+                         cols: np.ndarray
+                         ) -> np.ndarray:
+        """
+        Find the positions of entries in the CSR data.
+        :param matrix: The matrix.
+        :param columns: The number of columns in the matrix.
+        :param rows: The rows of the entries.
+        :param cols: The columns of the entries.
+        :return: The position of each entry or -1 if it does not exist.
+        """
+
+        # Sort the entries by a key of the row and column
+        entry_rows = np.repeat(np.arange(len(matrix.indptr) - 1),
+                               np.diff(matrix.indptr))
+        keys = entry_rows * columns + matrix.indices
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+
+        # Look up the entries
+        queries = rows * columns + cols
+        indices = np.minimum(np.searchsorted(sorted_keys, queries),
+                             len(sorted_keys) - 1)
+
+        return np.where(sorted_keys[indices] == queries, order[indices], -1)
+
+    def update(self, link_exponents: np.ndarray):
+        """
+        Write new link variables to the Laplacian.
+        :param link_exponents: The vector potential on the edges. A batch
+        has one (edges, 2)-array per member along the last axis.
+        """
+
+        link_exponents = np.asarray(link_exponents)
+        extra_axes = (1,) * (link_exponents.ndim - 2)
+        directions = np.reshape(self.directions, (-1, 2) + extra_axes)
+
+        link_variable_weights = np.exp(
+            -1j * (link_exponents * directions).sum(axis=1)
+        )
+
+        self.laplacian.data[self.forward_positions] = (
+            np.reshape(self.forward_weights, (-1,) + extra_axes)
+            * link_variable_weights[self.forward_edges]
+            / np.reshape(self.forward_areas, (-1,) + extra_axes)
+        )
+        self.laplacian.data[self.backward_positions] = (
+            np.reshape(self.backward_weights, (-1,) + extra_axes)
+            * link_variable_weights[self.backward_edges].conjugate()
+            / np.reshape(self.backward_areas, (-1,) + extra_axes)
+        )
@@ -1,5 +1,5 @@
 from enum import Enum, auto
-from typing import Union, Sequence
+from typing import Union, Sequence, Optional
 
 import numpy as np
 from scipy.sparse import csr_matrix
@@ -9,6 +9,7 @@ from src.matrices.build_gradient import build_gradient
 from src.mesh.mesh import Mesh
 from src.matrices.build_laplacian import build_laplacian
 from src.matrices.build_neumann_boundary_laplacian import build_neumann_boundary_laplacian
+from src.matrices.matrix_cache import MatrixCache
 from src.sparse_format import SparseFormat
 
 
@@ -30,6 +31,7 @@ class MatrixBuilder:
         self.fixed_sites: Union[np.ndarray, None] = None
         self.fixed_sites_eigenvalue: float = 1
         self.link_exponents: Union[np.ndarray, None] = None
+        self.cache: Optional[MatrixCache] = None
 
     def with_dirichlet_boundary(self, fixed_sites: Sequence[int],
                                 fixed_sites_eigenvalues: float = 1
@@ -57,6 +59,16 @@ class MatrixBuilder:
         self.link_exponents = np.asarray(link_exponents)
         return self
 
+    def with_cache(self, cache: Optional[MatrixCache]) -> 'MatrixBuilder':
+        """
+        Load built matrices from an on-disk cache and store new matrices in
+        it.
+        :param cache: The cache or None to disable caching.
+        :return: This builder.
+        """
+        self.cache = cache
+        return self
+
     def build(self,
               matrix_type: MatrixType,
               sparse_format: SparseFormat = SparseFormat.CSR
@@ -68,6 +80,33 @@ class MatrixBuilder:
         :return: The matrix
         """
 
+        if self.cache is None:
+            return self.__build(matrix_type, sparse_format)
+
+        key = self.cache.get_key(self.mesh, matrix_type.name,
+                                 sparse_format.value, self.fixed_sites,
+                                 self.fixed_sites_eigenvalue,
+                                 self.link_exponents)
+
+        matrix = self.cache.load_matrix(key)
+
+        if matrix is None:
+            matrix = self.__build(matrix_type, sparse_format)
+            self.cache.save_matrix(key, matrix)
+
+        return matrix
+
+    def __build(self,
+                matrix_type: MatrixType,
+                sparse_format: SparseFormat
+                ) -> csr_matrix:
+        """
+        Build a matrix without using the cache.
+        :param matrix_type: The type of matrix to build.
+        :param sparse_format: The matrix format to return.
+        :return: The matrix
+        """
+
         if matrix_type is MatrixType.LAPLACIAN:
             return build_laplacian(self.mesh,
                                    self.link_exponents,
@@ -96,4 +135,5 @@ class MatrixBuilder:
         clone.fixed_sites = np.copy(self.fixed_sites)
         clone.fixed_sites_eigenvalue = self.fixed_sites_eigenvalue
         clone.link_exponents = np.copy(self.link_exponents)
+        clone.cache = self.cache
         return clone
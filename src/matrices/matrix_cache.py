@@ -0,0 +1,191 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+from typing import Optional, Any, Dict
+from weakref import WeakKeyDictionary
+
+import numpy as np
+from scipy.sparse import spmatrix, csr_matrix, csc_matrix
+
+from src.mesh.mesh import Mesh
+
+
+class MatrixCache:
+    """
+    On-disk cache for sparse matrices and arrays such as factorization
+    orderings. Every entry is stored in a directory named by a hash of the
+    mesh and the parameters used to build it. The arrays are stored as
+    separate npy files that are memory mapped when they are loaded.
+    """
+
+    def __init__(self, directory: str,
+                 logger: Optional[logging.Logger] = None):
+        """
+        Create the cache.
+
+        :param directory: The cache directory. It is created if it does not
+        exist.
+        :param logger: Logger used to inform about cache hits and misses.
+        """
+
+        self.directory = directory
+        self.logger = logger if logger is not None else logging.getLogger()
+
+        # The hash of each mesh is computed once. The meshes are weakly
+        # referenced, such that the hash of a mesh that is garbage collected
+        # is never returned for a new mesh that reuses its id.
+        self.mesh_hashes: WeakKeyDictionary = WeakKeyDictionary()
+
+        os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def __update_hash(cls, digest: Any, value: Any):
+        """
+        Add a value to a hash.
+        :param digest: The hash object.
+        :param value: The value to add. Arrays are added with their shape and
+        data type.
+        """
+
+        if value is None:
+            digest.update(b'none')
+            return
+
+        array = np.ascontiguousarray(value)
+        digest.update('{}{}'.format(array.dtype.str, array.shape).encode())
+        digest.update(array.data)
+
+    def get_mesh_hash(self, mesh: Mesh) -> str:
+        """
+        Get the hash of the mesh content.
+        :param mesh: The mesh.
+        :return: The hash as a hex string.
+        """
+
+        if mesh not in self.mesh_hashes:
+            digest = hashlib.sha256()
+            for value in (mesh.x, mesh.y, mesh.elements, mesh.areas,
+                          mesh.boundary_indices, mesh.edge_mesh.edges,
+                          mesh.edge_mesh.boundary_edge_indices,
+                          mesh.edge_mesh.directions,
+                          mesh.edge_mesh.edge_lengths,
+                          mesh.edge_mesh.dual_edge_lengths):
+                self.__update_hash(digest, value)
+            self.mesh_hashes[mesh] = digest.hexdigest()
+
+        return self.mesh_hashes[mesh]
+
+    def get_key(self, mesh: Mesh, *parameters: Any) -> str:
+        """
+        Get the key for an entry.
+        :param mesh: The mesh the entry is built on.
+        :param parameters: The parameters used to build the entry, e.g. the
+        matrix type, fixed sites and link exponents.
+        :return: The key.
+        """
+
+        digest = hashlib.sha256(self.get_mesh_hash(mesh).encode())
+        for parameter in parameters:
+            self.__update_hash(digest, parameter)
+
+        return digest.hexdigest()
+
+    def load_arrays(self, key: str) -> Optional[Dict[str, np.ndarray]]:
+        """
+        Load arrays from the cache.
+        :param key: The key of the entry.
+        :return: A dict of copy-on-write memory mapped arrays or None if the
+        entry does not exist.
+        """
+
+        entry = os.path.join(self.directory, key)
+
+        if not os.path.isdir(entry):
+            self.logger.debug('Cache miss for {}.'.format(key))
+            return None
+
+        self.logger.debug('Cache hit for {}.'.format(key))
+
+        return dict(
+            (name[:-len('.npy')],
+             np.load(os.path.join(entry, name), mmap_mode='c'))
+            for name in os.listdir(entry) if name.endswith('.npy')
+        )
+
+    def save_arrays(self, key: str, arrays: Dict[str, np.ndarray],
+                    meta: Optional[Dict[str, Any]] = None):
+        """
+        Save arrays to the cache. The entry is written to a temporary
+        directory that is renamed when it is complete, such that concurrent
+        simulations never see partial entries.
+        :param key: The key of the entry.
+        :param arrays: The arrays to save.
+        :param meta: Extra data stored as JSON with the entry.
+        """
+
+        entry = os.path.join(self.directory, key)
+
+        if os.path.isdir(entry):
+            return
+
+        temp_entry = tempfile.mkdtemp(dir=self.directory, prefix='.tmp-')
+
+        try:
+            for name, value in arrays.items():
+                np.save(os.path.join(temp_entry, '{}.npy'.format(name)),
+                        np.asarray(value))
+
+            with open(os.path.join(temp_entry, 'meta.json'), 'w') as file:
+                json.dump(meta if meta is not None else {}, file)
+
+            os.rename(temp_entry, entry)
+        except OSError:
+
+            # Another process has already saved the entry
+            shutil.rmtree(temp_entry, ignore_errors=True)
+
+    def load_matrix(self, key: str) -> Optional[spmatrix]:
+        """
+        Load a sparse matrix from the cache.
+        :param key: The key of the entry.
+        :return: The matrix or None if the entry does not exist.
+        """
+
+        arrays = self.load_arrays(key)
+
+        if arrays is None:
+            return None
+
+        with open(os.path.join(self.directory, key, 'meta.json')) as file:
+            meta = json.load(file)
+
+        matrix_class = csc_matrix if meta['format'] == 'csc' else csr_matrix
+
+        return matrix_class(
+            (arrays['data'], arrays['indices'], arrays['indptr']),
+            shape=tuple(meta['shape']),
+            copy=False
+        )
+
+    def save_matrix(self, key: str, matrix: spmatrix):
+        """
+        Save a sparse matrix to the cache.
+        :param key: The key of the entry.
+        :param matrix: A CSR or CSC matrix.
+        """
+
+        self.save_arrays(
+            key,
+            {
+                'data': matrix.data,
+                'indices': matrix.indices,
+                'indptr': matrix.indptr
+            },
+            {
+                'format': matrix.format,
+                'shape': list(matrix.shape)
+            }
+        )
@@ -0,0 +1,82 @@
+from typing import Union
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from src.matrices.batched_csr_matrix import BatchedCsrMatrix
+from src.util.parallel import ParallelExecutor, split_rows
+from src.util.sparse_matvec import sparse_matvec
+
+
+def get_row_block(matrix: Union[csr_matrix, BatchedCsrMatrix],
+                  start: int,
+                  stop: int
+                  ) -> Union[csr_matrix, BatchedCsrMatrix]:
+    """
+    Get a block of rows from a CSR matrix. The values of the block are a view
+    of the values in the matrix, such that in-place updates of the matrix are
+    seen by the block.
+    :param matrix: The matrix.
+    :param start: The first row.
+    :param stop: The row after the last row.
+    :return: The block.
+    """
+
+    if isinstance(matrix, BatchedCsrMatrix):
+        return matrix.get_rows(start, stop)
+
+    first = matrix.indptr[start]
+    last = matrix.indptr[stop]
+
+    block = csr_matrix(
+        (matrix.data[first:last], matrix.indices[first:last],
+         matrix.indptr[start:stop + 1] - first),
+        shape=(stop - start, matrix.shape[1]),
+        copy=False
+    )
+
+    # The constructor copies slices that are much smaller than the arrays
+    # they are taken from, so the views are set afterwards
+    block.data = matrix.data[first:last]
+    block.indices = matrix.indices[first:last]
+
+    return block
+
+
+class PartitionedMatrix:
+    """
+    Sparse matrix split into row blocks that are multiplied concurrently.
+    """
+
+    def __init__(self,
+                 matrix: Union[csr_matrix, BatchedCsrMatrix],
+                 executor: ParallelExecutor
+                 ):
+        """
+        Partition a matrix.
+
+        :param matrix: A CSR matrix or a batch of CSR matrices.
+        :param executor: The executor used to run the blocks.
+        """
+
+        self.matrix = matrix
+        self.executor = executor
+        self.shape = matrix.shape
+        self.dtype = matrix.dtype
+        self.rows = split_rows(matrix.indptr, executor.workers)
+        self.blocks = [get_row_block(matrix, start, stop)
+                       for start, stop in self.rows]
+
+    def __matmul__(self, other: np.ndarray) -> np.ndarray:
+        other = np.ascontiguousarray(other)
+
+        result = np.empty((self.shape[0],) + other.shape[1:],
+                          dtype=np.result_type(self.dtype, other.dtype))
+
+        def multiply(block: int):
+            start, stop = self.rows[block]
+            sparse_matvec(self.blocks[block], other, result[start:stop])
+
+        self.executor.run(multiply, len(self.blocks))
+
+        return result
@@ -7,6 +7,7 @@ import numpy as np
 from src.mesh.dual_mesh import DualMesh
 from src.mesh.edge_mesh import EdgeMesh
 from src.mesh.util.find_edges import get_edges
+from src.mesh.util.renumber import Renumbering, get_vertex_order
 from src.mesh.util.voronoi import compute_surrounding_area, \
     get_surrounding_voronoi_polygons
 
@@ -34,7 +35,8 @@ class Mesh:
                  edge_mesh: EdgeMesh,
                  voltage_points: Optional[np.ndarray] = None,
                  input_edge: Optional[np.ndarray] = None,
-                 output_edge: Optional[np.ndarray] = None):
+                 output_edge: Optional[np.ndarray] = None,
+                 vertex_order: Optional[np.ndarray] = None):
         """
         Create the mesh from data.
 
@@ -54,6 +56,8 @@ class Mesh:
         :param voltage_points: Points to use when measuring voltage.
         :param input_edge: Location for the current input.
         :param output_edge: Location for the current output.
+        :param vertex_order: The original index of each vertex if the
+        vertices have been renumbered.
         """
 
         # Store the data
@@ -71,6 +75,8 @@ class Mesh:
         self.voltage_points = voltage_points
         self.input_edge = input_edge
         self.output_edge = output_edge
+        self.vertex_order = np.asarray(vertex_order, dtype=np.int64) \
+            if vertex_order is not None else None
 
     @classmethod
     def from_triangulation(cls,
@@ -79,7 +85,8 @@ class Mesh:
                            elements: Sequence[Tuple[int, int, int]],
                            voltage_points: Optional[np.ndarray] = None,
                            input_edge: Optional[np.ndarray] = None,
-                           output_edge: Optional[np.ndarray] = None
+                           output_edge: Optional[np.ndarray] = None,
+                           renumbering: Renumbering = Renumbering.NONE
                            ) -> 'Mesh':
         """
         Create a triangular mesh from the coordinates of the triangle vertices
@@ -95,6 +102,8 @@ class Mesh:
         :param voltage_points: Points to use when measuring voltage.
         :param input_edge: Location for the current input.
         :param output_edge: Location for the current output
+        :param renumbering: Method used to renumber the vertices to get a
+        cache-friendly order. The edges follow the new vertex order.
         """
 
         # Store the data
@@ -134,6 +143,18 @@ class Mesh:
         if elements.shape[0] == 3:
             elements = elements.transpose()
 
+        # Renumber the vertices
+        vertex_order = None
+        if renumbering is not Renumbering.NONE:
+            vertex_order = get_vertex_order(x, y, elements, renumbering)
+            new_index = np.argsort(vertex_order)
+            x = x[vertex_order]
+            y = y[vertex_order]
+            elements = new_index[np.asarray(elements, dtype=np.int64)]
+            voltage_points = new_index[np.asarray(voltage_points,
+                                                  dtype=np.int64)] \
+                if voltage_points is not None else None
+
         # Find the boundary
         boundary_indices: np.ndarray = cls.__find_boundary(elements)
 
@@ -157,7 +178,8 @@ class Mesh:
             areas=areas,
             voltage_points=voltage_points,
             input_edge=input_edge,
-            output_edge=output_edge
+            output_edge=output_edge,
+            vertex_order=vertex_order
         )
 
     @classmethod
@@ -315,6 +337,9 @@ class Mesh:
         h5group['input_edge'] = self.input_edge
         h5group['output_edge'] = self.output_edge
 
+        if self.vertex_order is not None:
+            h5group['vertex_order'] = self.vertex_order
+
         # Save the edge mesh
         self.edge_mesh.save_to_hdf5(h5group.create_group('edge_mesh'))
 
@@ -350,7 +375,9 @@ class Mesh:
                 input_edge=np.asarray(h5group['input_edge'])
                 if 'input_edge' in h5group else None,
                 output_edge=np.asarray(h5group['output_edge'])
-                if 'output_edge' in h5group else None
+                if 'output_edge' in h5group else None,
+                vertex_order=np.asarray(h5group['vertex_order'])
+                if 'vertex_order' in h5group else None
             )
 
         # Recreate mesh from triangulation data if not all data is available
@@ -0,0 +1,113 @@
+from enum import Enum
+
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import reverse_cuthill_mckee
+
+
+class Renumbering(Enum):
+    NONE = 'none'
+    RCM = 'rcm'
+    HILBERT = 'hilbert'
+
+    @classmethod
+    def get_keys(cls):
+        return list(item.value for item in Renumbering)
+
+
+def get_bandwidth(elements: np.ndarray) -> int:
+    """
+    Get the bandwidth of the vertex adjacency matrix.
+    :param elements: The triangle elements.
+    :return: The largest index difference between two connected vertices.
+    """
+
+    elements = np.asarray(elements, dtype=np.int64)
+
+    return int(np.max(np.abs(elements - np.roll(elements, 1, axis=1))))
+
+
+def get_rcm_order(elements: np.ndarray, n: int) -> np.ndarray:
+    """
+    Get the reverse Cuthill-McKee order of the vertices, which minimizes the
+    bandwidth of the vertex adjacency matrix.
+    :param elements: The triangle elements.
+    :param n: The number of vertices.
+    :return: The original index of each vertex in the new order.
+    """
+
+    elements = np.asarray(elements, dtype=np.int64)
+
+    # Build the adjacency matrix from the triangle edges
+    rows = elements.flatten()
+    cols = np.roll(elements, 1, axis=1).flatten()
+    adjacency = coo_matrix(
+        (np.ones(2 * len(rows)),
+         (np.concatenate([rows, cols]), np.concatenate([cols, rows]))),
+        shape=(n, n)
+    ).tocsr()
+
+    return np.asarray(reverse_cuthill_mckee(adjacency, symmetric_mode=True),
+                      dtype=np.int64)
+
+
+def get_hilbert_order(x: np.ndarray, y: np.ndarray, bits: int = 16
+                      ) -> np.ndarray:
+    """
+    Get the order of the vertices along a Hilbert space-filling curve, which
+    keeps vertices that are close in space close in memory.
+    :param x: The x coordinates of the vertices.
+    :param y: The y coordinates of the vertices.
+    :param bits: Number of bits used to quantize each coordinate.
+    :return: The original index of each vertex in the new order.
+    """
+
+    # Quantize the coordinates on a square grid
+    side = 2 ** bits
+    scale = max(np.ptp(x), np.ptp(y), np.finfo(np.float64).tiny)
+    xi = np.minimum(((x - np.min(x)) / scale * side).astype(np.int64),
+                    side - 1)
+    yi = np.minimum(((y - np.min(y)) / scale * side).astype(np.int64),
+                    side - 1)
+
+    # Compute the distance along the curve for all vertices at once
+    distance = np.zeros_like(xi)
+    s = side // 2
+    while s > 0:
+        rx = (xi & s) > 0
+        ry = (yi & s) > 0
+        distance += s * s * ((3 * rx) ^ ry.astype(np.int64))
+
+        # Rotate the quadrant
+        flip = ~ry & rx
+        xi = np.where(flip, side - 1 - xi, xi)
+        yi = np.where(flip, side - 1 - yi, yi)
+        swap = ~ry
+        xi, yi = np.where(swap, yi, xi), np.where(swap, xi, yi)
+
+        s //= 2
+
+    return np.argsort(distance, kind='stable')
+
+
+def get_vertex_order(x: np.ndarray,
+                     y: np.ndarray,
+                     elements: np.ndarray,
+                     renumbering: Renumbering
+                     ) -> np.ndarray:
+    """
+    Get a cache-friendly order of the vertices.
+    :param x: The x coordinates of the vertices.
+    :param y: The y coordinates of the vertices.
+    :param elements: The triangle elements.
+    :param renumbering: The renumbering method.
+    :return: The original index of each vertex in the new order.
+    """
+
+    if renumbering is Renumbering.RCM:
+        return get_rcm_order(elements, len(x))
+
+    if renumbering is Renumbering.HILBERT:
+        return get_hilbert_order(x, y)
+
+    return np.arange(len(x))
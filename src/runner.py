@@ -1,11 +1,17 @@
 import datetime
 import logging
-from typing import Callable, Sequence, Optional, Any, List, Dict
+from time import perf_counter
+from typing import Callable, Sequence, Optional, Any, List, Dict, Tuple
 
+import numpy as np
 from tqdm import tqdm
 
+from src.io.checkpoint import Checkpoint
 from src.io.data_handler import DataHandler
+from src.io.reducers import Reducer
 from src.io.running_state import RunningState
+from src.util.metrics_server import MetricsServer
+from src.util.phase_timer import PhaseTimer
 
 
 class Runner:
@@ -25,10 +31,22 @@ class Runner:
                  skip: int = 0,
                  fixed_values: Optional[List[Any]] = None,
                  fixed_names: Optional[Sequence] = None,
+                 observables: Optional[Dict[str, Callable]] = None,
                  running_names: Optional[Sequence[str]] = None,
                  logger: Optional[logging.Logger] = None,
                  state: Optional[Dict[str, Any]] = None,
-                 miniters: Optional[int] = None
+                 miniters: Optional[int] = None,
+                 ensemble_size: Optional[int] = None,
+                 checkpoint: Optional[Checkpoint] = None,
+                 checkpoint_every: int = 0,
+                 checkpoint_objects: Optional[Dict[str, Any]] = None,
+                 resume: bool = False,
+                 timer: Optional[PhaseTimer] = None,
+                 metrics: Optional[MetricsServer] = None,
+                 reducers: Optional[Sequence[Reducer]] = None,
+                 save_values: bool = True,
+                 field_save_every: Optional[Dict[str, int]] = None,
+                 is_finished: Optional[Callable[[], bool]] = None
                  ):
         """
         Create a runner before starting the simulation.
@@ -41,15 +59,46 @@ class Runner:
         :param steps: The number of steps to run the simulation.
         :param save_every: How many steps to simulate before saving data.
         :param data_handler: The data handler used to save to disk.
-        :param dt: The time step.
+        :param dt: The initial time step. The update function may change the
+        time step by setting dt in the state.
         :param skip: The number of time steps to skip to thermalize.
         :param fixed_values: Values that do not change over time, but should
-        be added to saved data.
+        be added to saved data. They are saved once to the fixed group of the
+        output and only with a time step if they change.
         :param fixed_names: Fixed data variable names.
+        :param observables: Values derived from the parameters of the update
+        function that are not needed to advance the simulation. They are only
+        computed when they are saved or requested. Each function takes the
+        parameters of the update function.
         :param running_names: Names of running state variables.
         :param logger: A logger to print information about simulation.
         :param state: The current state variables.
         :param miniters: Number of steps between progress update.
+        :param ensemble_size: Number of members if the update function
+        advances an ensemble. The running state then stores one value per
+        member.
+        :param checkpoint: The checkpoint used to save the full state of the
+        simulation.
+        :param checkpoint_every: How many steps to simulate between
+        checkpoints. Checkpoints are disabled if it is zero.
+        :param checkpoint_objects: Objects used by the update function whose
+        attributes are saved in the checkpoints and restored when resuming.
+        :param resume: Continue the simulation from the checkpoint.
+        :param timer: Timer for the saving phases.
+        :param metrics: Server for live metrics, which are published between
+        the blocks of steps.
+        :param reducers: Reducers that are updated after every step of the
+        simulation stage. Their results are saved when the simulation ends.
+        :param save_values: If the parameters, the observables and the fixed
+        values should be saved with each time step. Otherwise only the state
+        and the running state are saved.
+        :param field_save_every: How many steps to simulate between saves of
+        each parameter, observable or fixed value. Each must be a multiple of
+        save_every and zero means that it is never saved. Those that are
+        left out are saved at every save. Fixed values are only saved again
+        if they have changed since they were last saved.
+        :param is_finished: Function that tells if the update function has
+        finished the stage after a step, which then ends early.
         """
 
         # Set the initial data.
@@ -68,10 +117,12 @@ class Runner:
         self.names = names
         self.fixed_values = fixed_values if fixed_values is not None else []
         self.fixed_names = fixed_names if fixed_names is not None else []
+        self.observables = observables if observables is not None else {}
         self.running_names = running_names if running_names is not None else []
         self.running_state = RunningState(
             running_names if running_names is not None else [],
-            save_every
+            save_every,
+            ensemble_size
         )
         self.state = state if state is not None else {}
 
@@ -87,20 +138,74 @@ class Runner:
         # Set how often to update the progress bar.
         self.miniters = miniters
 
+        # Set the checkpoint.
+        self.checkpoint = checkpoint
+        self.checkpoint_every = checkpoint_every if checkpoint is not None \
+            else 0
+        self.checkpoint_objects = checkpoint_objects \
+            if checkpoint_objects is not None else {}
+        self.resume = resume
+
+        # Set the timer.
+        self.timer = timer if timer is not None else PhaseTimer(False)
+
+        # Set the live metrics.
+        self.metrics = metrics
+        self.metrics_step = None
+        self.metrics_time = None
+        self.last_voltage = None
+        self.save_latency = 0.0
+
+        # Set the reducers.
+        self.reducers = list(reducers) if reducers is not None else []
+        self.save_values = save_values
+
+        # Set how often to save each value.
+        self.field_save_every = dict(field_save_every) \
+            if field_save_every is not None else {}
+        for name, every in self.field_save_every.items():
+            if every < 0 or every % save_every != 0:
+                raise ValueError('The number of steps between saves of {} '
+                                 'must be a multiple of {}.'
+                                 .format(name, save_every))
+
+        # Set the function that ends a stage early.
+        self.is_finished = is_finished
+
+        # The last saved fixed values, which are only saved again if changed.
+        self.saved_fixed_values = [None] * len(self.fixed_values)
+
     def run(self):
         """
         Run the simulation loop.
         """
 
-        # Set the initial data.
-        self.state['step'] = 0
-        self.state['time'] = self.time
-        self.state['dt'] = self.dt
+        # Continue from the checkpoint if resuming.
+        if self.resume:
+            stage_name, step = self._load_checkpoint_()
+            self.logger.info(
+                'Resuming from step {} of {}.'.format(step, stage_name)
+            )
+
+            # Nothing remains to thermalize if the simulation already began.
+            if stage_name == 'Simulating':
+                self._run_stage_(step, self.steps, stage_name, True)
+                self._save_reduced_()
+                return
 
-        # Thermalize if enabled.
-        if self.skip > 0:
-            self._run_stage_(0, self.skip, 'Thermalizing', False)
+            self._run_stage_(step, self.skip, stage_name, False)
             self.running_state.clear()
+        else:
+
+            # Set the initial data.
+            self.state['step'] = 0
+            self.state['time'] = self.time
+            self.state['dt'] = self.dt
+
+            # Thermalize if enabled.
+            if self.skip > 0:
+                self._run_stage_(0, self.skip, 'Thermalizing', False)
+                self.running_state.clear()
 
         self.state['step'] = 0
         self.state['time'] = self.time
@@ -108,10 +213,13 @@ class Runner:
 
         # Run simulation.
         self._run_stage_(0, self.steps, 'Simulating', True)
+        self._save_reduced_()
 
     def _run_stage_(self, start: int, end: int, stage_name: str, save: bool):
         """
-        Run a stage of the simulation.
+        Run a stage of the simulation. The steps between two save points,
+        checkpoints or progress updates are run as a block in a tight loop
+        and the bookkeeping is only done at the block boundaries.
         :param start: Start step.
         :param end: End step.
         :param stage_name: Name of the stage.
@@ -121,11 +229,21 @@ class Runner:
         # Check if the progress bar is disabled.
         prog_disabled = self.miniters is not None
 
+        # Get the intervals between the block boundaries.
+        intervals = [self.save_every]
+        if prog_disabled:
+            intervals.append(self.miniters)
+        if self.checkpoint_every > 0:
+            intervals.append(self.checkpoint_every)
+
         # Create variable to save the current time.
         now = None
 
-        for i in tqdm(range(start, end + 1), desc=stage_name,
-                      disable=prog_disabled):
+        progress = tqdm(total=end + 1 - start, desc=stage_name,
+                        disable=prog_disabled)
+
+        i = start
+        while i <= end:
 
             # Update the state
             self.state['step'] = i
@@ -142,40 +260,292 @@ class Runner:
                     '{} {}/{} {:.2f} it/s'.format(stage_name, i, end + 1, it)
                 )
 
+            # Publish the live metrics before the running state is cleared.
+            if self.metrics is not None:
+                self._publish_metrics_(stage_name, start, i)
+
+            # Save a checkpoint before the step. The first step is skipped
+            # since it is either the start or the checkpoint resumed from.
+            if self.checkpoint_every > 0 and i != start \
+                    and i % self.checkpoint_every == 0:
+                with self.timer.time('checkpoint'):
+                    self._save_checkpoint_(stage_name, i)
+
             # Save data
             if i % self.save_every == 0:
 
                 # Save data if it is enabled.
                 if save:
+                    self._save_(i)
+
+                # Clear the running state.
+                self.running_state.clear()
 
-                    # Create a dict containing the data.
-                    data = dict(
-                        (self.names[i], self.values[i])
-                        for i in range(len(self.names))
-                    )
+            # Run the block up to the next boundary.
+            stop = min(min((i // interval + 1) * interval
+                           for interval in intervals), end + 1)
+            finished = self._run_block_(i, stop, save)
+            progress.update(stop - i)
 
-                    # Add the fixed values.
-                    for idx, name in enumerate(self.fixed_names):
-                        data[name] = self.fixed_values[idx]
+            # End the stage early if the update function is finished and
+            # save the last step.
+            if finished:
+                self.state['step'] = self.state['step'] + 1
+                self.state['time'] = self.time
+                self.state['dt'] = self.dt
 
-                    # Add the running state data to the dict.
-                    if i != 0:
-                        data.update(self.running_state.export())
+                if save:
+                    self._save_(self.state['step'])
 
-                    # Save the time step.
-                    self.data_handler.save_time_step(self.state, data)
+                break
 
-                # Clear the running state.
-                self.running_state.clear()
+            i = stop
+
+        progress.close()
+
+    def _run_block_(self, start: int, stop: int, reduce: bool) -> bool:
+        """
+        Run a block of steps without any bookkeeping in between.
+        :param start: The first step.
+        :param stop: The step after the last step.
+        :param reduce: If the reducers should be updated.
+        :return: True if the update function finished the stage.
+        """
+
+        # Keep everything used in the loop as locals.
+        function = self.function
+        state = self.state
+        running_state = self.running_state
+        next_step = running_state.next
+        values = self.values
+        time = self.time
+        dt = self.dt
+        reducers = self.reducers if reduce else []
+        is_finished = self.is_finished
+        finished = False
+
+        for i in range(start, stop):
+            state['step'] = i
 
             # Run time step.
-            self.values = self.function(
-                self.state,
-                self.running_state,
-                *self.values)
+            values = function(state, running_state, *values)
 
             # Update the running state.
-            self.running_state.next()
+            next_step()
+
+            # Run update time. The update function may change the time step
+            # and reports the step it actually used in the state.
+            dt = state['dt']
+            time += dt
+
+            # Reduce the values after the step.
+            for reducer in reducers:
+                reducer.update(i + 1, time, dt, values)
+
+            # End the block early if the update function is finished.
+            if is_finished is not None and is_finished():
+                finished = True
+                break
+
+        self.values = values
+        self.time = time
+        self.dt = dt
+
+        return finished
+
+    def _publish_metrics_(self, stage_name: str, start: int, step: int):
+        """
+        Publish the live metrics.
+        :param stage_name: Name of the stage.
+        :param start: Start step of the stage.
+        :param step: The current step.
+        """
+
+        # Get the steps per second since the last update in this stage
+        now = perf_counter()
+        steps_per_second = (step - self.metrics_step) \
+            / (now - self.metrics_time) if step != start else 0.0
+        self.metrics_step = step
+        self.metrics_time = now
+
+        # Keep the last voltage if no step is taken since the running state
+        # was cleared.
+        voltage = self.running_state.values.get('voltage')
+        if voltage is not None and self.running_state.step > 0:
+            self.last_voltage = voltage[self.running_state.step - 1].copy()
+
+        metrics = {
+            'step': step,
+            'time': self.time,
+            'dt': self.dt,
+            'steps_per_second': steps_per_second,
+            'thermalizing': stage_name == 'Thermalizing',
+            'save_latency_seconds': self.save_latency
+        }
+
+        if 'current' in self.state:
+            metrics['current'] = np.copy(self.state['current'])
+
+        if self.last_voltage is not None:
+            metrics['voltage'] = self.last_voltage
+
+        self.metrics.publish(metrics)
+
+    def get_observable(self, name: str) -> Any:
+        """
+        Compute an observable from the current parameters.
+        :param name: Name of the observable.
+        :return: The value of the observable.
+        """
+
+        return self.observables[name](*self.values)
+
+    def _save_checkpoint_(self, stage_name: str, step: int):
+        """
+        Save the full state of the simulation before a step.
+        :param stage_name: Name of the stage.
+        :param step: The step to continue from.
+        """
+
+        # Make sure that the saved data is on disk before the checkpoint
+        # refers to it.
+        self.data_handler.flush()
+
+        self.checkpoint.save({
+            'stage': stage_name,
+            'step': step,
+            'time': self.time,
+            'dt': self.dt,
+            'values': self.values,
+            'fixed values': self.fixed_values,
+            'state': self.state,
+            'running step': self.running_state.step,
+            'running values': self.running_state.values,
+            'save number': self.data_handler.get_save_number(),
+            'reducers': [reducer.get_state() for reducer in self.reducers],
+            'saved fixed values': self.saved_fixed_values,
+            'objects': dict((name, vars(obj)) for name, obj
+                            in self.checkpoint_objects.items())
+        })
+
+    def _load_checkpoint_(self) -> Tuple[str, int]:
+        """
+        Restore the full state of the simulation from the checkpoint.
+        :return: The name of the stage and the step to continue from.
+        """
+
+        payload = self.checkpoint.load()
+
+        self.time = payload['time']
+        self.dt = payload['dt']
+        self.values = payload['values']
+
+        # Update the fixed values in place since the update function may
+        # change them.
+        for value, saved_value in zip(self.fixed_values,
+                                      payload['fixed values']):
+            np.copyto(value, saved_value)
+
+        # Update the state in place since the update function may refer to
+        # it.
+        self.state.clear()
+        self.state.update(payload['state'])
+
+        self.running_state.step = payload['running step']
+        self.running_state.values = payload['running values']
+
+        # Remove data saved after the checkpoint.
+        self.data_handler.set_save_number(payload['save number'])
+
+        self.saved_fixed_values = payload['saved fixed values']
+
+        for reducer, reducer_state in zip(self.reducers,
+                                          payload['reducers']):
+            reducer.set_state(reducer_state)
+
+        for name, attributes in payload['objects'].items():
+            vars(self.checkpoint_objects[name]).update(attributes)
+
+        return payload['stage'], payload['step']
+
+    def _save_reduced_(self):
+        """
+        Save the results of the reducers.
+        """
+
+        if len(self.reducers) == 0:
+            return
+
+        data = {}
+        for reducer in self.reducers:
+            data.update(reducer.get_results())
+
+        with self.timer.time('save'):
+            self.data_handler.save_reduced(data)
+
+    def _is_saved_(self, name: str, step: int) -> bool:
+        """
+        Check if a value should be saved with a step.
+        :param name: Name of the parameter, observable or fixed value.
+        :param step: The step that is saved.
+        :return: True if the value should be saved.
+        """
+
+        if name not in self.field_save_every:
+            return True
+
+        every = self.field_save_every[name]
+        return every > 0 and step % every == 0
+
+    def _save_(self, step: int):
+        """
+        Save the values and the running state.
+        :param step: The step that is saved.
+        """
+
+        data = {}
+
+        if self.save_values:
+
+            # Add the values.
+            for idx, name in enumerate(self.names):
+                if self._is_saved_(name, step):
+                    data[name] = self.values[idx]
+
+            # Add the observables.
+            with self.timer.time('observables'):
+                for name in self.observables.keys():
+                    if self._is_saved_(name, step):
+                        data[name] = self.get_observable(name)
+
+            # Save the fixed values once and add them to the time step if
+            # they have changed since they were last saved.
+            fixed = {}
+            for idx, name in enumerate(self.fixed_names):
+                value = self.fixed_values[idx]
+                saved_value = self.saved_fixed_values[idx]
+
+                if not self._is_saved_(name, step):
+                    continue
+
+                if saved_value is None:
+                    fixed[name] = value
+                elif not np.array_equal(value, saved_value):
+                    data[name] = value
+                else:
+                    continue
+
+                self.saved_fixed_values[idx] = np.copy(value)
+
+            if len(fixed) > 0:
+                with self.timer.time('save'):
+                    self.data_handler.save_fixed(fixed)
+
+        # Get the running state data.
+        running = self.running_state.export() if step != 0 else {}
 
-            # Run update time
-            self.time += self.dt
+        # Save the time step.
+        save_start = perf_counter()
+        with self.timer.time('save'):
+            self.data_handler.save_time_step(self.state, data, running)
+        self.save_latency = perf_counter() - save_start
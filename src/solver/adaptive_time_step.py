@@ -0,0 +1,128 @@
+import numpy as np
+
+
+class AdaptiveTimeStep:
+    """
+    Error controlled time step. The local error of a step is estimated by
+    step doubling. A step is rejected and retried with a smaller time step if
+    the error exceeds the tolerance or if the discriminant in the update of
+    the modulus squared becomes negative. After an accepted step the time step
+    is scaled with (tolerance / error)^(1 / (order + 1)) towards the value
+    where the error equals the tolerance.
+    """
+
+    def __init__(self,
+                 dt: float,
+                 dt_min: float,
+                 dt_max: float,
+                 tolerance: float,
+                 order: int = 1,
+                 safety: float = 0.9,
+                 max_growth: float = 1.5,
+                 shrink: float = 0.25,
+                 max_rejections: int = 20
+                 ):
+        """
+        Create the time step controller.
+
+        :param dt: The initial time step.
+        :param dt_min: The smallest allowed time step.
+        :param dt_max: The largest allowed time step.
+        :param tolerance: The largest accepted local error of the complex
+        field in one step.
+        :param order: The order of the update, such that the local error
+        scales with the time step to the power of order + 1.
+        :param safety: Safety factor applied when scaling the time step.
+        :param max_growth: The largest factor the time step may grow with
+        between two steps.
+        :param shrink: The factor the time step is multiplied with when a step
+        is rejected.
+        :param max_rejections: Number of rejections in a row before giving up.
+        """
+
+        if not 0 < dt_min <= dt_max:
+            raise ValueError('The time step bounds must fulfill '
+                             '0 < dt_min <= dt_max.')
+
+        self.dt = min(max(dt, dt_min), dt_max)
+        self.dt_min = dt_min
+        self.dt_max = dt_max
+        self.tolerance = tolerance
+        self.order = order
+        self.safety = safety
+        self.max_growth = max_growth
+        self.shrink = shrink
+        self.max_rejections = max_rejections
+
+        # Statistics
+        self.accepted = 0
+        self.rejected = 0
+        self.smallest_dt = self.dt
+        self.largest_dt = self.dt
+
+        # Number of rejections of the current step
+        self.retries = 0
+
+        # The time advanced by the accepted steps since the last restart
+        self.elapsed = 0.0
+
+    def restart(self):
+        """
+        Restart the elapsed time, e.g. at the beginning of a stage.
+        """
+
+        self.elapsed = 0.0
+
+    def check(self, error: float, min_discriminant: float) -> bool:
+        """
+        Check if a step is accepted and update the time step accordingly.
+
+        :param error: The estimated local error of the step.
+        :param min_discriminant: The smallest discriminant in the update of
+        the modulus squared.
+        :return: True if the step is accepted and False if it should be
+        retried with the new time step.
+        """
+
+        if min_discriminant >= 0 and np.isfinite(error) \
+                and error <= self.tolerance:
+            self.__accept(error)
+            return True
+
+        self.__reject()
+        return False
+
+    def __accept(self, error: float):
+        """
+        Accept the step and compute the time step for the next step.
+        :param error: The estimated local error of the step.
+        """
+
+        self.accepted += 1
+        self.retries = 0
+        self.elapsed += self.dt
+        self.smallest_dt = min(self.smallest_dt, self.dt)
+        self.largest_dt = max(self.largest_dt, self.dt)
+
+        factor = self.safety \
+            * (self.tolerance / error) ** (1 / (self.order + 1)) \
+            if error > 0 else self.max_growth
+
+        self.dt = min(max(self.dt * min(factor, self.max_growth),
+                          self.dt_min), self.dt_max)
+
+    def __reject(self):
+        """
+        Reject the step and reduce the time step.
+        """
+
+        if self.dt <= self.dt_min or self.retries >= self.max_rejections:
+            raise RuntimeError(
+                'The step was rejected at the minimal time step {}. '
+                'Decrease the minimal time step or increase the tolerance.'
+                .format(self.dt)
+            )
+
+        self.rejected += 1
+        self.retries += 1
+        self.dt = max(self.dt * self.shrink, self.dt_min)
@@ -0,0 +1,180 @@
+from typing import Union, Tuple
+
+import numpy as np
+
+
+class CriticalCurrentSearch:
+    """
+    Search for the critical current by bracketing and bisection. Each probe
+    runs a fixed number of steps at one current and the mean voltage over the
+    second half of the probe decides if the current is resistive. The search
+    starts at the low current, then probes the high current and moves the
+    high current further up until a resistive current is found. The bracket
+    is then bisected until it is smaller than the tolerance.
+
+    Every probe is started from the state at the end of the last
+    superconducting probe, such that a resistive probe does not affect the
+    next one. Ensembles are searched member by member with the member index
+    as the last axis.
+    """
+
+    def __init__(self,
+                 low: Union[float, np.ndarray],
+                 high: Union[float, np.ndarray],
+                 threshold: float,
+                 tolerance: float,
+                 probe_steps: int
+                 ):
+        """
+        Create the search.
+
+        :param low: The lowest current to probe.
+        :param high: The initial upper end of the bracket.
+        :param threshold: The mean voltage above which a current is
+        resistive.
+        :param tolerance: The size of the final bracket.
+        :param probe_steps: The number of steps in each probe.
+        """
+
+        if probe_steps < 2:
+            raise ValueError('A probe needs at least two steps.')
+
+        self.low = np.asarray(low, dtype=np.float64)
+        self.high = np.broadcast_to(np.asarray(high, dtype=np.float64),
+                                    self.low.shape).copy()
+
+        if np.any(self.high <= self.low):
+            raise ValueError('The high current must be larger than the low '
+                             'current.')
+        self.threshold = threshold
+        self.tolerance = tolerance
+        self.probe_steps = probe_steps
+
+        self.reset()
+
+    def reset(self):
+        """
+        Restart the search from the low current.
+        """
+
+        # The largest superconducting and the smallest resistive current
+        self.lower = np.full(self.low.shape, np.nan)
+        self.upper = np.full(self.low.shape, np.nan)
+
+        self.current = self.low.copy()
+        self.done = np.zeros(self.low.shape, dtype=bool)
+        self.finished = False
+        self.probes = 0
+
+        # Progress of the current probe
+        self.step = 0
+        self.voltage_time = np.zeros(self.low.shape)
+        self.time = 0.0
+
+        # The state at the end of the last superconducting probe
+        self.psi = None
+        self.mu = None
+
+    def get_value(self) -> Union[float, np.ndarray]:
+        """
+        Get the current to apply.
+        :return: The current.
+        """
+
+        return self.current if self.current.ndim > 0 else float(self.current)
+
+    def get_critical_current(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Get the critical current estimate.
+        :return: The midpoint of the bracket and half its width. The values
+        are NaN until the bracket is found.
+        """
+
+        lower = np.where(np.isnan(self.lower) & ~np.isnan(self.upper), 0,
+                         self.lower)
+
+        return (lower + self.upper) / 2, (self.upper - lower) / 2
+
+    def update(self,
+               voltage: Union[float, np.ndarray],
+               dt: float,
+               psi: np.ndarray,
+               mu: np.ndarray
+               ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Add a step to the current probe and choose the next current when the
+        probe is complete.
+
+        :param voltage: The voltage.
+        :param dt: The time step.
+        :param psi: The complex field.
+        :param mu: The scalar potential.
+        :return: The complex field and scalar potential to continue from.
+        """
+
+        # Keep the first state as the initial superconducting state
+        if self.psi is None:
+            self.psi = psi.copy()
+            self.mu = mu.copy()
+
+        self.step += 1
+
+        # Average the voltage over the second half of the probe
+        if 2 * self.step > self.probe_steps:
+            self.voltage_time += np.asarray(voltage) * dt
+            self.time += dt
+
+        if self.step < self.probe_steps:
+            return psi, mu
+
+        resistive = self.voltage_time / self.time > self.threshold
+        self.probes += 1
+        self.step = 0
+        self.voltage_time = np.zeros(self.low.shape)
+        self.time = 0.0
+
+        # Update the bracket for the members that are still searched
+        searching = ~self.done
+        self.lower = np.where(searching & ~resistive, self.current,
+                              self.lower)
+        self.upper = np.where(searching & resistive, self.current,
+                              self.upper)
+
+        # Keep the superconducting states and restart the resistive members
+        # from the last superconducting state
+        keep = searching & ~resistive
+        self.psi = np.where(keep, psi, self.psi)
+        self.mu = np.where(keep, mu, self.mu)
+        psi = np.where(keep | self.done, psi, self.psi)
+        mu = np.where(keep | self.done, mu, self.mu)
+
+        self.__next_current()
+
+        return psi, mu
+
+    def __next_current(self):
+        """
+        Choose the next current for each member.
+        """
+
+        no_lower = np.isnan(self.lower)
+        no_upper = np.isnan(self.upper)
+
+        # The search is done if the low current is resistive or if the
+        # bracket is small enough
+        self.done = (no_lower & ~no_upper) \
+            | (self.upper - self.lower <= self.tolerance)
+
+        # Probe the high current and then move it up until it is resistive
+        expanded = np.where(self.lower < self.high, self.high,
+                            2 * self.lower - self.low)
+
+        next_current = np.where(
+            no_upper, expanded, (self.lower + self.upper) / 2
+        )
+
+        # Members that are done stay at the largest superconducting current
+        self.current = np.where(
+            self.done, np.where(no_lower, self.low, self.lower), next_current
+        )
+        self.finished = bool(np.all(self.done))
@@ -0,0 +1,321 @@
+import logging
+from abc import ABC, abstractmethod
+from enum import Enum
+from inspect import signature
+from typing import Optional, Dict, Any
+
+import numpy as np
+from scipy.sparse import diags, spmatrix, csr_matrix
+from scipy.sparse.linalg import splu, spilu, cg, LinearOperator
+
+try:
+    import pyamg
+except ImportError:
+    pyamg = None
+
+
+# The relative tolerance of the conjugate gradient method was renamed from tol
+# to rtol in SciPy 1.12
+_CG_TOLERANCE_KEY = 'rtol' if 'rtol' in signature(cg).parameters else 'tol'
+
+
+class MuSolverType(Enum):
+    DIRECT = 'direct'
+    CG_AMG = 'cg-amg'
+    CG_ILU = 'cg-ilu'
+    CG_JACOBI = 'cg-jacobi'
+
+    @classmethod
+    def get_keys(cls):
+        return list(item.value for item in MuSolverType)
+
+
+class MuSolver(ABC):
+    """
+    Solver for the scalar potential. The solver is created once for the
+    Laplacian and is then used to solve for a new right hand side every
+    time step.
+    """
+
+    @abstractmethod
+    def solve(self, rhs: np.ndarray, x0: Optional[np.ndarray] = None
+              ) -> np.ndarray:
+        """
+        Solve for the scalar potential.
+        :param rhs: The right hand side. Ensembles are solved column by
+        column for a (sites, members)-array.
+        :param x0: An initial guess, e.g. the scalar potential in the
+        previous time step.
+        :return: The scalar potential.
+        """
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """
+        Get statistics about the solves.
+        :return: A dict with the statistics.
+        """
+        return {}
+
+
+class DirectMuSolver(MuSolver):
+    """
+    Solve for the scalar potential using a sparse LU factorization.
+    """
+
+    def __init__(self, laplacian: spmatrix,
+                 column_order: Optional[np.ndarray] = None):
+        """
+        Factorize the Laplacian.
+        :param laplacian: The Laplacian for the scalar potential.
+        :param column_order: A fill-reducing column order from a previous
+        factorization of the same matrix. The ordering step is skipped if it
+        is given.
+        """
+
+        self.column_order = column_order
+
+        if column_order is None:
+            self.lu = splu(laplacian.tocsc())
+        else:
+            self.lu = splu(laplacian.tocsc()[:, column_order],
+                           permc_spec='NATURAL')
+
+    def get_column_order(self) -> np.ndarray:
+        """
+        Get the column order used by the factorization.
+        :return: The column indices in the order they are eliminated.
+        """
+
+        if self.column_order is not None:
+            return self.column_order
+
+        return np.argsort(self.lu.perm_c)
+
+    def solve(self, rhs: np.ndarray, x0: Optional[np.ndarray] = None
+              ) -> np.ndarray:
+
+        if self.column_order is None:
+            return self.lu.solve(rhs)
+
+        # Undo the column permutation
+        solution = np.empty_like(rhs)
+        solution[self.column_order] = self.lu.solve(rhs)
+        return solution
+
+
+class IterativeMuSolver(MuSolver):
+    """
+    Solve for the scalar potential using a preconditioned conjugate gradient
+    method that is warm started from the previous solution.
+
+    The Laplacian is divided by the area of each site and is therefore not
+    symmetric. The solver instead works with the symmetric positive
+    semi-definite system obtained by multiplying with minus the areas. Its
+    null space are the constant potentials, which conjugate gradient handles
+    since the right hand side is made consistent, but the preconditioner
+    must be symmetric and positive definite.
+    """
+
+    # Relative shift of the diagonal that makes the matrix positive definite
+    # before the incomplete factorization
+    ILU_SHIFT = 1e-9
+
+    def __init__(self,
+                 laplacian: spmatrix,
+                 areas: np.ndarray,
+                 preconditioner: MuSolverType = MuSolverType.CG_JACOBI,
+                 tolerance: float = 1e-8,
+                 max_iterations: Optional[int] = None,
+                 logger: Optional[logging.Logger] = None
+                 ):
+        """
+        Create the solver and build the preconditioner.
+        :param laplacian: The Laplacian for the scalar potential.
+        :param areas: The area of each site.
+        :param preconditioner: The preconditioned solver type.
+        :param tolerance: The relative tolerance of the residual.
+        :param max_iterations: Maximal number of iterations per solve.
+        :param logger: Logger used to warn about solves that do not converge.
+        """
+
+        self.areas = np.asarray(areas)
+        self.tolerance = tolerance
+        self.max_iterations = max_iterations
+        self.logger = logger if logger is not None else logging.getLogger()
+
+        # Symmetrize the Laplacian
+        matrix = - diags(self.areas) @ csr_matrix(laplacian)
+        self.matrix = ((matrix + matrix.transpose()) / 2).tocsr()
+
+        self.preconditioner = self.__build_preconditioner(self.matrix,
+                                                          preconditioner)
+
+        # Statistics
+        self.solves = 0
+        self.iterations = 0
+        self.max_solve_iterations = 0
+        self.last_iterations = 0
+        self.last_residual = 0.0
+        self.max_residual = 0.0
+        self.unconverged = 0
+
+    @classmethod
+    def __build_preconditioner(cls, matrix: csr_matrix,
+                               solver_type: MuSolverType) -> LinearOperator:
+        """
+        Build the preconditioner.
+        :param matrix: The symmetric system matrix.
+        :param solver_type: The solver type.
+        :return: The preconditioner.
+        """
+
+        if solver_type is MuSolverType.CG_JACOBI:
+            inverse_diagonal = 1 / matrix.diagonal()
+            return LinearOperator(matrix.shape,
+                                  matvec=lambda x: inverse_diagonal * x,
+                                  dtype=matrix.dtype)
+
+        if solver_type is MuSolverType.CG_ILU:
+            return cls.__build_symmetric_ilu(matrix)
+
+        if solver_type is MuSolverType.CG_AMG:
+            if pyamg is None:
+                raise ImportError('The AMG preconditioner requires pyamg. '
+                                  'Install it with pip install pyamg.')
+
+            return pyamg.smoothed_aggregation_solver(matrix).aspreconditioner()
+
+        raise ValueError('Unknown preconditioner.')
+
+    @classmethod
+    def __build_symmetric_ilu(cls, matrix: csr_matrix) -> LinearOperator:
+        """
+        Build a symmetric positive definite preconditioner L D L^T from an
+        incomplete LU factorization. The factorization is done without
+        pivoting or reordering of the matrix with its diagonal shifted to
+        make it positive definite, and only the lower factor and the
+        diagonal of the upper factor are kept.
+
+        :param matrix: The symmetric system matrix.
+        :return: The preconditioner.
+        """
+
+        diagonal = matrix.diagonal()
+        shifted = (matrix + diags(cls.ILU_SHIFT * diagonal)).tocsc()
+        ilu = spilu(shifted, permc_spec='NATURAL', diag_pivot_thresh=0.0,
+                    options={'SymmetricMode': True})
+
+        # Replace pivots that are not positive, which can be caused by the
+        # dropped entries, by the diagonal of the matrix
+        pivots = ilu.U.diagonal()
+        pivots = np.where(pivots > 0, pivots, diagonal)
+
+        # Factorize the unit lower factor to solve with it and its transpose
+        lower = splu(ilu.L.tocsc(), permc_spec='NATURAL',
+                     diag_pivot_thresh=0.0, options={'SymmetricMode': True})
+
+        return LinearOperator(
+            matrix.shape,
+            matvec=lambda x: lower.solve(lower.solve(x) / pivots, trans='T'),
+            dtype=matrix.dtype
+        )
+
+    def solve(self, rhs: np.ndarray, x0: Optional[np.ndarray] = None
+              ) -> np.ndarray:
+
+        # Solve an ensemble column by column
+        if rhs.ndim > 1:
+            return np.stack([
+                self.solve(rhs[:, i], x0[:, i] if x0 is not None else None)
+                for i in range(rhs.shape[1])
+            ], axis=1)
+
+        # Transform to the symmetric system
+        b = - self.areas * rhs
+
+        # The conjugate gradient method does not detect a right hand side
+        # that is not finite, e.g. after the simulation has diverged
+        if not np.all(np.isfinite(b)):
+            raise ValueError('The right hand side for the scalar potential '
+                             'is not finite.')
+
+        # Remove the component along the constant null space to make the
+        # system consistent
+        b -= np.mean(b)
+
+        iterations = 0
+
+        def count(_):
+            nonlocal iterations
+            iterations += 1
+
+        x, info = cg(self.matrix, b, x0=x0, maxiter=self.max_iterations,
+                     M=self.preconditioner, callback=count,
+                     **{_CG_TOLERANCE_KEY: self.tolerance})
+
+        if info < 0:
+            raise RuntimeError('The scalar potential solver broke down.')
+
+        # Compute the relative residual
+        norm = np.linalg.norm(b)
+        residual = np.linalg.norm(b - self.matrix @ x) / norm \
+            if norm > 0 else 0.0
+
+        # Update the statistics
+        self.solves += 1
+        self.iterations += iterations
+        self.max_solve_iterations = max(self.max_solve_iterations, iterations)
+        self.last_iterations = iterations
+        self.last_residual = residual
+        self.max_residual = max(self.max_residual, residual)
+
+        # Warn about the first solve that does not reach the tolerance and
+        # count the others
+        if info > 0:
+            if self.unconverged == 0:
+                self.logger.warning(
+                    'The scalar potential solver did not converge in {} '
+                    'iterations, the relative residual is {:.2e}.'
+                    .format(iterations, residual)
+                )
+            self.unconverged += 1
+
+        return x
+
+    def get_statistics(self) -> Dict[str, Any]:
+        return {
+            'solves': self.solves,
+            'mean iterations': self.iterations / max(self.solves, 1),
+            'max iterations': self.max_solve_iterations,
+            'max residual': self.max_residual,
+            'unconverged solves': self.unconverged
+        }
+
+
+def create_mu_solver(solver_type: MuSolverType,
+                     laplacian: spmatrix,
+                     areas: np.ndarray,
+                     tolerance: float = 1e-8,
+                     max_iterations: Optional[int] = None,
+                     column_order: Optional[np.ndarray] = None,
+                     logger: Optional[logging.Logger] = None
+                     ) -> MuSolver:
+    """
+    Create a solver for the scalar potential.
+    :param solver_type: The type of solver.
+    :param laplacian: The Laplacian for the scalar potential.
+    :param areas: The area of each site.
+    :param tolerance: Relative tolerance for iterative solvers.
+    :param max_iterations: Maximal number of iterations for iterative solvers.
+    :param column_order: Column order for the direct solver from a previous
+    factorization.
+    :param logger: Logger used by iterative solvers to warn about solves that
+    do not converge.
+    :return: The solver.
+    """
+
+    if solver_type is MuSolverType.DIRECT:
+        return DirectMuSolver(laplacian, column_order)
+
+    return IterativeMuSolver(laplacian, areas, solver_type, tolerance,
+                             max_iterations, logger)
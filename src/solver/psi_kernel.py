@@ -0,0 +1,281 @@
+from typing import Sequence, Optional, Tuple
+
+import numpy as np
+from scipy.sparse import spmatrix
+
+from src.matrices.partitioned_matrix import get_row_block
+from src.util.parallel import ParallelExecutor, split_rows
+from src.util.sparse_matvec import sparse_matvec
+
+
+class PsiKernel:
+    """
+    Time step kernel for the complex field. All intermediate values are
+    stored in work buffers that are allocated once, which keeps the update
+    free from full-size temporaries.
+
+    The update uses the discrete gauge invariant discretization presented in
+    chapter 5 in http://urn.kb.se/resolve?urn=urn:nbn:se:kth:diva-312132 and
+    performs the same floating point operations in the same order as the
+    direct NumPy expression, so the result is numerically identical.
+
+    With an executor the sites are split into row blocks of the Laplacian and
+    the blocks are updated concurrently.
+
+    With step doubling the local error of a step is estimated by comparing
+    two half steps with one full step.
+    """
+
+    def __init__(self,
+                 laplacian: spmatrix,
+                 alpha: np.ndarray,
+                 u: float,
+                 gamma: float,
+                 shape: Sequence[int],
+                 executor: Optional[ParallelExecutor] = None,
+                 step_doubling: bool = False
+                 ):
+        """
+        Create the kernel and allocate the work buffers.
+
+        :param laplacian: The covariant Laplacian for the complex field.
+        :param alpha: The alpha parameter for each site.
+        :param u: The complex field time scale.
+        :param gamma: The gamma parameter.
+        :param shape: The shape of the complex field. Ensembles are stored
+        as (sites, members)-arrays.
+        :param executor: Executor used to update blocks of sites
+        concurrently.
+        :param step_doubling: Allocate the buffers used to estimate the
+        local error by step doubling.
+        """
+
+        self.laplacian = laplacian
+        self.alpha = np.reshape(alpha, (-1,) + (1,) * (len(shape) - 1))
+        self.u = u
+        self.sq_gamma = gamma ** 2
+
+        # Real work buffers
+        self.abs_sq_psi = np.empty(shape, dtype=np.float64)
+        self.real_a = np.empty(shape, dtype=np.float64)
+        self.real_b = np.empty(shape, dtype=np.float64)
+        self.real_c = np.empty(shape, dtype=np.float64)
+        self.discriminant = np.empty(shape, dtype=np.float64)
+
+        # Complex work buffers
+        self.phase = np.empty(shape, dtype=np.complex128)
+        self.z = np.empty(shape, dtype=np.complex128)
+        self.w = np.empty(shape, dtype=np.complex128)
+        self.complex_a = np.empty(shape, dtype=np.complex128)
+
+        # The output alternates between two buffers such that the input is
+        # never overwritten during a step
+        self.outputs = (np.empty(shape, dtype=np.complex128),
+                        np.empty(shape, dtype=np.complex128))
+
+        # The full step and the first half step when doubling steps
+        self.full_step = np.empty(shape, dtype=np.complex128) \
+            if step_doubling else None
+        self.half_step = np.empty(shape, dtype=np.complex128) \
+            if step_doubling else None
+
+        # Split the sites into blocks of rows in the Laplacian
+        self.executor = executor
+        self.rows = split_rows(laplacian.indptr, executor.workers) \
+            if executor is not None else [(0, shape[0])]
+        self.laplacian_blocks = [
+            get_row_block(laplacian, start, stop)
+            for start, stop in self.rows
+        ] if executor is not None else [laplacian]
+
+    def step(self, psi: np.ndarray, mu: np.ndarray, dt: float) -> np.ndarray:
+        """
+        Compute the complex field for the next time step.
+
+        NOTE: The returned array is a work buffer owned by the kernel. It is
+        valid until the step after the next one.
+
+        :param psi: The complex field.
+        :param mu: The scalar potential.
+        :param dt: The time step.
+        :return: The complex field for the next time step.
+        """
+
+        out = self.outputs[0] if psi is not self.outputs[0] \
+            else self.outputs[1]
+
+        self.__step(psi, mu, dt, out)
+
+        return out
+
+    def step_doubled(self, psi: np.ndarray, mu: np.ndarray, dt: float
+                     ) -> Tuple[np.ndarray, float, float]:
+        """
+        Compute the complex field for the next time step with two half steps
+        and estimate the local error by step doubling. The update is first
+        order in time, so the largest difference to a single full step
+        estimates the local error of the half steps.
+
+        NOTE: The returned array is a work buffer owned by the kernel. It is
+        valid until the step after the next one. The statistics of the last
+        step refer to the second half step.
+
+        :param psi: The complex field.
+        :param mu: The scalar potential.
+        :param dt: The time step.
+        :return: The complex field for the next time step, the estimated
+        local error and the smallest discriminant of the steps.
+        """
+
+        if self.full_step is None:
+            raise RuntimeError('The kernel was created without buffers for '
+                               'step doubling.')
+
+        out = self.outputs[0] if psi is not self.outputs[0] \
+            else self.outputs[1]
+
+        self.__step(psi, mu, dt, self.full_step)
+        min_discriminant = self.get_min_discriminant()
+
+        self.__step(psi, mu, dt / 2, self.half_step)
+        min_discriminant = min(min_discriminant, self.get_min_discriminant())
+
+        self.__step(self.half_step, mu, dt / 2, out)
+        min_discriminant = min(min_discriminant, self.get_min_discriminant())
+
+        # Compare the half steps with the full step
+        np.subtract(out, self.full_step, out=self.full_step)
+        np.abs(self.full_step, out=self.real_c)
+
+        return out, float(np.max(self.real_c)), min_discriminant
+
+    def __step(self, psi: np.ndarray, mu: np.ndarray, dt: float,
+               out: np.ndarray):
+        """
+        Compute the complex field for the next time step.
+
+        :param psi: The complex field.
+        :param mu: The scalar potential.
+        :param dt: The time step.
+        :param out: The array to store the new complex field in.
+        """
+
+        if self.executor is None:
+            self.__step_rows(0, psi, mu, dt, out)
+        else:
+            self.executor.run(
+                lambda block: self.__step_rows(block, psi, mu, dt, out),
+                len(self.rows)
+            )
+
+    def __step_rows(self, block: int, psi: np.ndarray, mu: np.ndarray,
+                    dt: float, out: np.ndarray):
+        """
+        Compute the complex field for the next time step for a block of
+        sites.
+
+        :param block: The index of the block.
+        :param psi: The complex field.
+        :param mu: The scalar potential.
+        :param dt: The time step.
+        :param out: The array to store the new complex field in.
+        """
+
+        start, stop = self.rows[block]
+        laplacian = self.laplacian_blocks[block]
+        abs_sq_psi = self.abs_sq_psi[start:stop]
+        real_a = self.real_a[start:stop]
+        real_b = self.real_b[start:stop]
+        real_c = self.real_c[start:stop]
+        discriminant = self.discriminant[start:stop]
+        phase = self.phase[start:stop]
+        z = self.z[start:stop]
+        w = self.w[start:stop]
+        complex_a = self.complex_a[start:stop]
+        alpha = self.alpha[start:stop]
+        psi_rows = psi[start:stop]
+        mu = mu[start:stop]
+        out = out[start:stop]
+
+        # Compute the absolute square psi
+        np.abs(psi_rows, out=abs_sq_psi)
+        np.square(abs_sq_psi, out=abs_sq_psi)
+
+        # Compute the phase factor exp(-i mu dt) once
+        np.multiply(mu, -1j, out=phase)
+        np.multiply(phase, dt, out=phase)
+        np.exp(phase, out=phase)
+
+        # Compute z
+        np.multiply(phase, self.sq_gamma, out=z)
+        np.divide(z, 2, out=z)
+        np.multiply(z, psi_rows, out=z)
+
+        # Compute dt / u * sqrt(1 + gamma^2 |psi|^2)
+        np.multiply(abs_sq_psi, self.sq_gamma, out=real_a)
+        np.add(real_a, 1, out=real_a)
+        np.sqrt(real_a, out=real_a)
+        np.multiply(real_a, dt / self.u, out=real_a)
+
+        # Compute (alpha - |psi|^2) psi + laplacian psi
+        np.subtract(alpha, abs_sq_psi, out=real_b)
+        np.multiply(real_b, psi_rows, out=complex_a)
+        sparse_matvec(laplacian, psi, w)
+        np.add(complex_a, w, out=complex_a)
+
+        # Compute w
+        np.multiply(real_a, complex_a, out=complex_a)
+        np.add(psi_rows, complex_a, out=complex_a)
+        np.multiply(phase, complex_a, out=complex_a)
+        np.multiply(z, abs_sq_psi, out=w)
+        np.add(w, complex_a, out=w)
+
+        # Compute a = Re(w) Re(z) + Im(w) Im(z) and store 2 a + 1
+        np.multiply(w.real, z.real, out=real_b)
+        np.multiply(w.imag, z.imag, out=real_a)
+        np.add(real_b, real_a, out=real_b)
+        np.multiply(real_b, 2, out=real_b)
+        np.add(real_b, 1, out=real_b)
+
+        # Compute |w|^2 and |z|^2
+        np.abs(w, out=real_a)
+        np.square(real_a, out=real_a)
+        np.abs(z, out=real_c)
+        np.square(real_c, out=real_c)
+
+        # Compute the discriminant (2 a + 1)^2 - 4 |z|^2 |w|^2
+        np.square(real_b, out=discriminant)
+        np.multiply(real_c, 4, out=real_c)
+        np.multiply(real_c, real_a, out=real_c)
+        np.subtract(discriminant, real_c, out=discriminant)
+
+        # Find the modulus squared for the next time step
+        np.sqrt(discriminant, out=real_c)
+        np.add(real_b, real_c, out=real_b)
+        np.multiply(real_a, 2, out=real_a)
+        np.divide(real_a, real_b, out=real_a)
+
+        # Compute the new psi
+        np.multiply(z, real_a, out=phase)
+        np.subtract(w, phase, out=out)
+
+    def get_min_discriminant(self) -> float:
+        """
+        Get the smallest discriminant in the update of the modulus squared
+        of the complex field during the last step. A negative value means
+        that the time step is too large.
+
+        :return: The smallest discriminant.
+        """
+
+        return float(np.min(self.discriminant))
+
+    def get_mean_modulus_squared(self) -> np.ndarray:
+        """
+        Get the mean modulus squared of the complex field after the last
+        step.
+
+        :return: The mean over the sites for each member of an ensemble.
+        """
+
+        return np.mean(self.real_a, axis=0)
@@ -0,0 +1,131 @@
+from typing import Sequence, Union, List
+
+import numpy as np
+
+
+class SteadyStateRamp:
+    """
+    Convergence driven current ramp. The ramp stays at each current until the
+    voltage and the mean modulus squared of the complex field are stationary
+    and then moves to the next current. The signals are averaged over windows
+    of steps, and they are considered stationary if the means over the two
+    latest windows differ by less than the tolerance times one plus the
+    magnitude of the mean. The ramp always stays at least the minimal number
+    of steps and at most the maximal number of steps at each current.
+    """
+
+    def __init__(self,
+                 levels: Sequence[Union[float, np.ndarray]],
+                 tolerance: float,
+                 min_dwell: int,
+                 max_dwell: int,
+                 window: int
+                 ):
+        """
+        Create the ramp.
+
+        :param levels: The currents in the order they are visited. Ensembles
+        have one value per member.
+        :param tolerance: The tolerance for stationary signals.
+        :param min_dwell: The minimal number of steps at each current.
+        :param max_dwell: The maximal number of steps at each current.
+        :param window: The number of steps averaged in each window.
+        """
+
+        if not 0 < min_dwell <= max_dwell:
+            raise ValueError('The dwell bounds must fulfill '
+                             '0 < min_dwell <= max_dwell.')
+
+        self.levels = list(levels)
+        self.tolerance = tolerance
+        self.min_dwell = min_dwell
+        self.max_dwell = max_dwell
+        self.window = max(window, 1)
+
+        self.level = 0
+        self.dwell = 0
+        self.dwell_times: List[int] = []
+        self.finished = False
+
+        # Sums over the current window and means over the previous window
+        self.sums = None
+        self.previous_means = None
+        self.window_steps = 0
+
+    def reset(self):
+        """
+        Go back to the first current.
+        """
+
+        self.level = 0
+        self.dwell_times = []
+        self.finished = False
+        self.__start_level()
+
+    def get_value(self) -> Union[float, np.ndarray]:
+        """
+        Get the current at the present level.
+        :return: The current.
+        """
+
+        return self.levels[min(self.level, len(self.levels) - 1)]
+
+    def update(self, voltage: Union[float, np.ndarray],
+               mean_modulus_squared: Union[float, np.ndarray]):
+        """
+        Add the signals from a step and move to the next current if they are
+        stationary or if the maximal number of steps is reached.
+
+        :param voltage: The voltage.
+        :param mean_modulus_squared: The mean modulus squared of the complex
+        field.
+        """
+
+        if self.finished:
+            return
+
+        self.dwell += 1
+
+        # Add the signals to the current window
+        signals = np.asarray([voltage, mean_modulus_squared],
+                             dtype=np.float64)
+        self.sums = signals if self.sums is None else self.sums + signals
+        self.window_steps += 1
+
+        stationary = False
+
+        if self.window_steps == self.window:
+            means = self.sums / self.window
+
+            stationary = self.previous_means is not None and bool(np.all(
+                np.abs(means - self.previous_means)
+                <= self.tolerance * (1 + np.abs(means))
+            ))
+
+            self.previous_means = means
+            self.sums = None
+            self.window_steps = 0
+
+        if (stationary and self.dwell >= self.min_dwell) \
+                or self.dwell >= self.max_dwell:
+            self.__next_level()
+
+    def __next_level(self):
+        """
+        Move to the next current.
+        """
+
+        self.dwell_times.append(self.dwell)
+        self.level += 1
+        self.finished = self.level >= len(self.levels)
+        self.__start_level()
+
+    def __start_level(self):
+        """
+        Reset the windows for a new current.
+        """
+
+        self.dwell = 0
+        self.sums = None
+        self.previous_means = None
+        self.window_steps = 0
@@ -0,0 +1,187 @@
+from typing import Sequence, Optional, Callable, Any
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from src.matrices.partitioned_matrix import get_row_block
+from src.mesh.mesh import Mesh
+from src.util.parallel import ParallelExecutor, split_rows
+from src.util.sparse_matvec import sparse_matvec
+
+
+class SupercurrentKernel:
+    """
+    Kernel for the supercurrent and its divergence. The supercurrent on an
+    edge (i, j) is Im(conj(psi_i) U_ij psi_j) / l_ij, where U_ij is the link
+    variable and l_ij the edge length. The link variables divided by the
+    edge lengths are computed once, so the supercurrent is a single pass over
+    the edges without a covariant gradient product. The divergence is the
+    product with a sites by edges incidence matrix that holds the dual edge
+    lengths divided by the site areas.
+
+    With an executor the edges are split into blocks for the supercurrent
+    and the sites into row blocks of the incidence matrix for the
+    divergence, and the blocks are computed concurrently.
+    """
+
+    def __init__(self,
+                 mesh: Mesh,
+                 shape: Sequence[int],
+                 link_exponents: Optional[np.ndarray] = None,
+                 executor: Optional[ParallelExecutor] = None
+                 ):
+        """
+        Create the kernel and allocate the work buffers.
+
+        :param mesh: The mesh.
+        :param shape: The shape of the complex field. Ensembles are stored
+        as (sites, members)-arrays.
+        :param link_exponents: The vector potential on the edges. Ensembles
+        have one (edges, 2)-array per member along the last axis.
+        :param executor: Executor used to compute blocks of edges and sites
+        concurrently.
+        """
+
+        edge_mesh = mesh.edge_mesh
+        member_shape = tuple(shape[1:])
+        edge_shape = (len(edge_mesh.edges),) + member_shape
+        broadcast_shape = (-1,) + (1,) * len(member_shape)
+
+        self.edges = np.asarray(edge_mesh.edges, dtype=np.int64)
+        self.sites = len(mesh.x)
+        self.shape = tuple(shape)
+
+        # Compute the link variables divided by the edge lengths
+        self.coefficients = np.empty(edge_shape, dtype=np.complex128)
+        self.inverse_lengths = np.reshape(1 / edge_mesh.edge_lengths,
+                                          broadcast_shape)
+        self.directions = np.reshape(edge_mesh.directions,
+                                     (-1, 2) + (1,) * len(member_shape))
+        self.set_link_exponents(link_exponents)
+
+        # Build the incidence matrix with the divergence weights of the first
+        # and the second site of each edge
+        edge_indices = np.arange(len(self.edges))
+        self.incidence = csr_matrix(
+            (np.concatenate([
+                edge_mesh.dual_edge_lengths / mesh.areas[self.edges[:, 0]],
+                -edge_mesh.dual_edge_lengths / mesh.areas[self.edges[:, 1]]
+            ]),
+             (self.edges.T.ravel(), np.tile(edge_indices, 2))),
+            shape=(self.sites, len(self.edges))
+        )
+        self.incidence.sort_indices()
+
+        # Work buffers
+        self.products = np.empty(edge_shape, dtype=np.complex128)
+        self.conjugates = np.empty(edge_shape, dtype=np.complex128)
+        self.current = np.empty(edge_shape, dtype=np.float64)
+        self.divergence = np.empty(self.shape, dtype=np.float64)
+
+        # Split the edges into blocks of the same size and the sites into
+        # blocks of rows in the incidence matrix
+        self.executor = executor
+        workers = executor.workers if executor is not None else 1
+        bounds = np.linspace(0, len(self.edges), workers + 1).astype(int)
+        self.edge_blocks = list(zip(bounds[:-1], bounds[1:]))
+        self.rows = split_rows(self.incidence.indptr, workers)
+        self.incidence_blocks = [
+            get_row_block(self.incidence, start, stop)
+            for start, stop in self.rows
+        ] if executor is not None else [self.incidence]
+
+    def set_link_exponents(self, link_exponents: Optional[np.ndarray]):
+        """
+        Update the link variables in place.
+        :param link_exponents: The vector potential on the edges.
+        """
+
+        if link_exponents is None:
+            np.copyto(self.coefficients, self.inverse_lengths)
+            return
+
+        np.exp(-1j * (np.asarray(link_exponents)
+                      * self.directions).sum(axis=1),
+               out=self.coefficients)
+        np.multiply(self.coefficients, self.inverse_lengths,
+                    out=self.coefficients)
+
+    def __run(self, function: Callable[[int], Any], count: int):
+        """
+        Run a function for each block, concurrently with an executor.
+        :param function: The function that takes the block index.
+        :param count: The number of blocks.
+        """
+
+        if self.executor is None:
+            for block in range(count):
+                function(block)
+        else:
+            self.executor.run(function, count)
+
+    def __compute_current_edges(self, block: int, psi: np.ndarray):
+        """
+        Compute the supercurrent of a block of edges into the work buffer.
+        :param block: The index of the block.
+        :param psi: The complex field.
+        """
+
+        start, stop = self.edge_blocks[block]
+        edges = self.edges[start:stop]
+        products = self.products[start:stop]
+        conjugates = self.conjugates[start:stop]
+
+        np.take(psi, edges[:, 1], axis=0, out=products)
+        np.multiply(products, self.coefficients[start:stop], out=products)
+        np.take(psi, edges[:, 0], axis=0, out=conjugates)
+        np.conjugate(conjugates, out=conjugates)
+        np.multiply(products, conjugates, out=products)
+        np.copyto(self.current[start:stop], products.imag)
+
+    def __compute_current(self, psi: np.ndarray) -> np.ndarray:
+        """
+        Compute the supercurrent into the work buffer.
+        :param psi: The complex field.
+        :return: The work buffer with the supercurrent.
+        """
+
+        self.__run(lambda block: self.__compute_current_edges(block, psi),
+                   len(self.edge_blocks))
+
+        return self.current
+
+    def __compute_divergence_rows(self, block: int):
+        """
+        Compute the divergence of the supercurrent in the work buffer for a
+        block of sites.
+        :param block: The index of the block.
+        """
+
+        start, stop = self.rows[block]
+        sparse_matvec(self.incidence_blocks[block], self.current,
+                      self.divergence[start:stop])
+
+    def get_supercurrent(self, psi: np.ndarray) -> np.ndarray:
+        """
+        Compute the supercurrent on the edges.
+        :param psi: The complex field.
+        :return: The supercurrent at each edge.
+        """
+
+        return self.__compute_current(psi).copy()
+
+    def get_divergence(self, psi: np.ndarray) -> np.ndarray:
+        """
+        Compute the divergence of the supercurrent on the sites.
+
+        NOTE: The returned array is a work buffer owned by the kernel. It is
+        valid until the next call.
+
+        :param psi: The complex field.
+        :return: The supercurrent divergence at each site.
+        """
+
+        self.__compute_current(psi)
+        self.__run(self.__compute_divergence_rows, len(self.rows))
+
+        return self.divergence
@@ -0,0 +1,112 @@
+import os
+import resource
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any
+
+import numpy as np
+
+
+class MetricsServer:
+    """
+    Local HTTP server with live metrics of a simulation in the Prometheus
+    text format. The server runs in a background thread and serves the
+    latest metrics published by the simulation, which replaces them as a
+    whole, such that publishing never waits for a request.
+    """
+
+    PREFIX = 'tdgl_'
+
+    def __init__(self, port: int, host: str = '127.0.0.1'):
+        """
+        Start the server.
+
+        :param port: The port to listen on. A free port is chosen if it is
+        zero.
+        :param host: The address to listen on.
+        """
+
+        self.metrics: Dict[str, Any] = {}
+
+        metrics_server = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+
+                body = metrics_server.get_text().encode()
+                self.send_response(200)
+                self.send_header('Content-Type',
+                                 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+
+                # Do not log the requests
+                pass
+
+        self.http_server = ThreadingHTTPServer((host, port), Handler)
+        self.http_server.daemon_threads = True
+        self.port = self.http_server.server_address[1]
+        self.thread = threading.Thread(target=self.http_server.serve_forever,
+                                       daemon=True)
+        self.thread.start()
+
+    @classmethod
+    def __get_resident_memory(cls) -> int:
+        """
+        Get the resident memory of the process.
+        :return: The resident memory in bytes.
+        """
+
+        try:
+            with open('/proc/self/statm') as file:
+                return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError):
+
+            # Fall back to the peak resident memory, which is reported in
+            # kilobytes
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    def publish(self, metrics: Dict[str, Any]):
+        """
+        Replace the metrics.
+        :param metrics: The metrics with scalar values or one value per
+        member of an ensemble.
+        """
+
+        self.metrics = dict(metrics)
+
+    def get_text(self) -> str:
+        """
+        Get the metrics in the Prometheus text format.
+        :return: The metrics.
+        """
+
+        metrics = dict(self.metrics)
+        metrics['resident_memory_bytes'] = self.__get_resident_memory()
+
+        lines = []
+        for name, value in metrics.items():
+            name = self.PREFIX + name
+            value = np.asarray(value, dtype=np.float64)
+            lines.append('# TYPE {} gauge'.format(name))
+
+            if value.ndim == 0:
+                lines.append('{} {}'.format(name, repr(float(value))))
+                continue
+
+            for member, member_value in enumerate(value.ravel()):
+                lines.append('{}{{member="{}"}} {}'
+                             .format(name, member, repr(float(member_value))))
+
+        return '\n'.join(lines) + '\n'
+
+    def close(self):
+        self.http_server.shutdown()
+        self.http_server.server_close()
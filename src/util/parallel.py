@@ -0,0 +1,68 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Tuple, Any
+
+import numpy as np
+
+
+class ParallelExecutor:
+    """
+    Thread pool used to run blocks of a time step concurrently. The NumPy
+    ufuncs and the SciPy sparse kernels release the GIL, so the blocks run in
+    parallel even though they are executed by Python threads.
+    """
+
+    def __init__(self, workers: int):
+        """
+        Create the executor.
+
+        :param workers: The number of worker threads.
+        """
+
+        self.workers = workers
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+
+    def run(self, function: Callable[[int], Any], count: int):
+        """
+        Run a function for each block and wait for all blocks to finish.
+        Exceptions raised in a block are raised in the calling thread. The
+        NumPy error state is per thread, so the blocks run with the error
+        state of the calling thread.
+
+        :param function: The function that takes the block index.
+        :param count: The number of blocks.
+        """
+
+        error_state = np.geterr()
+
+        def run_block(block: int):
+            with np.errstate(**error_state):
+                return function(block)
+
+        futures = [self.pool.submit(run_block, i) for i in range(count)]
+
+        for future in futures:
+            future.result()
+
+    def close(self):
+        self.pool.shutdown()
+
+
+def split_rows(indptr: np.ndarray, blocks: int) -> List[Tuple[int, int]]:
+    """
+    Split the rows of a sparse matrix into blocks with roughly the same
+    number of values.
+    :param indptr: The CSR row pointers.
+    :param blocks: The number of blocks.
+    :return: A list of (start, stop) row ranges.
+    """
+
+    rows = len(indptr) - 1
+
+    # Find the rows where the cumulative number of values passes each share
+    bounds = np.searchsorted(indptr, np.linspace(0, indptr[-1], blocks + 1))
+    bounds[0] = 0
+    bounds[-1] = rows
+    bounds = np.unique(np.minimum(bounds, rows))
+
+    return [(int(start), int(stop))
+            for start, stop in zip(bounds[:-1], bounds[1:])]
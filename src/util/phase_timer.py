@@ -0,0 +1,134 @@
+import json
+import math
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Iterator, ContextManager
+
+import numpy as np
+
+
+class PhaseTimer:
+    """
+    Named timers for the phases of a simulation. The durations of each phase
+    are collected in a histogram with logarithmic bins, such that the memory
+    use does not grow with the number of steps. The total, mean, smallest and
+    largest durations are exact and the percentiles are accurate to the bin
+    width.
+    """
+
+    # Histogram bins from 100 ns to 100 s with 20 bins per decade
+    BINS_PER_DECADE = 20
+    SMALLEST = 1e-7
+    BIN_COUNT = 9 * BINS_PER_DECADE
+
+    PERCENTILES = (50, 90, 99)
+
+    def __init__(self, enabled: bool = True):
+        """
+        Create the timers.
+
+        :param enabled: If the phases should be timed. A disabled timer does
+        nothing.
+        """
+
+        self.enabled = enabled
+        self.start_time = time.perf_counter()
+        self.counts: Dict[str, np.ndarray] = {}
+        self.totals: Dict[str, float] = {}
+        self.smallest: Dict[str, float] = {}
+        self.largest: Dict[str, float] = {}
+
+    def time(self, name: str) -> ContextManager:
+        """
+        Time a phase.
+        :param name: The name of the phase.
+        :return: A context manager that times its body.
+        """
+
+        return self.__time(name) if self.enabled else nullcontext()
+
+    @contextmanager
+    def __time(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name: str, duration: float):
+        """
+        Add a duration to a phase.
+        :param name: The name of the phase.
+        :param duration: The duration in seconds.
+        """
+
+        if name not in self.counts:
+            self.counts[name] = np.zeros(self.BIN_COUNT, dtype=np.int64)
+            self.totals[name] = 0.0
+            self.smallest[name] = duration
+            self.largest[name] = duration
+
+        index = int(math.log10(max(duration, self.SMALLEST) / self.SMALLEST)
+                    * self.BINS_PER_DECADE)
+        self.counts[name][min(index, self.BIN_COUNT - 1)] += 1
+        self.totals[name] += duration
+        self.smallest[name] = min(self.smallest[name], duration)
+        self.largest[name] = max(self.largest[name], duration)
+
+    def __get_percentile(self, name: str, percentile: float) -> float:
+        """
+        Get a percentile of the durations of a phase.
+        :param name: The name of the phase.
+        :param percentile: The percentile between 0 and 100.
+        :return: The geometric center of the bin holding the percentile.
+        """
+
+        cumulative = np.cumsum(self.counts[name])
+        index = int(np.searchsorted(cumulative,
+                                    percentile / 100 * cumulative[-1]))
+        value = self.SMALLEST * 10 ** ((index + 0.5) / self.BINS_PER_DECADE)
+
+        return min(max(value, self.smallest[name]), self.largest[name])
+
+    def get_report(self) -> Dict[str, Dict[str, float]]:
+        """
+        Get the statistics for each phase.
+        :return: A dict with the statistics of each phase in seconds and the
+        fraction of the wall time since the timer was created.
+        """
+
+        wall_time = time.perf_counter() - self.start_time
+        report = {}
+
+        for name, counts in self.counts.items():
+            count = int(np.sum(counts))
+            statistics = {
+                'count': count,
+                'total': self.totals[name],
+                'fraction': self.totals[name] / wall_time,
+                'mean': self.totals[name] / count,
+                'min': self.smallest[name],
+                'max': self.largest[name]
+            }
+
+            for percentile in self.PERCENTILES:
+                statistics['p{}'.format(percentile)] = \
+                    self.__get_percentile(name, percentile)
+
+            report[name] = statistics
+
+        return report
+
+    def save_report(self, path: str) -> str:
+        """
+        Write the report to a JSON file.
+        :param path: The file path.
+        :return: The report as JSON.
+        """
+
+        report = json.dumps(self.get_report(), indent=2)
+
+        with open(path, 'w') as file:
+            file.write(report)
+
+        return report
@@ -0,0 +1,55 @@
+from typing import Union
+
+import numpy as np
+from scipy.sparse import spmatrix
+
+from src.matrices.batched_csr_matrix import BatchedCsrMatrix
+
+try:
+    from scipy.sparse import _sparsetools
+except ImportError:
+    _sparsetools = None
+
+
+def sparse_matvec(matrix: Union[spmatrix, BatchedCsrMatrix], x: np.ndarray,
+                  out: np.ndarray) -> np.ndarray:
+    """
+    Compute the product of a sparse matrix and a vector (or a matrix with one
+    column per vector) and store the result in a preallocated array.
+
+    CSR matrices with matching data types are multiplied directly into the
+    output array by the SciPy sparse kernels, which gives the same result as
+    matrix @ x without allocating a temporary. Batches of CSR matrices are
+    multiplied into the output array with their own work buffers. Other
+    matrices fall back on matrix @ x.
+    :param matrix: The sparse matrix.
+    :param x: The vector or the matrix to multiply with.
+    :param out: The array to store the result in.
+    :return: The output array.
+    """
+
+    if _sparsetools is not None \
+            and getattr(matrix, 'format', None) == 'csr' \
+            and matrix.dtype == x.dtype == out.dtype \
+            and x.flags.c_contiguous and out.flags.c_contiguous:
+
+        n_row, n_col = matrix.shape
+
+        # The SciPy kernels accumulate into the output
+        out.fill(0)
+
+        if x.ndim == 1:
+            _sparsetools.csr_matvec(n_row, n_col, matrix.indptr,
+                                    matrix.indices, matrix.data, x, out)
+        else:
+            _sparsetools.csr_matvecs(n_row, n_col, x.shape[1], matrix.indptr,
+                                     matrix.indices, matrix.data, x.ravel(),
+                                     out.ravel())
+
+        return out
+
+    if isinstance(matrix, BatchedCsrMatrix):
+        return matrix.multiply(x, out)
+
+    out[...] = matrix @ x
+    return out
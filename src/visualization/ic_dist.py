@@ -7,7 +7,8 @@ import numpy as np
 from matplotlib import pyplot as plt
 from tqdm import tqdm
 
-from src.visualization.visualization_helpers import get_mean_voltage
+from src.visualization.visualization_helpers import get_mean_voltage, \
+    get_critical_current
 
 
 class IcDist:
@@ -45,11 +46,17 @@ class IcDist:
         for i, f in enumerate(tqdm(files)):
 
             try:
+                found_critical_current = get_critical_current(f)
                 current, voltage = get_mean_voltage(f)
             except OSError:
                 logging.error("Could not parse {}".format(f))
                 continue
 
+            # Use the critical current from a search if it is available
+            if found_critical_current is not None:
+                critical_current[i] = found_critical_current
+                continue
+
             # Find the first current with voltage larger than the threshold
             # This current corresponds to the critical current
             critical_current_index = np.argmax(voltage > self.threshold)
@@ -3,12 +3,14 @@ from os import getcwd, path, listdir
 from os.path import isfile
 from typing import Optional
 
+import h5py
 import numpy as np
 from matplotlib import pyplot as plt
 from tqdm import tqdm
 
 from src.visualization.visualization_helpers import get_mean_voltage, \
-    get_magnetic_field
+    get_magnetic_field, get_group_mean_voltage, get_critical_current, \
+    get_group_critical_current
 
 
 class IcVsB:
@@ -33,6 +35,41 @@ class IcVsB:
 
     def show(self):
 
+        # A field sweep is stored in one file
+        if isfile(self.input_path):
+            magnetic_field, critical_current = self.__get_sweep_data()
+        else:
+            magnetic_field, critical_current = self.__get_directory_data()
+
+        if self.data_file is not None:
+            self.logger.info('Saving Ic vs B data to {} in numpy npz format.'
+                             .format(self.data_file))
+            np.savez(
+                self.data_file,
+                critical_current=critical_current,
+                magnetic_field=magnetic_field
+            )
+
+        plt.plot(magnetic_field, critical_current, '.',
+                 markersize=self.marker_size)
+        plt.xlabel('Magnetic field [a.u.]')
+        plt.ylabel('Critical current density at terminals [a.u.]')
+
+        if self.output_file:
+            plt.savefig(self.output_file)
+        else:
+            plt.show()
+
+    def __get_critical_current(self, current: np.ndarray,
+                               voltage: np.ndarray) -> float:
+
+        # Find the first current with voltage larger than the threshold
+        # This current corresponds to the critical current
+        critical_current_index = np.argmax(voltage > self.threshold)
+        return current[critical_current_index]
+
+    def __get_directory_data(self):
+
         # Get files
         files = [
             path.join(self.input_path, f) for f in listdir(self.input_path)
@@ -46,34 +83,45 @@ class IcVsB:
         for i, f in enumerate(tqdm(files)):
 
             try:
+                found_critical_current = get_critical_current(f)
                 current, voltage = get_mean_voltage(f)
             except OSError:
                 logging.error("Could not parse {}".format(f))
                 continue
 
-            # Find the first current with voltage larger than the threshold
-            # This current corresponds to the critical current
-            critical_current_index = np.argmax(voltage > self.threshold)
-            critical_current[i] = current[critical_current_index]
+            # Use the critical current from a search if it is available
+            critical_current[i] = found_critical_current \
+                if found_critical_current is not None \
+                else self.__get_critical_current(current, voltage)
 
             # Get the magnetic field
             magnetic_field[i] = get_magnetic_field(f, 0)
 
-        if self.data_file is not None:
-            self.logger.info('Saving Ic vs B data to {} in numpy npz format.'
-                             .format(self.data_file))
-            np.savez(
-                self.data_file,
-                critical_current=critical_current,
-                magnetic_field=magnetic_field
+        return magnetic_field, critical_current
+
+    def __get_sweep_data(self):
+
+        with h5py.File(self.input_path, 'r') as h5file:
+            sweep_group = h5file['sweep']
+            magnetic_field = np.asarray(
+                sweep_group.attrs['magnetic fields']
             )
+            critical_current = np.zeros(len(magnetic_field))
 
-        plt.plot(magnetic_field, critical_current, '.',
-                 markersize=self.marker_size)
-        plt.xlabel('Magnetic field [a.u.]')
-        plt.ylabel('Critical current density at terminals [a.u.]')
+            for i in tqdm(range(len(magnetic_field))):
+                found_critical_current = get_group_critical_current(
+                    sweep_group[str(i)]
+                )
 
-        if self.output_file:
-            plt.savefig(self.output_file)
-        else:
-            plt.show()
+                # Use the critical current from a search if it is available
+                if found_critical_current is not None:
+                    critical_current[i] = found_critical_current
+                    continue
+
+                current, voltage = get_group_mean_voltage(
+                    sweep_group[str(i)]
+                )
+                critical_current[i] = self.__get_critical_current(current,
+                                                                  voltage)
+
+        return magnetic_field, critical_current
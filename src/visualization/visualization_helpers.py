@@ -3,13 +3,73 @@ from typing import Tuple, Dict, Any, Sequence, Union, Optional
 import h5py
 import numpy as np
 
+from src.io.frame_layout import RUNNING_NAMES, FRAME_INDEX_DTYPE, \
+    get_frame_index_row
 from src.mesh.mesh import Mesh
 from src.observable import Observable
 from src.tdgl import get_observable_on_site
 from src.util.sum_contributions import sum_contributions
 
 
+def is_series_layout(h5file: h5py.Group) -> bool:
+    return 'series' in h5file
+
+
+def load_frame_index(h5file: h5py.Group) -> np.ndarray:
+    """
+    Load the frame index with the frame number, step, time, time step,
+    current, flow and magnetic field of each time step.
+    :param h5file: The data file.
+    :return: The frame index ordered by the frame number.
+    """
+
+    if 'frame index' in h5file:
+        return h5file['frame index'][()]
+
+    if not is_series_layout(h5file):
+
+        # Older files have no frame index and the state of each time step is
+        # read instead
+        frames = sorted(int(key) for key in h5file['data'].keys())
+        return np.concatenate(
+            [np.zeros(0, dtype=FRAME_INDEX_DTYPE)]
+            + [get_frame_index_row(frame, load_state_data(h5file, frame))
+               for frame in frames]
+        )
+
+    # The series layout stores each state key in one dataset
+    index = np.zeros(len(h5file['series']['running ends']),
+                     dtype=FRAME_INDEX_DTYPE)
+    index['frame'] = np.arange(len(index))
+    state = h5file['series']['state']
+
+    for name in FRAME_INDEX_DTYPE.names[1:]:
+        column = state[name] if name in state else None
+
+        if column is None or column.ndim != 1 \
+                or h5py.check_vlen_dtype(column.dtype) is not None:
+            index[name] = 0 if FRAME_INDEX_DTYPE[name].kind == 'i' \
+                else np.nan
+            continue
+
+        # Columns of a file that is still written can have unused rows
+        first_frame = column.attrs['first frame']
+        end = min(len(column), len(index))
+        index[name][:first_frame] = 0 \
+            if FRAME_INDEX_DTYPE[name].kind == 'i' else np.nan
+        index[name][first_frame:end] = column[first_frame:end]
+
+    return index
+
+
 def get_data_range(h5file: h5py.File) -> Tuple[int, int]:
+    if is_series_layout(h5file):
+        return 0, len(h5file['series']['running ends']) - 1
+
+    if 'frame index' in h5file:
+        frames = h5file['frame index'].fields('frame')[()]
+        return np.min(frames), np.max(frames)
+
     keys = np.asarray(list(int(key) for key in h5file['data'].keys()))
 
     minimum = np.min(keys)
@@ -18,32 +78,151 @@ def get_data_range(h5file: h5py.File) -> Tuple[int, int]:
     return minimum, maximum
 
 
+def get_running_group(h5file: h5py.Group) -> Optional[h5py.Group]:
+    """
+    Get the group with the running state of all time steps.
+    :param h5file: The data file.
+    :return: The group or None if the running state is stored with each time
+    step.
+    """
+
+    if is_series_layout(h5file):
+        return h5file['series']['running']
+
+    return h5file['running'] if 'running' in h5file else None
+
+
 def has_voltage_data(h5file: h5py.File) -> bool:
-    return 'voltage' in h5file['data']['1'] and 'current' in h5file['data']['1']
+    running = get_running_group(h5file)
 
+    if running is None:
+        running = h5file['data']['1']
 
-def load_tdgl_data(h5file: h5py.File, step: int) \
-        -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
-    psi = np.asarray(h5file['data'][str(step)]['psi']) \
-        if 'psi' in h5file['data'][str(step)] else None
+    return 'voltage' in running and 'current' in running
+
+
+def load_running_data(h5file: h5py.File) -> Dict[str, np.ndarray]:
+    """
+    Load the running state of all time steps after each other.
+    :param h5file: The data file.
+    :return: The running state.
+    """
+
+    running = get_running_group(h5file)
+
+    if running is not None:
+        return dict((key, dataset[()]) for key, dataset in running.items())
+
+    # Older files store the running state with each time step
+    min_frame, max_frame = get_data_range(h5file)
+    keys = [key for key in RUNNING_NAMES if key in h5file['data']['1']]
+    parts = dict((key, []) for key in keys)
+
+    for frame in range(max(min_frame, 1), max_frame + 1):
+        group = h5file['data'][str(frame)]
+        for key in keys:
+            parts[key].append(group[key][()])
+
+    return dict((key, np.concatenate(value)) for key, value in parts.items())
+
+
+def get_field_frames(h5file: h5py.Group, name: str) -> Optional[np.ndarray]:
+    """
+    Get the numbers of the time steps a field was saved with, if they are
+    recorded. They are recorded for all fields in the series layout and for
+    fixed fields that were saved again after they changed in the groups
+    layout.
+
+    :param h5file: The data file.
+    :param name: The name of the field.
+    :return: The ordered numbers of the time steps or None.
+    """
+
+    if is_series_layout(h5file):
+        fields = h5file['series']['fields']
+        return np.asarray(fields[name]['frames']) if name in fields else None
+
+    if 'fixed frames' in h5file and name in h5file['fixed frames']:
+        return np.asarray(h5file['fixed frames'][name])
 
-    mu = np.asarray(h5file['data'][str(step)]['mu']) \
-        if 'mu' in h5file['data'][str(step)] else None
+    return None
 
-    a = np.asarray(h5file['data'][str(step)]['a']) \
-        if 'a' in h5file['data'][str(step)] else None
 
-    supercurrent = np.asarray(h5file['data'][str(step)]['supercurrent']) \
-        if 'supercurrent' in h5file['data'][str(step)] else None
+def load_field(h5file: h5py.File, name: str, step: int) \
+        -> Optional[np.ndarray]:
+    """
+    Load a field saved with a time step.
+    :param h5file: The data file.
+    :param name: The name of the field.
+    :param step: The number of the time step.
+    :return: The field or None if it was not saved with the time step.
+    """
+
+    if not is_series_layout(h5file):
+        group = h5file['data'][str(step)]
+        return np.asarray(group[name]) if name in group else None
+
+    fields = h5file['series']['fields']
+
+    if name not in fields:
+        return None
+
+    # Find the row of the time step
+    frames = np.asarray(fields[name]['frames'])
+    row = np.searchsorted(frames, step, side='right') - 1
+
+    if row < 0 or frames[row] != step:
+        return None
+
+    return np.asarray(fields[name]['values'][row])
+
+
+def load_fixed_field(h5file: h5py.File, name: str, step: int) \
+        -> Optional[np.ndarray]:
+    """
+    Load a field that does not change over time. It is saved once in the
+    fixed group and with the time steps where it has changed, or with each
+    time step in older files.
+
+    :param h5file: The data file.
+    :param name: The name of the field.
+    :param step: The number of the time step.
+    :return: The field or None if it was not saved.
+    """
+
+    if 'fixed' not in h5file or name not in h5file['fixed']:
+        return load_field(h5file, name, step)
 
-    normal_current = np.asarray(h5file['data'][str(step)]['normal_current']) \
-        if 'normal_current' in h5file['data'][str(step)] else None
+    # Find the last time step up to the step in which the field has changed
+    frames = get_field_frames(h5file, name)
+    row = np.searchsorted(frames, step, side='right') - 1 \
+        if frames is not None else -1
+
+    if row < 0:
+        return np.asarray(h5file['fixed'][name])
+
+    return load_field(h5file, name, int(frames[row]))
+
+
+def load_tdgl_data(h5file: h5py.File, step: int) \
+        -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    psi = load_field(h5file, 'psi', step)
+    mu = load_field(h5file, 'mu', step)
+    a = load_fixed_field(h5file, 'a', step)
+    supercurrent = load_field(h5file, 'supercurrent', step)
+    normal_current = load_field(h5file, 'normal_current', step)
 
     return psi, mu, a, supercurrent, normal_current
 
 
 def load_state_data(h5file: h5py.File, step: int) -> Dict[str, Any]:
-    return dict(h5file['data'][str(step)].attrs)
+    if not is_series_layout(h5file):
+        return dict(h5file['data'][str(step)].attrs)
+
+    # Keys that were not set in the time step are left out
+    return dict((key, column[step])
+                for key, column in h5file['series']['state'].items()
+                if column.attrs['first frame'] <= step < len(column))
 
 
 def get_edge_observable_data(observable: np.ndarray, mesh: Mesh) \
@@ -136,15 +315,14 @@ def get_state_string(h5file: h5py.File, frame: int, max_frame: int) -> str:
 def find_voltage_points(mesh: Mesh, h5file: h5py.File, frame: int) \
         -> np.ndarray:
     # Get psi on the boundary
-    psi_boundary = np.asarray(h5file['data']['0']['psi'])[mesh.boundary_indices]
+    psi_boundary = load_field(h5file, 'psi', 0)[mesh.boundary_indices]
 
     # Select boundary points where the complex field is small on the first frame
     metal_boundary = mesh.boundary_indices[np.where(np.abs(psi_boundary)
                                                     < 1e-7)[0]]
 
     # Get the scalar potential on the boundary
-    scalar_metal_boundary = np.asarray(
-        h5file['data'][str(frame)]['mu'])[metal_boundary]
+    scalar_metal_boundary = load_field(h5file, 'mu', frame)[metal_boundary]
 
     # Find the max and the min
     minimum = np.argmin(scalar_metal_boundary)
@@ -158,63 +336,90 @@ def get_mean_voltage(input_path: str) -> Tuple[np.ndarray, np.ndarray]:
 
     # Open the file
     with h5py.File(input_path, 'r') as h5file:
+        return get_group_mean_voltage(h5file)
 
-        min_frame, max_frame = get_data_range(h5file)
 
-        current_arr = []
-        voltage_arr = []
+def get_group_mean_voltage(h5file: h5py.Group
+                           ) -> Tuple[np.ndarray, np.ndarray]:
 
-        # Check if the old or the new approach should be used
-        if not has_voltage_data(h5file):
+    current_arr = []
+    voltage_arr = []
 
-            # Compute mean voltage from flow in the state
-            current = h5file['data'][str(min_frame)].attrs['current']
-            old_flow = h5file['data'][str(min_frame)].attrs['flow']
-            old_time = h5file['data'][str(min_frame)].attrs['time']
-            flow = old_flow
-            time = old_time
+    # Check if the old or the new approach should be used
+    if not has_voltage_data(h5file):
 
-            for i, frame in enumerate(range(min_frame + 1, max_frame + 1)):
-                tmp_current = h5file['data'][str(frame)].attrs['current']
-                tmp_flow = h5file['data'][str(frame)].attrs['flow']
-                tmp_time = h5file['data'][str(frame)].attrs['time']
+        # Compute mean voltage from flow in the state
+        index = load_frame_index(h5file)
+        current = index['current'][0]
+        old_flow = index['flow'][0]
+        old_time = index['time'][0]
+        flow = old_flow
+        time = old_time
 
-                if tmp_current > current:
-                    current_arr.append(current)
-                    voltage_arr.append((flow - old_flow) / (time - old_time))
-                    current = tmp_current
-                    old_time = tmp_time
-                    old_flow = tmp_flow
+        for tmp_current, tmp_flow, tmp_time in zip(index['current'][1:],
+                                                   index['flow'][1:],
+                                                   index['time'][1:]):
 
-                time = tmp_time
-                flow = tmp_flow
+            if tmp_current > current:
+                current_arr.append(current)
+                voltage_arr.append((flow - old_flow) / (time - old_time))
+                current = tmp_current
+                old_time = tmp_time
+                old_flow = tmp_flow
 
-            # Add last point
-            current_arr.append(current)
-            voltage_arr.append((flow - old_flow) / (time - old_time))
+            time = tmp_time
+            flow = tmp_flow
 
-        else:
+        # Add last point
+        current_arr.append(current)
+        voltage_arr.append((flow - old_flow) / (time - old_time))
 
-            # Compute the mean voltage from the voltage
-            for i in range(1, max_frame + 1):
-                current_arr = np.concatenate([
-                    current_arr,
-                    h5file['data'][str(i)]['current']
-                ])
-
-                voltage_arr = np.concatenate([
-                    voltage_arr,
-                    h5file['data'][str(i)]['voltage']
-                ])
+    else:
 
-            current_arr, voltage_arr, counts = sum_contributions(current_arr,
-                                                                 voltage_arr)
+        # Compute the mean voltage from the voltage
+        running = load_running_data(h5file)
+        current_arr = running['current']
+        voltage_arr = running['voltage']
+
+        # Adaptive time steps are stored with the voltage and are used to
+        # weight the voltage in the mean
+        has_time_step = 'dt' in running
+        dt_arr = running.get('dt')
+
+        if has_time_step:
+            _, time_arr, _ = sum_contributions(current_arr, dt_arr)
+            current_arr, voltage_arr, _ = sum_contributions(
+                current_arr,
+                voltage_arr * dt_arr
+            )
+            voltage_arr /= time_arr
+        else:
+            current_arr, voltage_arr, counts = sum_contributions(
+                current_arr,
+                voltage_arr
+            )
             voltage_arr /= counts
 
     return np.asarray(current_arr), np.asarray(voltage_arr)
 
 
+def get_critical_current(input_path: str) -> Optional[float]:
+
+    # Open the file
+    with h5py.File(input_path, 'r') as h5file:
+        return get_group_critical_current(h5file)
+
+
+def get_group_critical_current(h5file: h5py.Group) -> Optional[float]:
+
+    # The critical current is stored in the last frame by the critical
+    # current search
+    _, max_frame = get_data_range(h5file)
+
+    return load_state_data(h5file, max_frame).get('critical current')
+
+
 def get_magnetic_field(input_path: str, frame: int) -> float:
     # Open the file
     with h5py.File(input_path, 'r') as h5file:
-        return h5file['data'][str(frame)].attrs['magnetic field']
+        return load_state_data(h5file, frame)['magnetic field']
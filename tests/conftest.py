@@ -0,0 +1,18 @@
+import h5py
+import pytest
+
+from src.mesh.mesh import Mesh
+from tests.helpers import write_strip
+
+
+@pytest.fixture(scope='session')
+def mesh_path(tmp_path_factory) -> str:
+    file_path = str(tmp_path_factory.mktemp('mesh') / 'strip.h5')
+    write_strip(file_path)
+    return file_path
+
+
+@pytest.fixture(scope='session')
+def mesh(mesh_path) -> Mesh:
+    with h5py.File(mesh_path, 'r') as h5file:
+        return Mesh.load_from_hdf5(h5file)
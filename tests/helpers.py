@@ -0,0 +1,110 @@
+import subprocess
+import sys
+from os import path
+
+import h5py
+import numpy as np
+from scipy.spatial import Delaunay
+
+from src.visualization.visualization_helpers import get_data_range, \
+    load_field, load_fixed_field, load_frame_index, load_running_data, \
+    load_state_data
+
+ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+
+# Arguments of a short simulation with a current ramp and a magnetic field
+SIMULATION_ARGS = ['-s', '600', '-t', '0.002', '-j', '0.1', '-J', '0.5',
+                   '--steps-per-current', '200', '-b', '0.1', '-e', '50',
+                   '--miniters', '1000']
+
+
+def write_strip(file_path: str, nx: int = 24, ny: int = 8):
+    """
+    Write the triangulation of a strip with the current flowing in the x
+    direction and two voltage points.
+
+    :param file_path: The mesh file.
+    :param nx: The number of vertices along the strip.
+    :param ny: The number of vertices across the strip.
+    """
+
+    length, width = 4.0, 1.0
+    x, y = np.meshgrid(np.linspace(0, length, nx),
+                       np.linspace(-width / 2, width / 2, ny))
+    x, y = x.flatten(), y.flatten()
+
+    # Perturb the inner vertices to get an irregular mesh
+    rng = np.random.default_rng(0)
+    inner = (x > 0) & (x < length) & (np.abs(y) < width / 2)
+    x[inner] += rng.uniform(-0.2, 0.2, inner.sum()) * length / (nx - 1)
+    y[inner] += rng.uniform(-0.2, 0.2, inner.sum()) * width / (ny - 1)
+
+    triangulation = Delaunay(np.stack([x, y], axis=1))
+    voltage_points = [np.argmin((x - length / 6) ** 2 + y ** 2),
+                      np.argmin((x - 5 * length / 6) ** 2 + y ** 2)]
+
+    with h5py.File(file_path, 'w') as h5file:
+        h5file['x'] = x
+        h5file['y'] = y
+        h5file['elements'] = triangulation.simplices.astype(np.uint64)
+        h5file['input_edge'] = [0, 0, -width / 2, width / 2]
+        h5file['output_edge'] = [length, length, -width / 2, width / 2]
+        h5file['voltage_points'] = np.asarray(voltage_points,
+                                              dtype=np.uint64)
+
+
+def run_script(script: str, *args: str):
+    """
+    Run one of the command line scripts and fail if it does not succeed.
+    :param script: The name of the script.
+    :param args: The command line arguments.
+    """
+
+    result = subprocess.run([sys.executable, path.join(ROOT, script), *args],
+                            cwd=ROOT, capture_output=True, text=True)
+
+    assert result.returncode == 0, result.stderr
+
+
+def run_simulation(mesh_path: str, output: str, *args: str):
+    run_script('simulate.py', mesh_path, output, *SIMULATION_ARGS, *args)
+
+
+def assert_same_frames(first: h5py.Group, second: h5py.Group):
+    """
+    Check that two outputs have the same time steps when they are read,
+    independent of their layout.
+    :param first: The first output.
+    :param second: The second output.
+    """
+
+    assert get_data_range(first) == get_data_range(second)
+    minimum, maximum = get_data_range(first)
+
+    for frame in range(minimum, maximum + 1):
+        first_state = load_state_data(first, frame)
+        second_state = load_state_data(second, frame)
+        assert first_state.keys() == second_state.keys()
+        for key, value in first_state.items():
+            np.testing.assert_array_equal(second_state[key], value)
+
+        for name in ('psi', 'mu'):
+            first_value = load_field(first, name, frame)
+            second_value = load_field(second, name, frame)
+            assert (first_value is None) == (second_value is None)
+            if first_value is not None:
+                np.testing.assert_array_equal(first_value, second_value)
+
+        np.testing.assert_array_equal(load_fixed_field(first, 'a', frame),
+                                      load_fixed_field(second, 'a', frame))
+
+    first_index = load_frame_index(first)
+    second_index = load_frame_index(second)
+    for name in first_index.dtype.names:
+        np.testing.assert_array_equal(first_index[name], second_index[name])
+
+    first_running = load_running_data(first)
+    second_running = load_running_data(second)
+    assert first_running.keys() == second_running.keys()
+    for key, value in first_running.items():
+        np.testing.assert_array_equal(second_running[key], value)
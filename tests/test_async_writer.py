@@ -0,0 +1,32 @@
+import pytest
+
+from src.io.async_writer import AsyncWriter
+
+
+def test_async_writer_runs_writes_in_order():
+    written = []
+    writer = AsyncWriter()
+    for value in range(10):
+        writer.submit(written.append, value)
+    writer.close()
+
+    assert written == list(range(10))
+
+
+def test_async_writer_raises_failed_writes():
+    def fail():
+        raise OSError('disk full')
+
+    written = []
+    writer = AsyncWriter()
+    writer.submit(fail)
+    writer.submit(written.append, 1)
+
+    with pytest.raises(RuntimeError) as error:
+        writer.flush()
+
+    assert isinstance(error.value.__cause__, OSError)
+    assert written == []
+
+    with pytest.raises(RuntimeError):
+        writer.close()
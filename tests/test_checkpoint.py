@@ -0,0 +1,20 @@
+import numpy as np
+import pytest
+
+from src.io.checkpoint import Checkpoint
+
+
+def test_checkpoint_replaces_previous(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / 'run' / 'checkpoint'))
+
+    with pytest.raises(FileNotFoundError):
+        checkpoint.load()
+
+    checkpoint.save({'step': 1, 'values': [np.arange(3)]})
+    checkpoint.save({'step': 2, 'values': [np.arange(4)]})
+    payload = checkpoint.load()
+
+    assert payload['step'] == 2
+    np.testing.assert_array_equal(payload['values'][0], np.arange(4))
+    assert sorted(path.name for path in (tmp_path / 'run').iterdir()) \
+        == ['checkpoint']
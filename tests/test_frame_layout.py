@@ -0,0 +1,210 @@
+import h5py
+import numpy as np
+import pytest
+
+from src.io.frame_layout import Layout, create_frame_writer, \
+    open_frame_writer, convert_to_series
+from src.io.storage import Storage, StorageOptions, Compression
+from src.visualization.visualization_helpers import load_field, \
+    load_fixed_field, load_running_data, load_state_data
+from tests.helpers import assert_same_frames
+
+FRAMES = 8
+
+
+def get_frame(number: int):
+    rng = np.random.default_rng(number)
+    params = {'step': 10 * number, 'time': 0.1 * number, 'dt': 0.01,
+              'current': 0.5, 'flow': 0.2 * number}
+
+    # A state key that is added later
+    if number >= 3:
+        params['dwell'] = number - 3
+
+    data = {'mu': rng.standard_normal(5)}
+
+    # A field saved every other time step
+    if number % 2 == 0:
+        data['psi'] = rng.standard_normal(5) + 1j * rng.standard_normal(5)
+
+    # A fixed field that changes in two time steps
+    if number in (2, 5):
+        data['a'] = np.full((4, 2), float(number))
+
+    running = {'voltage': rng.standard_normal(10),
+               'current': np.full(10, 0.5)} if number > 0 else {}
+
+    return params, data, running
+
+
+def write(h5file, layout: Layout, frames: int = FRAMES):
+    h5file.create_group('fixed')['a'] = np.zeros((4, 2))
+    writer = create_frame_writer(h5file, layout)
+
+    for number in range(frames):
+        writer.save(number, *get_frame(number))
+
+    return writer
+
+
+def test_layouts_read_the_same(tmp_path):
+    with h5py.File(tmp_path / 'groups.h5', 'w') as groups, \
+            h5py.File(tmp_path / 'series.h5', 'w') as series:
+        write(groups, Layout.GROUPS).close()
+        write(series, Layout.SERIES).close()
+
+        assert_same_frames(groups, series)
+
+        assert load_state_data(series, 1).keys() == \
+            get_frame(1)[0].keys()
+        assert load_field(series, 'psi', 3) is None
+        np.testing.assert_array_equal(load_field(series, 'psi', 4),
+                                      get_frame(4)[1]['psi'])
+
+
+def test_running_state_of_older_files_reads_the_same(tmp_path):
+    with h5py.File(tmp_path / 'older.h5', 'w') as older, \
+            h5py.File(tmp_path / 'series.h5', 'w') as series:
+
+        # Older files store the running state with each time step
+        for number in range(FRAMES):
+            group = older.create_group('data/{}'.format(number))
+            for key, value in get_frame(number)[2].items():
+                group[key] = value
+
+        write(series, Layout.SERIES).close()
+
+        older_running = load_running_data(older)
+        series_running = load_running_data(series)
+        assert older_running.keys() == series_running.keys()
+        for key, value in series_running.items():
+            np.testing.assert_array_equal(older_running[key], value)
+
+
+def test_fixed_field_changes(tmp_path):
+    for layout in Layout:
+        with h5py.File(tmp_path / '{}.h5'.format(layout.value), 'w') \
+                as h5file:
+            write(h5file, layout).close()
+
+            values = [load_fixed_field(h5file, 'a', frame)[0, 0]
+                      for frame in range(FRAMES)]
+            assert values == [0, 0, 2, 2, 2, 5, 5, 5]
+
+
+def test_fixed_field_of_older_files(tmp_path):
+    with h5py.File(tmp_path / 'older.h5', 'w') as h5file:
+
+        # Older files store the fixed fields with each time step
+        for number in range(3):
+            h5file['data/{}/a'.format(number)] = np.full((4, 2), number)
+
+        values = [load_fixed_field(h5file, 'a', frame)[0, 0]
+                  for frame in range(3)]
+        assert values == [0, 1, 2]
+
+
+@pytest.mark.parametrize('layout', list(Layout))
+def test_truncated_frames_match_uninterrupted(tmp_path, layout):
+    with h5py.File(tmp_path / 'resumed.h5', 'w') as resumed, \
+            h5py.File(tmp_path / 'reference.h5', 'w') as reference:
+        write(resumed, layout).truncate(4)
+
+        if layout is Layout.GROUPS:
+            np.testing.assert_array_equal(resumed['fixed frames']['a'], [2])
+
+        writer = open_frame_writer(resumed)
+        assert writer.get_frame_count() == 4
+        for number in range(4, FRAMES):
+            writer.save(number, *get_frame(number))
+        writer.close()
+
+        write(reference, layout).close()
+        assert_same_frames(resumed, reference)
+
+
+def test_series_is_trimmed_when_closed(tmp_path):
+    with h5py.File(tmp_path / 'series.h5', 'w') as h5file:
+        writer = write(h5file, Layout.SERIES)
+        series = h5file['series']
+        assert len(series['state']['step']) > FRAMES
+
+        writer.flush()
+        assert len(series['state']['step']) == FRAMES
+        assert len(series['fields']['psi']['frames']) == FRAMES // 2
+
+        # Continue after the flush
+        writer.save(FRAMES, *get_frame(FRAMES))
+        writer.close()
+        assert len(series['state']['step']) == FRAMES + 1
+
+
+def test_series_that_was_not_closed_is_resumed(tmp_path):
+    with h5py.File(tmp_path / 'series.h5', 'w') as h5file:
+        write(h5file, Layout.SERIES, 4)
+
+    with h5py.File(tmp_path / 'series.h5', 'r+') as h5file:
+        writer = open_frame_writer(h5file)
+        assert writer.get_frame_count() == 4
+        assert len(h5file['series']['state']['step']) == 4
+        for number in range(4, FRAMES):
+            writer.save(number, *get_frame(number))
+        writer.close()
+
+        with h5py.File(tmp_path / 'reference.h5', 'w') as reference:
+            write(reference, Layout.SERIES).close()
+            assert_same_frames(h5file, reference)
+
+
+def test_series_requires_consecutive_frames(tmp_path):
+    with h5py.File(tmp_path / 'series.h5', 'w') as h5file:
+        writer = write(h5file, Layout.SERIES, 2)
+        with pytest.raises(ValueError):
+            writer.save(3, *get_frame(3))
+
+
+def test_converted_series_matches_groups(tmp_path):
+    storage = Storage.parse(['gzip:4,shuffle', 'psi=lzf'])
+
+    with h5py.File(tmp_path / 'groups.h5', 'w') as groups, \
+            h5py.File(tmp_path / 'series.h5', 'w') as series:
+        write(groups, Layout.GROUPS).close()
+        series.create_group('fixed')['a'] = np.zeros((4, 2))
+        convert_to_series(groups, series, storage)
+
+        assert_same_frames(groups, series)
+
+        fields = series['series']['fields']
+        assert fields['mu']['values'].compression == 'gzip'
+        assert fields['psi']['values'].compression == 'lzf'
+
+
+def test_storage_options_round_trip(tmp_path):
+    storage = Storage.parse(['gzip:4,shuffle,chunk:128',
+                             'psi=lzf,downcast'])
+
+    assert storage.default.describe() == 'gzip:4,shuffle,chunk:128'
+    assert storage.get('psi').compression is Compression.LZF
+    assert storage.get('mu') is storage.default
+
+    with h5py.File(tmp_path / 'storage.h5', 'w') as h5file:
+        storage.save(h5file.attrs)
+        loaded = Storage.load(h5file.attrs)
+
+        assert loaded.default.describe() == storage.default.describe()
+        assert loaded.get('psi').describe() == 'lzf,downcast'
+
+        dataset = loaded.create_dataset(h5file, 'psi',
+                                        np.ones(300, dtype=np.complex128))
+        assert dataset.dtype == np.complex64
+        assert dataset.compression == 'lzf'
+
+        dataset = loaded.create_dataset(h5file, 'mu', np.ones(300))
+        assert dataset.dtype == np.float64
+        assert dataset.chunks == (128,)
+
+
+@pytest.mark.parametrize('value', ['gzip:10', 'lzf:4', 'chunk:0', 'fast'])
+def test_invalid_storage_options(value):
+    with pytest.raises(ValueError):
+        StorageOptions.parse(value)
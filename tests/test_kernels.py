@@ -0,0 +1,203 @@
+import numpy as np
+import pytest
+
+from src.matrices.batched_csr_matrix import BatchedCsrMatrix
+from src.matrices.matrix_builder import MatrixBuilder, MatrixType
+from src.solver.psi_kernel import PsiKernel
+from src.solver.supercurrent_kernel import SupercurrentKernel
+from src.tdgl import get_supercurrent
+from src.util.parallel import ParallelExecutor
+
+
+def get_link_exponents(mesh, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return 0.2 * rng.standard_normal((len(mesh.edge_mesh.edges), 2))
+
+
+def get_fields(mesh, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    sites = len(mesh.x)
+    psi = rng.uniform(0.2, 1, sites) * np.exp(2j * np.pi * rng.random(sites))
+    mu = 0.1 * rng.standard_normal(sites)
+    return psi, mu
+
+
+def step_psi(psi, mu, laplacian, alpha, u, gamma, dt):
+    """
+    The time step of the complex field as a direct NumPy expression.
+    """
+
+    sq_gamma = gamma ** 2
+    abs_sq_psi = np.abs(psi) ** 2
+    z = np.exp(-1j * mu * dt) * sq_gamma / 2 * psi
+    w = z * abs_sq_psi + np.exp(-1j * mu * dt) * (
+            psi + dt / u * np.sqrt(1 + sq_gamma * abs_sq_psi)
+            * ((alpha - abs_sq_psi) * psi + laplacian @ psi)
+    )
+    a = w.real * z.real + w.imag * z.imag
+    new_sq_psi = 2 * np.abs(w) ** 2 / (2 * a + 1 + np.sqrt(
+        (2 * a + 1) ** 2 - 4 * np.abs(z) ** 2 * np.abs(w) ** 2))
+    return w - z * new_sq_psi
+
+
+@pytest.fixture
+def psi_laplacian(mesh):
+    return MatrixBuilder(mesh).with_dirichlet_boundary(
+        fixed_sites=mesh.boundary_indices[:4]
+    ).with_link_exponents(
+        link_exponents=get_link_exponents(mesh)
+    ).build(MatrixType.LAPLACIAN)
+
+
+@pytest.mark.parametrize('workers', [None, 3])
+def test_psi_kernel_matches_direct_expression(mesh, psi_laplacian, workers):
+    psi, mu = get_fields(mesh)
+    alpha = np.linspace(0.5, 1, len(mesh.x))
+    executor = ParallelExecutor(workers) if workers is not None else None
+
+    kernel = PsiKernel(psi_laplacian, alpha, 5.79, 10, psi.shape, executor)
+    expected = psi
+    for _ in range(3):
+        expected = step_psi(expected, mu, psi_laplacian, alpha, 5.79, 10,
+                            0.001)
+        psi = kernel.step(psi, mu, 0.001)
+
+    if executor is not None:
+        executor.close()
+
+    assert np.all(np.isfinite(expected))
+    np.testing.assert_array_equal(psi, expected)
+    assert kernel.get_min_discriminant() >= 0
+    assert kernel.get_mean_modulus_squared() == pytest.approx(
+        np.mean(np.abs(expected) ** 2)
+    )
+
+
+def test_psi_kernel_keeps_input(mesh, psi_laplacian):
+    psi, mu = get_fields(mesh)
+    kernel = PsiKernel(psi_laplacian, np.ones(len(mesh.x)), 5.79, 10,
+                       psi.shape)
+
+    first = kernel.step(psi, mu, 0.001)
+    copy = first.copy()
+    second = kernel.step(first, mu, 0.001)
+
+    assert second is not first
+    np.testing.assert_array_equal(first, copy)
+
+
+def test_psi_kernel_step_doubling(mesh, psi_laplacian):
+    psi, mu = get_fields(mesh)
+    alpha = np.ones(len(mesh.x))
+    kernel = PsiKernel(psi_laplacian, alpha, 5.79, 10, psi.shape,
+                       step_doubling=True)
+
+    errors = []
+    for dt in [2e-4, 1e-4]:
+        half = step_psi(psi, mu, psi_laplacian, alpha, 5.79, 10, dt / 2)
+        expected = step_psi(half, mu, psi_laplacian, alpha, 5.79, 10, dt / 2)
+        full = step_psi(psi, mu, psi_laplacian, alpha, 5.79, 10, dt)
+
+        result, error, min_discriminant = kernel.step_doubled(psi, mu, dt)
+
+        np.testing.assert_array_equal(result, expected)
+        assert error == pytest.approx(np.max(np.abs(expected - full)))
+        assert min_discriminant >= 0
+        errors.append(error)
+
+    # The local error of the first order update scales with dt^2
+    assert errors[0] / errors[1] == pytest.approx(4, rel=0.1)
+
+
+def test_psi_kernel_step_doubling_requires_buffers(mesh, psi_laplacian):
+    psi, mu = get_fields(mesh)
+    kernel = PsiKernel(psi_laplacian, np.ones(len(mesh.x)), 5.79, 10,
+                       psi.shape)
+
+    with pytest.raises(RuntimeError):
+        kernel.step_doubled(psi, mu, 0.001)
+
+
+def test_psi_kernel_ensemble_matches_members(mesh):
+    members = [get_link_exponents(mesh, seed) for seed in range(2)]
+    laplacians = [
+        MatrixBuilder(mesh).with_link_exponents(link_exponents=exponents)
+        .build(MatrixType.LAPLACIAN) for exponents in members
+    ]
+    fields = [get_fields(mesh, seed) for seed in range(2)]
+    psi = np.stack([field[0] for field in fields], axis=-1)
+    mu = np.stack([field[1] for field in fields], axis=-1)
+    alpha = np.ones(len(mesh.x))
+
+    kernel = PsiKernel(BatchedCsrMatrix.from_matrices(laplacians), alpha,
+                       5.79, 10, psi.shape)
+    result = kernel.step(psi, mu, 0.001)
+
+    for member, laplacian in enumerate(laplacians):
+        np.testing.assert_allclose(
+            result[:, member],
+            step_psi(psi[:, member], mu[:, member], laplacian, alpha, 5.79,
+                     10, 0.001),
+            rtol=1e-12, atol=1e-14
+        )
+
+
+@pytest.mark.parametrize('workers', [None, 3])
+def test_supercurrent_kernel_matches_matrices(mesh, workers):
+    psi, _ = get_fields(mesh)
+    link_exponents = get_link_exponents(mesh)
+    builder = MatrixBuilder(mesh).with_link_exponents(
+        link_exponents=link_exponents
+    )
+    gradient = builder.build(MatrixType.GRADIENT)
+    divergence = builder.build(MatrixType.DIVERGENCE)
+    executor = ParallelExecutor(workers) if workers is not None else None
+
+    kernel = SupercurrentKernel(mesh, psi.shape, link_exponents, executor)
+    expected = get_supercurrent(psi, gradient, mesh.edge_mesh.edges)
+    supercurrent = kernel.get_supercurrent(psi)
+    result = kernel.get_divergence(psi)
+
+    if executor is not None:
+        executor.close()
+
+    np.testing.assert_allclose(supercurrent, expected, rtol=1e-10,
+                               atol=1e-12)
+    np.testing.assert_allclose(result, divergence @ expected, rtol=1e-10,
+                               atol=1e-10)
+
+
+@pytest.mark.parametrize('workers', [None, 3])
+def test_supercurrent_kernel_ensemble_matches_members(mesh, workers):
+    fields = [get_fields(mesh, seed)[0] for seed in range(2)]
+    members = [get_link_exponents(mesh, seed) for seed in range(2)]
+    psi = np.stack(fields, axis=-1)
+    executor = ParallelExecutor(workers) if workers is not None else None
+
+    kernel = SupercurrentKernel(mesh, psi.shape, np.stack(members, axis=-1),
+                                executor)
+    divergence = kernel.get_divergence(psi)
+
+    if executor is not None:
+        executor.close()
+
+    for member, link_exponents in enumerate(members):
+        np.testing.assert_array_equal(
+            divergence[:, member],
+            SupercurrentKernel(mesh, psi.shape[:1], link_exponents)
+            .get_divergence(fields[member])
+        )
+
+
+def test_supercurrent_kernel_updates_link_exponents(mesh):
+    psi, _ = get_fields(mesh)
+    link_exponents = get_link_exponents(mesh)
+
+    kernel = SupercurrentKernel(mesh, psi.shape)
+    kernel.set_link_exponents(link_exponents)
+
+    np.testing.assert_array_equal(
+        kernel.get_supercurrent(psi),
+        SupercurrentKernel(mesh, psi.shape,
+                           link_exponents).get_supercurrent(psi)
+    )
@@ -0,0 +1,184 @@
+import gc
+from copy import deepcopy
+
+import numpy as np
+import pytest
+from scipy.sparse import csr_matrix, eye, random as sparse_random
+
+from src.matrices.batched_csr_matrix import BatchedCsrMatrix
+from src.matrices.link_updater import LinkUpdater
+from src.matrices.matrix_builder import MatrixBuilder, MatrixType
+from src.matrices.matrix_cache import MatrixCache
+from src.sparse_format import SparseFormat
+
+
+def get_batch(members: int = 3):
+    structure = sparse_random(40, 30, density=0.1, format='csr',
+                              random_state=0)
+
+    # Leave a few rows empty
+    structure = csr_matrix(structure.multiply(
+        (np.arange(40) % 7 != 0)[:, None]
+    ))
+    structure.eliminate_zeros()
+
+    rng = np.random.default_rng(0)
+    matrices = []
+    for _ in range(members):
+        matrix = structure.copy().astype(np.complex128)
+        matrix.data = rng.standard_normal(matrix.nnz) \
+            + 1j * rng.standard_normal(matrix.nnz)
+        matrices.append(matrix)
+
+    return matrices
+
+
+def test_batched_matrix_matches_members():
+    matrices = get_batch()
+    batch = BatchedCsrMatrix.from_matrices(matrices)
+    other = np.random.default_rng(1).standard_normal((30, len(matrices)))
+
+    result = batch @ other
+
+    for member, matrix in enumerate(matrices):
+        np.testing.assert_allclose(result[:, member],
+                                   matrix @ other[:, member], rtol=1e-12)
+
+
+def test_batched_matrix_rows_match_members():
+    matrices = get_batch()
+    batch = BatchedCsrMatrix.from_matrices(matrices).get_rows(5, 23)
+    other = np.random.default_rng(1).standard_normal((30, len(matrices)))
+
+    result = batch @ other
+
+    assert result.shape == (18, len(matrices))
+    for member, matrix in enumerate(matrices):
+        np.testing.assert_allclose(result[:, member],
+                                   matrix[5:23] @ other[:, member],
+                                   rtol=1e-12)
+
+
+@pytest.mark.parametrize('empty_rows', [True, False])
+def test_batched_matrix_reuses_buffers(empty_rows):
+    matrices = get_batch()
+    if not empty_rows:
+        matrices = [csr_matrix(matrix[:30] + eye(30)) for matrix in matrices]
+    batch = BatchedCsrMatrix.from_matrices(matrices)
+    assert batch.all_rows != empty_rows
+
+    rng = np.random.default_rng(1)
+    out = np.empty((batch.shape[0], len(matrices)), dtype=np.complex128)
+
+    for _ in range(2):
+        other = rng.standard_normal((30, len(matrices)))
+        assert batch.multiply(other, out) is out
+        products = batch.products
+
+        for member, matrix in enumerate(matrices):
+            np.testing.assert_allclose(out[:, member],
+                                       matrix @ other[:, member],
+                                       rtol=1e-12)
+
+    assert batch.products is products
+
+
+def test_batched_matrix_requires_same_structure():
+    first, second = get_batch(2)
+    second = second.tolil()
+    second[0, 0] = 1
+    with pytest.raises(ValueError):
+        BatchedCsrMatrix.from_matrices([first, second.tocsr()])
+
+
+def test_matrix_cache_round_trip(tmp_path):
+    cache = MatrixCache(str(tmp_path))
+    matrix = get_batch(1)[0].tocsc()
+
+    assert cache.load_matrix('key') is None
+    cache.save_matrix('key', matrix)
+    loaded = cache.load_matrix('key')
+
+    assert loaded.format == 'csc'
+    assert (loaded != matrix).nnz == 0
+
+
+def test_matrix_cache_keys(mesh, tmp_path):
+    cache = MatrixCache(str(tmp_path))
+
+    assert cache.get_key(mesh, 'a', np.ones(3)) \
+        == cache.get_key(mesh, 'a', np.ones(3))
+    assert cache.get_key(mesh, 'a', np.ones(3)) \
+        != cache.get_key(mesh, 'a', np.ones(4))
+    assert cache.get_key(mesh, 'a', None) != cache.get_key(mesh, 'b', None)
+
+
+def test_matrix_cache_forgets_collected_meshes(mesh, tmp_path):
+    cache = MatrixCache(str(tmp_path))
+    copy = deepcopy(mesh)
+    expected = cache.get_mesh_hash(copy)
+    assert len(cache.mesh_hashes) == 1
+
+    # A changed mesh gets its own hash even if it reuses the id
+    del copy
+    gc.collect()
+    assert len(cache.mesh_hashes) == 0
+
+    changed = deepcopy(mesh)
+    changed.x = changed.x + 1
+    assert cache.get_mesh_hash(changed) != expected
+
+
+@pytest.mark.parametrize('matrix_type', [MatrixType.LAPLACIAN,
+                                         MatrixType.GRADIENT,
+                                         MatrixType.DIVERGENCE])
+def test_cached_matrices_match_built_matrices(mesh, tmp_path, matrix_type):
+    link_exponents = np.full((len(mesh.edge_mesh.edges), 2), 0.1)
+    expected = MatrixBuilder(mesh).with_link_exponents(
+        link_exponents
+    ).build(matrix_type, SparseFormat.CSR)
+
+    cache = MatrixCache(str(tmp_path))
+    for _ in range(2):
+        matrix = MatrixBuilder(mesh).with_link_exponents(
+            link_exponents
+        ).with_cache(cache).build(matrix_type, SparseFormat.CSR)
+        assert (matrix != expected).nnz == 0
+
+    assert len(list(tmp_path.iterdir())) == 1
+
+
+def build_laplacian(mesh, link_exponents: np.ndarray):
+    return MatrixBuilder(mesh).with_dirichlet_boundary(
+        fixed_sites=mesh.boundary_indices[:4]
+    ).with_link_exponents(
+        link_exponents=link_exponents
+    ).build(MatrixType.LAPLACIAN)
+
+
+def test_link_updater_matches_rebuilt_laplacian(mesh):
+    rng = np.random.default_rng(0)
+    first, second = rng.standard_normal((2, len(mesh.edge_mesh.edges), 2))
+    laplacian = build_laplacian(mesh, first)
+
+    LinkUpdater(mesh, laplacian).update(second)
+
+    expected = build_laplacian(mesh, second)
+    np.testing.assert_array_equal(laplacian.indptr, expected.indptr)
+    np.testing.assert_array_equal(laplacian.indices, expected.indices)
+    np.testing.assert_array_equal(laplacian.data, expected.data)
+
+
+def test_link_updater_updates_batch(mesh):
+    rng = np.random.default_rng(0)
+    first, second = rng.standard_normal((2, len(mesh.edge_mesh.edges), 2, 2))
+    batch = BatchedCsrMatrix.from_matrices([
+        build_laplacian(mesh, first[..., member]) for member in range(2)
+    ])
+
+    LinkUpdater(mesh, batch).update(second)
+
+    for member in range(2):
+        expected = build_laplacian(mesh, second[..., member])
+        expected.sort_indices()
+        np.testing.assert_array_equal(batch.data[:, member], expected.data)
@@ -0,0 +1,79 @@
+import shutil
+
+import h5py
+import numpy as np
+import pytest
+
+from src.mesh.mesh import Mesh
+from src.mesh.util.renumber import Renumbering, get_bandwidth, \
+    get_vertex_order
+from src.visualization.visualization_helpers import load_running_data
+from tests.helpers import run_script, run_simulation
+
+
+def load_triangulation(mesh_path: str, renumbering: Renumbering) -> Mesh:
+    with h5py.File(mesh_path, 'r') as h5file:
+        return Mesh.from_triangulation(
+            x=np.asarray(h5file['x']),
+            y=np.asarray(h5file['y']),
+            elements=np.asarray(h5file['elements']),
+            voltage_points=np.asarray(h5file['voltage_points']),
+            input_edge=np.asarray(h5file['input_edge']),
+            output_edge=np.asarray(h5file['output_edge']),
+            renumbering=renumbering
+        )
+
+
+@pytest.mark.parametrize('renumbering', [Renumbering.RCM,
+                                         Renumbering.HILBERT])
+def test_vertex_order_is_a_permutation(mesh, renumbering):
+    order = get_vertex_order(mesh.x, mesh.y, mesh.elements, renumbering)
+    np.testing.assert_array_equal(np.sort(order), np.arange(len(mesh.x)))
+
+
+def test_rcm_reduces_the_bandwidth(mesh):
+    # Shuffle the vertices to get a large bandwidth
+    shuffle = np.random.default_rng(0).permutation(len(mesh.x))
+    elements = np.argsort(shuffle)[mesh.elements]
+
+    order = get_vertex_order(mesh.x[shuffle], mesh.y[shuffle], elements,
+                             Renumbering.RCM)
+
+    assert get_bandwidth(np.argsort(order)[elements]) \
+        < get_bandwidth(elements) / 4
+
+
+@pytest.mark.parametrize('renumbering', [Renumbering.RCM,
+                                         Renumbering.HILBERT])
+def test_renumbered_mesh_has_the_same_geometry(mesh_path, renumbering):
+    original = load_triangulation(mesh_path, Renumbering.NONE)
+    renumbered = load_triangulation(mesh_path, renumbering)
+    order = renumbered.vertex_order
+
+    assert original.vertex_order is None
+    np.testing.assert_array_equal(renumbered.x, original.x[order])
+    np.testing.assert_array_equal(renumbered.y, original.y[order])
+    np.testing.assert_allclose(renumbered.areas, original.areas[order])
+    np.testing.assert_array_equal(order[renumbered.voltage_points],
+                                  original.voltage_points)
+    np.testing.assert_array_equal(
+        np.sort(order[renumbered.boundary_indices]),
+        original.boundary_indices
+    )
+
+
+def test_renumbered_mesh_gives_the_same_voltage(mesh_path, tmp_path):
+    renumbered_path = str(tmp_path / 'renumbered.h5')
+    shutil.copy(mesh_path, renumbered_path)
+    run_script('compile_mesh.py', '--renumber', 'rcm', renumbered_path)
+
+    outputs = [str(tmp_path / 'original.h5'), str(tmp_path / 'output.h5')]
+    run_simulation(mesh_path, outputs[0])
+    run_simulation(renumbered_path, outputs[1])
+
+    with h5py.File(outputs[0], 'r') as expected, \
+            h5py.File(outputs[1], 'r') as result:
+        assert 'vertex_order' in result['mesh']
+        np.testing.assert_allclose(load_running_data(result)['voltage'],
+                                   load_running_data(expected)['voltage'],
+                                   rtol=1e-6, atol=1e-8)
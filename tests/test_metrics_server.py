@@ -0,0 +1,45 @@
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+import numpy as np
+import pytest
+
+from src.util.metrics_server import MetricsServer
+
+
+@pytest.fixture
+def server():
+    server = MetricsServer(0)
+    yield server
+    server.close()
+
+
+def fetch(server: MetricsServer, path: str) -> str:
+    url = 'http://127.0.0.1:{}{}'.format(server.port, path)
+    with urlopen(url, timeout=10) as response:
+        return response.read().decode()
+
+
+def test_metrics_server_serves_published_metrics(server):
+    server.publish({'step': 3, 'voltage': np.array([0.5, 1.5])})
+    lines = fetch(server, '/metrics').splitlines()
+
+    assert '# TYPE tdgl_step gauge' in lines
+    assert 'tdgl_step 3.0' in lines
+    assert 'tdgl_voltage{member="0"} 0.5' in lines
+    assert 'tdgl_voltage{member="1"} 1.5' in lines
+    assert any(line.startswith('tdgl_resident_memory_bytes ')
+               for line in lines)
+
+    server.publish({'step': 4})
+    lines = fetch(server, '/').splitlines()
+
+    assert 'tdgl_step 4.0' in lines
+    assert not any(line.startswith('tdgl_voltage') for line in lines)
+
+
+def test_metrics_server_rejects_other_paths(server):
+    with pytest.raises(HTTPError) as error:
+        fetch(server, '/other')
+
+    assert error.value.code == 404
@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+from scipy.sparse import random as sparse_random
+
+from src.matrices.batched_csr_matrix import BatchedCsrMatrix
+from src.matrices.partitioned_matrix import PartitionedMatrix
+from src.util.parallel import ParallelExecutor, split_rows
+
+
+@pytest.fixture
+def executor():
+    executor = ParallelExecutor(3)
+    yield executor
+    executor.close()
+
+
+def get_matrix(rows: int = 50, cols: int = 40):
+    matrix = sparse_random(rows, cols, density=0.1, format='csr',
+                           random_state=0)
+    matrix.sort_indices()
+    return matrix
+
+
+def test_split_rows_covers_all_rows():
+    indptr = get_matrix(1000).indptr
+    rows = split_rows(indptr, 4)
+
+    assert rows[0][0] == 0 and rows[-1][1] == 1000
+    assert all(first[1] == second[0]
+               for first, second in zip(rows[:-1], rows[1:]))
+
+    # The blocks have roughly the same number of values
+    values = [indptr[stop] - indptr[start] for start, stop in rows]
+    assert max(values) - min(values) <= 0.1 * indptr[-1]
+
+
+def test_split_rows_of_small_matrix():
+    assert split_rows(np.asarray([0, 1, 2]), 4) == [(0, 1), (1, 2)]
+
+
+@pytest.mark.parametrize('columns', [(), (2,)])
+def test_partitioned_matrix_matches_matrix(executor, columns):
+    matrix = get_matrix()
+    partitioned = PartitionedMatrix(matrix, executor)
+    other = np.random.default_rng(0).standard_normal((40,) + columns)
+
+    np.testing.assert_array_equal(partitioned @ other, matrix @ other)
+
+
+def test_partitioned_matrix_sees_updates(executor):
+    matrix = get_matrix()
+    partitioned = PartitionedMatrix(matrix, executor)
+    other = np.random.default_rng(0).standard_normal(40)
+
+    # Update the values in place like the link updater
+    matrix.data *= 2
+
+    np.testing.assert_array_equal(partitioned @ other, matrix @ other)
+
+
+def test_partitioned_batch_matches_batch(executor):
+    matrices = [get_matrix(), get_matrix()]
+    matrices[1].data = matrices[1].data * 3
+    batch = BatchedCsrMatrix.from_matrices(matrices)
+    other = np.random.default_rng(0).standard_normal((40, 2))
+
+    np.testing.assert_allclose(PartitionedMatrix(batch, executor) @ other,
+                               batch @ other, rtol=1e-14)
+
+
+def test_executor_raises_block_exceptions(executor):
+    def fail(block: int):
+        if block == 1:
+            raise ValueError('Block failed.')
+
+    with pytest.raises(ValueError):
+        executor.run(fail, 3)
+
+
+def test_executor_applies_error_state(executor):
+    def divide(_):
+        return np.ones(1) / np.zeros(1)
+
+    with np.errstate(divide='raise'):
+        with pytest.raises(FloatingPointError):
+            executor.run(divide, 3)
+
+    with np.errstate(divide='ignore'):
+        executor.run(divide, 3)
@@ -0,0 +1,45 @@
+import pytest
+
+from src.util.phase_timer import PhaseTimer
+
+
+def test_phase_timer_statistics():
+    timer = PhaseTimer()
+    for _ in range(99):
+        timer.add('step', 1e-3)
+    timer.add('step', 1.0)
+
+    statistics = timer.get_report()['step']
+    bin_width = 10 ** (1 / PhaseTimer.BINS_PER_DECADE)
+
+    assert statistics['count'] == 100
+    assert statistics['total'] == pytest.approx(1.099)
+    assert statistics['mean'] == pytest.approx(1.099e-2)
+    assert statistics['min'] == 1e-3
+    assert statistics['max'] == 1.0
+    for percentile in ('p50', 'p90', 'p99'):
+        assert 1e-3 / bin_width <= statistics[percentile] \
+               <= 1e-3 * bin_width
+
+
+def test_phase_timer_times_phases():
+    timer = PhaseTimer()
+    for _ in range(3):
+        with timer.time('first'):
+            pass
+    with timer.time('second'):
+        pass
+
+    report = timer.get_report()
+
+    assert report['first']['count'] == 3
+    assert report['second']['count'] == 1
+    assert 0 <= report['first']['fraction'] < 1
+
+
+def test_disabled_phase_timer_records_nothing():
+    timer = PhaseTimer(False)
+    with timer.time('step'):
+        pass
+
+    assert timer.get_report() == {}
@@ -0,0 +1,147 @@
+import numpy as np
+import pytest
+
+from src.io.checkpoint import Checkpoint
+from src.io.reducers import Reducer, StatisticsReducer, HistogramReducer, \
+    ProbeReducer
+
+
+def run(reducer, dts, values):
+    time = 0.0
+    for step, (dt, value) in enumerate(zip(dts, values), start=1):
+        time += dt
+        reducer.update(step, time, dt, [np.asarray(value, dtype=float)])
+
+
+def test_statistics_of_samples():
+    reducer = StatisticsReducer('x', lambda value: value, every=2)
+    values = [[0, 9], [1, 2], [9, 9], [3, 4], [9, 9], [5, 0]]
+
+    run(reducer, [0.2] * 6, values)
+    results = reducer.get_results()
+
+    samples = np.asarray([[1, 2], [3, 4], [5, 0]], dtype=float)
+    np.testing.assert_allclose(results['x mean'], np.mean(samples, axis=0))
+    np.testing.assert_allclose(results['x variance'],
+                               np.var(samples, axis=0))
+    np.testing.assert_array_equal(results['x min'], [1, 0])
+    np.testing.assert_array_equal(results['x max'], [5, 4])
+
+
+def test_statistics_weight_samples_by_elapsed_time():
+    reducer = StatisticsReducer('x', lambda value: value, every=2)
+    dts = [0.1, 0.3, 0.2, 0.2, 0.5, 0.1]
+    values = [[0, 9], [1, 2], [9, 9], [3, 4], [9, 9], [5, 0]]
+
+    run(reducer, dts, values)
+    results = reducer.get_results()
+
+    # Each sample represents the time since the previous sample
+    samples = np.asarray([[1, 2], [3, 4], [5, 0]], dtype=float)
+    weights = np.asarray([0.4, 0.4, 0.6])
+    mean = np.average(samples, axis=0, weights=weights)
+
+    np.testing.assert_allclose(results['x mean'], mean)
+    np.testing.assert_allclose(
+        results['x variance'],
+        np.average((samples - mean) ** 2, axis=0, weights=weights)
+    )
+    np.testing.assert_array_equal(results['x min'], [1, 0])
+    np.testing.assert_array_equal(results['x max'], [5, 4])
+
+
+def test_statistics_of_ensemble():
+    reducer = StatisticsReducer('x', lambda value: value,
+                                member_shape=(2,))
+    dts = [np.asarray([0.1, 0.2]), np.asarray([0.3, 0.2])]
+    values = [[[1, 1]], [[3, 5]]]
+
+    run(reducer, dts, values)
+
+    np.testing.assert_allclose(reducer.get_results()['x mean'],
+                               [[2.5, 3]])
+
+
+def test_histogram_counts_values():
+    reducer = HistogramReducer('x', lambda value: value, bins=4, low=0,
+                               high=4)
+
+    run(reducer, [1, 1], [[0.5, 1.5], [1.5, 3.5]])
+    results = reducer.get_results()
+
+    np.testing.assert_array_equal(results['x histogram'], [1, 2, 0, 1])
+    np.testing.assert_array_equal(results['x histogram edges'],
+                                  [0, 1, 2, 3, 4])
+
+
+def test_histogram_weights_values_by_elapsed_time():
+    reducer = HistogramReducer('x', lambda value: value, bins=4, low=0,
+                               high=4)
+
+    run(reducer, [0.25, 0.5], [[0.5, 1.5], [1.5, 3.5]])
+
+    np.testing.assert_allclose(reducer.get_results()['x histogram'],
+                               [0.25, 0.75, 0, 0.5])
+
+
+def test_histogram_of_ensemble():
+    reducer = HistogramReducer('x', lambda value: value, bins=2, low=0,
+                               high=2, member_shape=(2,))
+    dts = [np.asarray([0.1, 0.2]), np.asarray([0.3, 0.2])]
+    values = [[[0.5, 1.5]], [[1.5, 1.5]]]
+
+    run(reducer, dts, values)
+
+    np.testing.assert_allclose(reducer.get_results()['x histogram'],
+                               [[0.1, 0], [0.3, 0.4]])
+
+
+def test_reducer_requires_add_and_results():
+    class Incomplete(Reducer):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete('x', lambda value: value)
+
+
+def test_probe_records_samples():
+    reducer = ProbeReducer('x', lambda value: value, indices=[1], every=2)
+
+    run(reducer, [0.1, 0.2, 0.3, 0.4], [[0, 1], [2, 3], [4, 5], [6, 7]])
+    results = reducer.get_results()
+
+    np.testing.assert_array_equal(results['x probe'], [[3], [7]])
+    np.testing.assert_array_equal(results['x probe steps'], [2, 4])
+    np.testing.assert_allclose(results['x probe times'], [0.3, 1.0])
+
+
+def test_reducer_requires_positive_interval():
+    with pytest.raises(ValueError):
+        StatisticsReducer('x', lambda value: value, every=0)
+
+
+def test_resumed_reducer_matches_uninterrupted(tmp_path):
+    dts = [0.1, 0.3, 0.2, 0.2, 0.5, 0.1, 0.2]
+    values = [[step, -step] for step in range(len(dts))]
+
+    reducer = StatisticsReducer('x', lambda value: value, every=2)
+    run(reducer, dts, values)
+
+    # Interrupt the reduction between two samples and resume it from a
+    # checkpoint
+    first = StatisticsReducer('x', lambda value: value, every=2)
+    run(first, dts[:3], values[:3])
+    checkpoint = Checkpoint(str(tmp_path / 'checkpoint'))
+    checkpoint.save({'step': 3, 'reducers': [first.get_state()]})
+
+    resumed = StatisticsReducer('x', lambda value: value, every=2)
+    resumed.set_state(checkpoint.load()['reducers'][0])
+    time = sum(dts[:3])
+    for step in range(3, len(dts)):
+        time += dts[step]
+        resumed.update(step + 1, time, dts[step],
+                       [np.asarray(values[step], dtype=float)])
+
+    for key, value in reducer.get_results().items():
+        np.testing.assert_array_equal(resumed.get_results()[key], value)
+
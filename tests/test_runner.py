@@ -0,0 +1,84 @@
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from src.runner import Runner
+from src.util.metrics_server import MetricsServer
+
+
+class RecordingDataHandler:
+    """
+    A data handler that keeps the saved time steps in memory with the
+    running state among the data.
+    """
+
+    def __init__(self):
+        self.frames: List[Tuple[Dict[str, Any], Dict[str, Any]]] = []
+
+    def flush(self):
+        pass
+
+    def get_save_number(self) -> int:
+        return len(self.frames)
+
+    def save_time_step(self, params: Dict[str, Any], data: Dict[str, Any],
+                       running: Dict[str, Any]):
+        self.frames.append((dict(params), {**data, **running}))
+
+
+def count(state, running_state, value):
+    running_state.append('step', state['step'])
+    state['dt'] = 0.5
+    return [value + 1]
+
+
+def run(function, **kwargs) -> RecordingDataHandler:
+    data_handler = RecordingDataHandler()
+    Runner(function=function, initial_values=[0], names=('value',),
+           steps=30, save_every=10,
+           data_handler=data_handler, dt=0.5, running_names=('step',),
+           **kwargs).run()
+    return data_handler
+
+
+def test_runner_saves_at_save_points():
+    # Progress updates every 7 steps split the blocks between save points
+    frames = run(count, miniters=7).frames
+
+    assert [params['step'] for params, _ in frames] == [0, 10, 20, 30]
+    for params, data in frames:
+        assert data['value'] == params['step']
+        assert params['time'] == 0.5 * params['step']
+
+    for (params, _), (_, data) in zip(frames, frames[1:]):
+        np.testing.assert_array_equal(data['step'],
+                                      np.arange(params['step'],
+                                                params['step'] + 10))
+
+
+def test_runner_saves_the_step_that_finished():
+    def finish(state, running_state, value):
+        finished.append(state['step'] == 13)
+        return count(state, running_state, value)
+
+    finished = []
+    frames = run(finish, is_finished=lambda: finished[-1]).frames
+    params, data = frames[-1]
+
+    assert [params['step'] for params, _ in frames] == [0, 10, 14]
+    assert 'finished' not in params
+    assert data['value'] == 14
+    np.testing.assert_array_equal(data['step'], [10, 11, 12, 13])
+
+
+def test_runner_publishes_metrics():
+    metrics = MetricsServer(0)
+    try:
+        run(count, metrics=metrics, state={'current': 0.1})
+    finally:
+        metrics.close()
+
+    assert metrics.metrics['step'] == 30
+    assert metrics.metrics['time'] == 15
+    assert metrics.metrics['current'] == 0.1
+    assert not metrics.metrics['thermalizing']
@@ -0,0 +1,509 @@
+import json
+import shutil
+
+import h5py
+import numpy as np
+import pytest
+
+from src.solver.supercurrent_kernel import SupercurrentKernel
+from src.visualization.visualization_helpers import get_data_range, \
+    load_field, load_fixed_field, load_frame_index, load_running_data
+from tests.helpers import run_simulation, run_script, assert_same_frames
+
+
+def assert_same_observables(result: h5py.Group, expected: h5py.Group,
+                            rtol: float):
+    """
+    Check that the last time step and the voltage of two outputs have the
+    same physical values. The scalar potential is only determined up to a
+    constant, so the gauge invariant values are compared.
+    :param result: The output to check.
+    :param expected: The expected output.
+    :param rtol: The relative tolerance.
+    """
+
+    for name, function in (('psi', np.abs),
+                           ('supercurrent', np.asarray)):
+        np.testing.assert_allclose(
+            function(result['data']['12'][name][()]),
+            function(expected['data']['12'][name][()]),
+            rtol=rtol, atol=rtol / 100
+        )
+
+    np.testing.assert_allclose(load_running_data(result)['voltage'],
+                               load_running_data(expected)['voltage'],
+                               rtol=rtol, atol=rtol / 100)
+
+
+def assert_same_time_steps(first: h5py.Group, second: h5py.Group):
+    """
+    Check that two outputs have the same saved time steps.
+    :param first: The first output.
+    :param second: The second output.
+    """
+
+    assert first['data'].keys() == second['data'].keys()
+
+    for frame in first['data'].keys():
+        first_group = first['data'][frame]
+        second_group = second['data'][frame]
+        assert first_group.keys() == second_group.keys()
+        assert first_group.attrs.keys() == second_group.attrs.keys()
+
+        for key, value in first_group.attrs.items():
+            np.testing.assert_array_equal(second_group.attrs[key], value)
+
+        for key, value in first_group.items():
+            np.testing.assert_array_equal(second_group[key], value)
+
+
+@pytest.fixture(scope='module')
+def groups_output(mesh_path, tmp_path_factory) -> str:
+    output = str(tmp_path_factory.mktemp('groups') / 'output.h5')
+    run_simulation(mesh_path, output)
+    return output
+
+
+def test_output_has_fields_and_fixed_values(groups_output):
+    with h5py.File(groups_output, 'r') as h5file:
+        assert len(h5file['data']) == 13
+        assert 'a' in h5file['fixed']
+        assert 'a' not in h5file['data']['0']
+        assert 'voltage' not in h5file['data']['1']
+        assert len(h5file['running']['voltage']) == 600
+        assert np.all(np.isfinite(h5file['data']['12']['psi']))
+        assert np.all(np.isfinite(h5file['data']['12']['mu']))
+
+
+@pytest.mark.parametrize('frame', ['0', '12'])
+def test_saved_supercurrent_matches_saved_psi(mesh, groups_output, frame):
+    with h5py.File(groups_output, 'r') as h5file:
+        group = h5file['data'][frame]
+        psi = np.asarray(group['psi'])
+        kernel = SupercurrentKernel(
+            mesh, psi.shape, load_fixed_field(h5file, 'a', int(frame))
+        )
+
+        np.testing.assert_allclose(group['supercurrent'],
+                                   kernel.get_supercurrent(psi),
+                                   rtol=1e-12, atol=1e-12)
+
+
+def test_adaptive_time_steps_add_up_to_time(mesh_path, tmp_path):
+    output = str(tmp_path / 'output.h5')
+    run_simulation(mesh_path, output, '--adaptive')
+
+    with h5py.File(output, 'r') as h5file:
+        data = h5file['data']
+        dt = load_running_data(h5file)['dt']
+        ends = h5file['running ends'][()]
+        assert np.all((dt >= 0.002 / 100) & (dt <= 0.002 * 50))
+
+        for frame in range(1, len(data)):
+            elapsed = data[str(frame)].attrs['time'] \
+                - data[str(frame - 1)].attrs['time']
+            assert elapsed == pytest.approx(
+                np.sum(dt[ends[frame - 1]:ends[frame]])
+            )
+
+
+def test_adaptive_schedules_follow_time(mesh_path, tmp_path):
+    output = str(tmp_path / 'output.h5')
+    run_simulation(mesh_path, output, '--adaptive', '-B', '0.3',
+                   '--steps-per-field', '200')
+
+    with h5py.File(output, 'r') as h5file:
+        running = load_running_data(h5file)
+        data = h5file['data']
+        field = data[str(len(data) - 1)].attrs['magnetic field']
+
+    # The levels change after each 200 initial time steps of elapsed time
+    elapsed = np.concatenate([[0], np.cumsum(running['dt'])[:-1]])
+    levels = np.minimum(elapsed // (200 * 0.002), 3)
+    assert len(np.unique(levels)) > 1
+    np.testing.assert_allclose(running['current'], 0.4 * levels / 3 + 0.1)
+    assert field == pytest.approx(0.2 * levels[-1] / 3 + 0.1)
+
+
+@pytest.mark.parametrize('option', ['--ensemble-currents',
+                                    '--ensemble-fields'])
+def test_ensemble_members_match_single_runs(mesh_path, tmp_path, option):
+    values = ['0.1', '0.3']
+    run_simulation(mesh_path, str(tmp_path / 'ensemble.h5'), option,
+                   ','.join(values))
+
+    for member, value in enumerate(values):
+        single = str(tmp_path / 'single_{}.h5'.format(member))
+        run_simulation(mesh_path, single,
+                       '-j' if option == '--ensemble-currents' else '-b',
+                       value)
+
+        with h5py.File(single, 'r') as expected, \
+                h5py.File(tmp_path / 'ensemble_{}.h5'.format(member),
+                          'r') as result:
+            assert len(result['data']) == len(expected['data'])
+            assert_same_observables(result, expected, 1e-8)
+
+
+def test_iterative_mu_solver_matches_direct(mesh_path, tmp_path,
+                                            groups_output):
+    output = str(tmp_path / 'output.h5')
+    run_simulation(mesh_path, output, '--mu-solver', 'cg-jacobi',
+                   '--mu-tolerance', '1e-12')
+
+    with h5py.File(groups_output, 'r') as expected, \
+            h5py.File(output, 'r') as result:
+        assert result['data']['12'].attrs['mu residual'] <= 1e-12
+        assert_same_observables(result, expected, 1e-6)
+
+
+def test_cached_matrices_give_the_same_output(mesh_path, tmp_path,
+                                              groups_output):
+    cache_dir = str(tmp_path / 'cache')
+
+    # The first run fills the cache and the second run loads from it
+    for run in range(2):
+        output = str(tmp_path / 'output_{}.h5'.format(run))
+        run_simulation(mesh_path, output, '--cache-dir', cache_dir)
+
+        with h5py.File(groups_output, 'r') as expected, \
+                h5py.File(output, 'r') as result:
+            for name in ('psi', 'mu', 'supercurrent'):
+                np.testing.assert_array_equal(result['data']['12'][name],
+                                              expected['data']['12'][name])
+
+
+def test_threads_give_the_same_output(mesh_path, tmp_path, groups_output):
+    output = str(tmp_path / 'output.h5')
+    run_simulation(mesh_path, output, '--threads', '3')
+
+    with h5py.File(groups_output, 'r') as expected, \
+            h5py.File(output, 'r') as result:
+        for name in ('psi', 'mu', 'supercurrent', 'normal_current'):
+            np.testing.assert_array_equal(result['data']['12'][name],
+                                          expected['data']['12'][name])
+
+
+def test_threads_give_the_same_field_ramp(mesh_path, tmp_path):
+    outputs = [str(tmp_path / 'serial.h5'), str(tmp_path / 'threads.h5')]
+    args = ('-B', '0.3', '--steps-per-field', '200')
+    run_simulation(mesh_path, outputs[0], *args)
+    run_simulation(mesh_path, outputs[1], *args, '--threads', '3')
+
+    with h5py.File(outputs[0], 'r') as expected, \
+            h5py.File(outputs[1], 'r') as result:
+        for name in ('psi', 'mu', 'supercurrent', 'normal_current'):
+            np.testing.assert_array_equal(result['data']['12'][name],
+                                          expected['data']['12'][name])
+
+
+def test_async_writes_give_the_same_output(mesh_path, tmp_path,
+                                          groups_output):
+    output = str(tmp_path / 'output.h5')
+    run_simulation(mesh_path, output, '--async-writes')
+
+    with h5py.File(groups_output, 'r') as expected, \
+            h5py.File(output, 'r') as result:
+        assert_same_time_steps(result, expected)
+
+
+@pytest.mark.parametrize('args', [('--layout', 'series'),
+                                  ('--layout', 'series', '--async-writes')])
+def test_series_layout_gives_the_same_output(mesh_path, tmp_path,
+                                             groups_output, args):
+    output = str(tmp_path / 'output.h5')
+    run_simulation(mesh_path, output, *args)
+
+    with h5py.File(groups_output, 'r') as expected, \
+            h5py.File(output, 'r') as result:
+        assert 'series' in result and 'data' not in result
+        assert_same_frames(expected, result)
+
+
+def test_converted_output_is_the_same(groups_output, tmp_path):
+    output = str(tmp_path / 'converted.h5')
+    run_script('convert_output.py', groups_output, output, '--storage',
+               'gzip:4,shuffle')
+
+    with h5py.File(groups_output, 'r') as expected, \
+            h5py.File(output, 'r') as result:
+        assert 'series' in result and 'data' not in result
+        assert 'fixed frames' not in result
+        assert_same_frames(expected, result)
+
+
+@pytest.mark.parametrize('layout', ['groups', 'series'])
+def test_storage_options_are_applied(mesh_path, tmp_path, groups_output,
+                                     layout):
+    output = str(tmp_path / 'output.h5')
+    run_simulation(mesh_path, output, '--layout', layout,
+                   '--storage', 'gzip:4,shuffle',
+                   '--storage', 'psi=lzf,downcast')
+
+    with h5py.File(groups_output, 'r') as expected, \
+            h5py.File(output, 'r') as result:
+        psi = load_field(result, 'psi', 12)
+        mu = load_field(result, 'mu', 12)
+
+        assert psi.dtype == np.complex64
+        np.testing.assert_allclose(psi, load_field(expected, 'psi', 12),
+                                   rtol=1e-6, atol=1e-6)
+        np.testing.assert_array_equal(mu, load_field(expected, 'mu', 12))
+
+
+def test_storage_benchmark_runs(groups_output):
+    run_script('benchmark_storage.py', groups_output, '--frames', '3',
+               '--setting', 'gzip:4,shuffle', '--setting', 'lzf')
+
+
+def test_fields_are_saved_at_their_cadence(mesh_path, tmp_path,
+                                           groups_output):
+    output = str(tmp_path / 'output.h5')
+    run_simulation(mesh_path, output, '--save',
+                   'psi:100,mu:50,supercurrent:none')
+
+    with h5py.File(groups_output, 'r') as expected, \
+            h5py.File(output, 'r') as result:
+        for frame in range(13):
+            group = result['data'][str(frame)]
+            expected_group = expected['data'][str(frame)]
+
+            assert ('psi' in group) == (frame % 2 == 0)
+            assert 'supercurrent' not in group
+            assert 'normal_current' in group
+            np.testing.assert_array_equal(group['mu'], expected_group['mu'])
+
+        np.testing.assert_array_equal(load_running_data(result)['voltage'],
+                                      load_running_data(expected)['voltage'])
+
+        np.testing.assert_array_equal(result['data']['12']['psi'],
+                                      expected['data']['12']['psi'])
+
+
+def test_save_cadence_must_be_a_multiple_of_the_save_interval(mesh_path,
+                                                              tmp_path):
+    with pytest.raises(AssertionError):
+        run_simulation(mesh_path, str(tmp_path / 'output.h5'), '--save',
+                       'psi:75')
+
+
+def test_index_output_restores_the_frame_index(groups_output, tmp_path):
+    output = str(tmp_path / 'output.h5')
+    shutil.copy(groups_output, output)
+
+    with h5py.File(groups_output, 'r') as h5file:
+        expected = load_frame_index(h5file)
+
+    with h5py.File(output, 'r+') as h5file:
+        del h5file['frame index']
+
+        # Files without an index are read from the state of each time step
+        np.testing.assert_array_equal(load_frame_index(h5file), expected)
+
+    run_script('index_output.py', output)
+
+    with h5py.File(output, 'r') as h5file:
+        assert 'frame index' in h5file
+        np.testing.assert_array_equal(h5file['frame index'][()], expected)
+        assert get_data_range(h5file) == (0, 12)
+
+    np.testing.assert_array_equal(expected['frame'], np.arange(13))
+    np.testing.assert_array_equal(expected['step'], np.arange(0, 601, 50))
+
+
+def test_reduced_results_use_storage_options(mesh_path, tmp_path):
+    output = str(tmp_path / 'output.h5')
+    run_simulation(mesh_path, output, '--adaptive', '--storage', 'gzip:4',
+                   '--reduce', 'stats:psi_modulus:5',
+                   '--reduce', 'probe:voltage:10')
+
+    with h5py.File(output, 'r') as h5file:
+        reduced = h5file['reduced']
+        assert reduced['psi_modulus mean'].compression == 'gzip'
+        assert np.all(reduced['psi_modulus min'][()]
+                      <= reduced['psi_modulus mean'][()] + 1e-12)
+        assert len(reduced['voltage probe']) == 60
+
+
+def test_timing_reports_the_phases(mesh_path, tmp_path):
+    output = str(tmp_path / 'output.h5')
+    run_simulation(mesh_path, output, '--timing', '-B', '0.3',
+                   '--steps-per-field', '200')
+
+    with open(output + '.timing.json') as file:
+        report = json.load(file)
+
+    with h5py.File(output, 'r') as h5file:
+        assert json.loads(h5file.attrs['timing']) == report
+
+    assert {'field update', 'psi update', 'supercurrent divergence',
+            'mu solve'} <= report.keys()
+    assert report['psi update']['count'] == 601
+    assert report['field update']['count'] == 3
+
+
+def test_reducers_match_saved_frames(mesh, mesh_path, tmp_path,
+                                     groups_output):
+    output = str(tmp_path / 'output.h5')
+    run_simulation(mesh_path, output, '--no-fields',
+                   '--reduce', 'stats:psi_modulus_squared',
+                   '--reduce', 'probe:voltage:50')
+
+    with h5py.File(groups_output, 'r') as expected, \
+            h5py.File(output, 'r') as result:
+        reduced = result['reduced']
+        frames = [expected['data'][str(frame)] for frame in range(1, 13)]
+        voltages = [np.subtract(*frame['mu'][()][mesh.voltage_points])
+                    for frame in frames]
+
+        assert 'psi' not in result['data']['12']
+        np.testing.assert_array_equal(reduced['voltage probe steps'],
+                                      np.arange(50, 601, 50))
+        np.testing.assert_array_equal(reduced['voltage probe'], voltages)
+        assert np.all(reduced['psi_modulus_squared min'][()]
+                      <= np.abs(frames[-1]['psi'][()]) ** 2)
+        assert np.all(reduced['psi_modulus_squared max'][()] <= 1)
+
+
+def test_field_ramp_updates_vector_potential(mesh_path, tmp_path):
+    output = str(tmp_path / 'output.h5')
+    run_simulation(mesh_path, output, '-B', '0.4', '--steps-per-field',
+                   '200')
+
+    with h5py.File(output, 'r') as h5file:
+        data = h5file['data']
+        unit_vector_potential = h5file['fixed']['a'][()] / 0.1
+
+        # The field of a frame is the field of the last step before it
+        for frame in range(len(data)):
+            field = data[str(frame)].attrs['magnetic field']
+            assert field == pytest.approx(0.1 + 0.1 * (max(frame - 1, 0)
+                                                       // 4))
+            np.testing.assert_allclose(load_fixed_field(h5file, 'a', frame),
+                                       field * unit_vector_potential)
+            assert np.all(np.isfinite(data[str(frame)]['psi']))
+
+        # The vector potential is only saved again when it changes
+        assert [frame for frame in range(len(data))
+                if 'a' in data[str(frame)]] == [5, 9]
+        np.testing.assert_array_equal(h5file['fixed frames']['a'], [5, 9])
+
+
+@pytest.mark.parametrize('batch', ['1', '2'])
+def test_field_sweep_matches_single_runs(mesh_path, tmp_path, batch):
+    fields = [0.1, 0.2, 0.3]
+    output = str(tmp_path / 'sweep.h5')
+    run_simulation(mesh_path, output, '--field-sweep', '0.1:0.3:3',
+                   '--sweep-batch', batch)
+
+    with h5py.File(output, 'r') as h5file:
+        sweep = h5file['sweep']
+        np.testing.assert_allclose(sweep.attrs['magnetic fields'], fields)
+
+        for k, field in enumerate(fields):
+            single = str(tmp_path / 'single_{}.h5'.format(k))
+            run_simulation(mesh_path, single, '-b', str(field))
+
+            with h5py.File(single, 'r') as expected:
+                result = sweep[str(k)]
+                assert result.attrs['magnetic field'] == pytest.approx(field)
+                assert len(result['data']) == len(expected['data'])
+
+                # Fields that are run alone are identical to a single run
+                if batch == '1':
+                    np.testing.assert_array_equal(
+                        result['data']['12']['psi'],
+                        expected['data']['12']['psi']
+                    )
+                else:
+                    assert_same_observables(result, expected, 1e-8)
+
+
+def test_field_sweep_has_no_top_level_frames(mesh_path, tmp_path):
+    output = str(tmp_path / 'sweep.h5')
+    run_simulation(mesh_path, output, '--field-sweep', '0.1:0.2:2')
+
+    with h5py.File(output, 'r') as h5file:
+        assert not {'data', 'frame index', 'running', 'running ends'} \
+            & h5file.keys()
+        assert get_data_range(h5file['sweep']['1']) == (0, 12)
+
+
+@pytest.mark.parametrize('value', ['0.1:0.3', '0.1:0.3:3:4', 'a:0.3:3',
+                                   '0.1:0.3:0'])
+def test_field_sweep_must_be_valid(mesh_path, tmp_path, value):
+    with pytest.raises(AssertionError, match='argument --field-sweep'):
+        run_simulation(mesh_path, str(tmp_path / 'sweep.h5'),
+                       '--field-sweep', value)
+
+
+def test_steady_state_ramp_ends_after_last_current(mesh_path, tmp_path):
+    output = str(tmp_path / 'output.h5')
+    run_simulation(mesh_path, output, '--steady-state', '--min-dwell', '20',
+                   '--steady-tolerance', '0.01')
+
+    with h5py.File(output, 'r') as h5file:
+        data = h5file['data']
+        last = data[str(len(data) - 1)]
+        dwell_times = last.attrs['dwell times']
+
+        # The ramp visits the currents from the first to the last current
+        # and ends early
+        assert len(dwell_times) == 3 and np.all(dwell_times >= 20)
+        assert last.attrs['step'] == np.sum(dwell_times) < 600
+        assert 'finished' not in last.attrs
+
+        currents = load_running_data(h5file)['current']
+        np.testing.assert_allclose(
+            currents,
+            np.repeat(np.linspace(0.1, 0.5, 3), dwell_times)
+        )
+
+
+def test_steady_state_ramp_visits_all_currents_by_default(mesh_path,
+                                                          tmp_path):
+    output = str(tmp_path / 'output.h5')
+    run_simulation(mesh_path, output, '--steady-state')
+
+    with h5py.File(output, 'r') as h5file:
+        data = h5file['data']
+        dwell_times = data[str(len(data) - 1)].attrs['dwell times']
+
+    # The longest dwell times of all currents fit in the steps
+    assert len(dwell_times) == 3 and np.all(dwell_times <= 200)
+
+
+def test_critical_current_search_ends_when_found(mesh_path, tmp_path):
+    output = str(tmp_path / 'output.h5')
+    run_simulation(mesh_path, output, '-J', '0.2', '--find-ic',
+                   '--probe-steps', '100', '--ic-tolerance', '0.02',
+                   '--ic-threshold', '0.3')
+
+    with h5py.File(output, 'r') as h5file:
+        data = h5file['data']
+        last = data[str(len(data) - 1)]
+
+        # Each probe lasts the same number of steps
+        assert last.attrs['step'] % 100 == 0 and last.attrs['step'] < 600
+        assert last.attrs['critical current uncertainty'] <= 0.01
+        assert 0.1 < last.attrs['critical current'] < 0.2
+
+        currents = load_running_data(h5file)['current']
+        assert np.all(currents.reshape(-1, 100) == currents[::100, None])
+
+
+@pytest.mark.parametrize('args', [(), ('--layout', 'series'),
+                                  ('-B', '0.3', '--steps-per-field', '200')])
+def test_resume_gives_the_same_output(mesh_path, tmp_path, args):
+    expected_output = str(tmp_path / 'expected.h5')
+    output = str(tmp_path / 'output.h5')
+    run_simulation(mesh_path, expected_output, *args)
+
+    # Resuming rewinds to the last checkpoint and continues from there
+    run_simulation(mesh_path, output, *args, '--checkpoint-every', '250')
+    run_simulation(mesh_path, output, *args, '--checkpoint-every', '250',
+                   '--resume')
+
+    with h5py.File(expected_output, 'r') as expected, \
+            h5py.File(output, 'r') as result:
+        assert_same_frames(expected, result)
@@ -0,0 +1,284 @@
+import numpy as np
+import pytest
+
+from src.matrices.matrix_builder import MatrixBuilder, MatrixType
+from src.solver.adaptive_time_step import AdaptiveTimeStep
+from src.solver.critical_current_search import CriticalCurrentSearch
+from src.solver.mu_solver import MuSolver, MuSolverType, create_mu_solver
+from src.solver.steady_state_ramp import SteadyStateRamp
+from src.sparse_format import SparseFormat
+
+
+def test_adaptive_time_step_accepts_small_errors():
+    controller = AdaptiveTimeStep(0.01, 1e-4, 0.1, tolerance=1e-3)
+
+    assert controller.check(1e-4, 1.0)
+    assert controller.dt == pytest.approx(0.01 * 1.5)
+    assert controller.check(1e-3, 1.0)
+    assert controller.dt == pytest.approx(0.015 * 0.9)
+    assert controller.accepted == 2 and controller.rejected == 0
+
+
+def test_adaptive_time_step_rejects_large_errors():
+    controller = AdaptiveTimeStep(0.01, 1e-4, 0.1, tolerance=1e-3)
+
+    assert not controller.check(1e-2, 1.0)
+    assert controller.dt == pytest.approx(0.0025)
+    assert not controller.check(1e-4, -1.0)
+    assert not controller.check(np.nan, 1.0)
+    assert controller.rejected == 3 and controller.retries == 3
+
+    assert controller.check(0.0, 1.0)
+    assert controller.retries == 0
+
+
+def test_adaptive_time_step_scales_with_order():
+    controller = AdaptiveTimeStep(0.01, 1e-4, 0.1, tolerance=1e-3,
+                                  max_growth=5)
+
+    # The first order update scales with the square root of tolerance / error
+    assert controller.check(2.5e-4, 1.0)
+    assert controller.dt == pytest.approx(0.01 * 0.9 * 2)
+
+    assert not controller.check(4e-3, 1.0)
+    assert controller.check(1e-3, 1.0)
+    assert controller.elapsed == pytest.approx(0.01 + 0.0045)
+
+    controller.restart()
+    assert controller.elapsed == 0
+
+
+def test_adaptive_time_step_keeps_bounds():
+    controller = AdaptiveTimeStep(1.0, 1e-3, 0.05, tolerance=1e-3)
+    assert controller.dt == 0.05
+
+    for _ in range(3):
+        assert controller.check(0.0, 1.0)
+    assert controller.dt == 0.05
+
+    for _ in range(3):
+        assert not controller.check(1.0, 1.0)
+    assert controller.dt == 1e-3
+
+    with pytest.raises(RuntimeError):
+        controller.check(1.0, 1.0)
+
+
+def test_adaptive_time_step_requires_valid_bounds():
+    with pytest.raises(ValueError):
+        AdaptiveTimeStep(0.01, 0.1, 0.01, tolerance=1e-3)
+
+
+@pytest.fixture
+def mu_laplacian(mesh):
+    return MatrixBuilder(mesh).build(MatrixType.LAPLACIAN,
+                                     sparse_format=SparseFormat.CSC)
+
+
+def get_rhs(mesh, members: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    rhs = rng.standard_normal((len(mesh.x),) + ((members,) if members else ()))
+
+    # The right hand side of the Neumann problem has no net source
+    weights = np.reshape(mesh.areas, (-1,) + (1,) * (rhs.ndim - 1))
+    return rhs - np.sum(weights * rhs, axis=0) / np.sum(mesh.areas)
+
+
+@pytest.mark.parametrize('solver_type', [MuSolverType.CG_ILU,
+                                         MuSolverType.CG_JACOBI])
+@pytest.mark.parametrize('members', [0, 2])
+def test_iterative_mu_solver_matches_direct(mesh, mu_laplacian, solver_type,
+                                            members):
+    rhs = get_rhs(mesh, members)
+    direct = create_mu_solver(MuSolverType.DIRECT, mu_laplacian, mesh.areas)
+    iterative = create_mu_solver(solver_type, mu_laplacian, mesh.areas,
+                                 tolerance=1e-10)
+
+    expected = direct.solve(rhs)
+    result = iterative.solve(rhs)
+
+    # The potential is determined up to a constant
+    np.testing.assert_allclose(result - result.mean(axis=0),
+                               expected - expected.mean(axis=0),
+                               atol=1e-6)
+    np.testing.assert_allclose(mu_laplacian @ result, rhs, atol=1e-6)
+
+    statistics = iterative.get_statistics()
+    assert statistics['unconverged solves'] == 0
+    assert statistics['max residual'] <= 1e-10
+
+
+def test_iterative_mu_solver_counts_unconverged_solves(mesh, mu_laplacian):
+    solver = create_mu_solver(MuSolverType.CG_JACOBI, mu_laplacian,
+                              mesh.areas, tolerance=1e-12, max_iterations=2)
+
+    solver.solve(get_rhs(mesh))
+
+    assert solver.get_statistics()['unconverged solves'] == 1
+
+
+@pytest.mark.parametrize('value', [np.nan, np.inf])
+def test_iterative_mu_solver_rejects_non_finite_rhs(mesh, mu_laplacian,
+                                                    value):
+    solver = create_mu_solver(MuSolverType.CG_JACOBI, mu_laplacian,
+                              mesh.areas)
+    rhs = get_rhs(mesh)
+    rhs[3] = value
+
+    with pytest.raises(ValueError):
+        solver.solve(rhs)
+
+    assert solver.get_statistics()['solves'] == 0
+
+
+def test_mu_solver_requires_solve():
+    with pytest.raises(TypeError):
+        MuSolver()
+
+
+def run_ramp(ramp: SteadyStateRamp, voltages) -> list:
+    """
+    Update a ramp with a voltage per step.
+    :param ramp: The ramp.
+    :param voltages: The voltages.
+    :return: The current of each step.
+    """
+
+    currents = []
+    for voltage in voltages:
+        currents.append(ramp.get_value())
+        ramp.update(voltage, 1.0)
+    return currents
+
+
+def test_steady_state_ramp_advances_stationary_currents():
+    ramp = SteadyStateRamp([0.1, 0.2, 0.3], tolerance=1e-3, min_dwell=6,
+                           max_dwell=50, window=2)
+    ramp.reset()
+
+    currents = run_ramp(ramp, np.full(17, 0.5))
+
+    # The signals are stationary after two windows, but each current is
+    # kept for the minimal dwell
+    assert ramp.dwell_times == [6, 6]
+    assert currents[:6] == [0.1] * 6 and currents[6:12] == [0.2] * 6
+    assert ramp.get_value() == 0.3 and not ramp.finished
+
+    run_ramp(ramp, np.full(1, 0.5))
+    assert ramp.finished and ramp.dwell_times == [6, 6, 6]
+
+
+def test_steady_state_ramp_limits_dwell():
+    ramp = SteadyStateRamp([0.1, 0.2], tolerance=1e-3, min_dwell=2,
+                           max_dwell=10, window=2)
+    ramp.reset()
+
+    # A growing voltage is never stationary
+    run_ramp(ramp, np.arange(25, dtype=float))
+
+    assert ramp.dwell_times == [10, 10]
+    assert ramp.finished
+
+    ramp.reset()
+    assert ramp.get_value() == 0.1 and ramp.dwell_times == []
+    assert not ramp.finished
+
+
+def test_steady_state_ramp_of_ensemble_waits_for_all_members():
+    ramp = SteadyStateRamp([np.asarray([0.1, 0.2])], tolerance=1e-3,
+                           min_dwell=2, max_dwell=20, window=2)
+    ramp.reset()
+
+    for step in range(10):
+        ramp.update(np.asarray([0.5, step]), np.ones(2))
+
+    assert not ramp.finished and ramp.dwell == 10
+
+
+def test_steady_state_ramp_requires_valid_dwell():
+    with pytest.raises(ValueError):
+        SteadyStateRamp([0.1], tolerance=1e-3, min_dwell=10, max_dwell=5,
+                        window=2)
+
+
+def run_search(search: CriticalCurrentSearch, critical_current,
+               steps: int = 1000):
+    """
+    Run a search on a model with a voltage of one above the critical current.
+    The complex field holds the number of superconducting steps since the
+    start.
+    :param search: The search.
+    :param critical_current: The critical current of the model.
+    :param steps: The largest number of steps.
+    :return: The complex field of each step.
+    """
+
+    psi = np.zeros(np.shape(critical_current))
+    fields = []
+
+    for _ in range(steps):
+        resistive = search.get_value() > critical_current
+        psi = psi + 1
+        voltage = np.where(resistive, 1.0, 0.0)
+        psi, _ = search.update(voltage, 0.1, psi, psi)
+        fields.append(psi)
+
+        if search.finished:
+            break
+
+    return fields
+
+
+def test_critical_current_search_brackets_and_bisects():
+    search = CriticalCurrentSearch(0.1, 0.2, threshold=0.5, tolerance=1e-3,
+                                   probe_steps=4)
+
+    run_search(search, 0.537)
+    critical_current, uncertainty = search.get_critical_current()
+
+    assert search.finished
+    assert uncertainty <= 1e-3 / 2
+    assert abs(critical_current - 0.537) <= uncertainty
+    assert search.get_value() == pytest.approx(search.lower)
+
+
+def test_critical_current_search_restarts_resistive_probes():
+    search = CriticalCurrentSearch(0.1, 0.2, threshold=0.5, tolerance=0.05,
+                                   probe_steps=4)
+
+    fields = run_search(search, 0.15)
+
+    # The high current is resistive, so the next probe starts from the end
+    # of the first probe at the low current
+    assert fields[7] == 4
+
+
+def test_critical_current_search_ends_if_low_current_is_resistive():
+    search = CriticalCurrentSearch(0.1, 0.2, threshold=0.5, tolerance=1e-3,
+                                   probe_steps=4)
+
+    run_search(search, 0.05)
+    critical_current, uncertainty = search.get_critical_current()
+
+    assert search.finished and search.probes == 1
+    assert critical_current == pytest.approx(0.05)
+    assert uncertainty == pytest.approx(0.05)
+
+
+def test_critical_current_search_of_ensemble():
+    search = CriticalCurrentSearch(np.asarray([0.1, 0.1]), 0.2,
+                                   threshold=0.5, tolerance=1e-3,
+                                   probe_steps=4)
+
+    run_search(search, np.asarray([0.15, 0.9]))
+    critical_current, uncertainty = search.get_critical_current()
+
+    assert search.finished
+    np.testing.assert_allclose(critical_current, [0.15, 0.9],
+                               atol=1e-3 / 2)
+
+
+def test_critical_current_search_requires_valid_bracket():
+    with pytest.raises(ValueError):
+        CriticalCurrentSearch(0.2, 0.1, threshold=0.5, tolerance=1e-3,
+                              probe_steps=4)